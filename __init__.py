@@ -1,4 +1,10 @@
-from springmagic.main import main
+def main(*args, **kwargs):
+    # UI is imported on first call, solver worker processes import the package without it
+    global main
+    from springmagic.main import main
+
+    return main(*args, **kwargs)
+
 
 __version__ = "3.5a"
 
@@ -18,25 +18,32 @@
 #
 #####################################################################################
 
-import math
 import logging
 # import copy
 
+import numpy as np
 import pymel.core as pm
-import pymel.core.datatypes as dt
 import maya.cmds as cmds
+import maya.api.OpenMaya as om
+import maya.api.OpenMayaAnim as oma
 
 import decorators
-import springMath
+import springBatch
+import springCache
+import springCheckpoint
+import springCollision
+import springProfile
+import springScene
+import springSolver
+import springWind
 
 from utility import *
 
-from itertools import cycle
-from itertools import chain
-from weakref import WeakValueDictionary
-
 from collections import OrderedDict
 
+# Spring is defined with the solver, core.Spring(...) calls are unchanged
+Spring = springSolver.Spring
+
 ###################################
 # spring magic
 ####################################
@@ -49,19 +56,9 @@ kNullSuffix = '_SpringNull'
 # kTwistNullSuffix = '_SpringTwistNull'
 
 
-class Spring:
-
-    def __init__(self, ratio=0.5, twistRatio=0.0, tension=0.0, extend=0.0, inertia=0.0):
-
-        self.ratio = ratio
-        self.twist_ratio = twistRatio
-        self.tension = tension
-        self.extend = extend
-        self.inertia = inertia
-
 class SpringMagic:
 
-    def __init__(self, startFrame, endFrame, subDiv=1.0, isLoop=False, isPoseMatch=False, isCollision=False, isFastMove=False, wipeSubframe=True):
+    def __init__(self, startFrame, endFrame, subDiv=1.0, isLoop=False, isPoseMatch=False, isCollision=False, isFastMove=False, wipeSubframe=True, isFloor=False, floorHeight=0.0, workerCount=1, isProfile=False, outputStep=1.0, solverMode=springSolver.kAimMode, iterations=springSolver.kDefaultIterations, isAdaptive=False, sleepTolerance=0.0):
 
         self.start_frame = startFrame
         self.end_frame = endFrame
@@ -71,335 +68,144 @@ class SpringMagic:
         self.is_pose_match = isPoseMatch
         self.is_fast_move = isFastMove
         self.wipe_subframe = wipeSubframe
+        # frames between two keys once subframes are wiped
+        self.output_step = outputStep
 
         self.is_collision = isCollision
         self.collision_planes_list = None
 
-        self.wind = None
-
-class SpringData:
-
-    cur_position_locator = None
-    prev_position_locator = None
-    prev_grand_child_position_locator = None
-
-    _instances = WeakValueDictionary()
-
-    @property
-    def Count(self):
-        return len(self._instances)
-
-    def __init__(self, springMagic, spring, transform, child, grand_child, grand_parent):
-        # self.current_child_position
-
-        self._instances[id(self)] = self
-
-        self.springMagic = springMagic
-        self.spring = spring
-
-        self.parent = transform
-        self.child = child
-        self.grand_child = grand_child
-        self.grand_parent = grand_parent
-
-        self.child_position = get_translation(child)
-        self.grand_child_position = get_translation(grand_child) if grand_child else None
-
-        self.previous_child_position = self.child_position
-
-        self.rotation = get_rotation(transform)
-        self.up_vector = get_matrix(transform)[4:7]
-
-        transform_pos = get_translation(transform)
-        self.bone_length = springMath.distance(transform_pos, self.child_position)
-
-        self.has_child_collide = False
-        self.has_plane_collide = False
-
-        # create temporary locators use for aim constraint
-        if not SpringData.cur_position_locator:
-            SpringData.cur_position_locator = pm.spaceLocator(name='cur_position_locator')
-
-        if not SpringData.prev_position_locator:
-            SpringData.prev_position_locator = pm.spaceLocator(name='prev_position_locator')
-
-        if not SpringData.prev_grand_child_position_locator:
-            SpringData.prev_grand_child_position_locator = pm.spaceLocator(name='prev_grand_child_position_locator')
-
-        # Weight attribute to de/activate the aim constraint in pose match mode
-        self.pairblend_weight_attribute = None
-        self.aim_constraint = None
-
-        self.__create_child_proxy()
-        self.__prepare_animation_key()
-        self.__create_aim_constraint()
-        self.__init_pairblend_weight()
-
-    def __del__(self):
-
-        if self.Count == 0:
-            # print('Last Counter object deleted')
-
-            # delete temporary locators (useful, it's delete constraints at the same time)
-            pm.delete(SpringData.cur_position_locator, SpringData.prev_position_locator, SpringData.prev_grand_child_position_locator)
-
-            SpringData.cur_position_locator = None
-            SpringData.prev_position_locator = None
-            SpringData.prev_grand_child_position_locator = None
-
-            # remove all spring nulls, add recursive incase name spaces
-            # pm.delete(pm.ls('*' + kNullSuffix + '*', recursive=1))
-        else:
-            # print(self.Count, 'Counter objects remaining')
-            pass
-
-        if self.child_proxy:
-            # remove spring nulls, add recursive incase name spaces
-            pm.delete(pm.ls('*' + self.child_proxy + '*', recursive=1))
-
-    def update(self, has_collision, has_hit_plane, child_pos_corrected):
-        # Update current transform with the new values
-        self.child_position = get_translation(self.child)
-        self.grand_child_position = get_translation(self.grand_child) if self.grand_child else None
-        self.previous_child_position = child_pos_corrected
-
-        self.rotation = get_rotation(self.parent)
-        self.up_vector = get_matrix(self.parent)[4:7]
-
-        self.has_child_collide = has_collision
-        self.has_plane_collide = has_hit_plane
-
-    def __create_child_proxy(self):
-        # create a null at child pos, then parent to obj parent for calculation
-        child_proxy_locator_name = self.parent.name() + kNullSuffix
-        child_proxy_list = pm.ls(child_proxy_locator_name)
-
-        if not child_proxy_list:
-            self.child_proxy = pm.spaceLocator(name=child_proxy_locator_name)
-        else:
-            self.child_proxy = child_proxy_list[0]
-
-        self.child_proxy.getShape().setAttr('visibility', False)
-
-        pm.parent(self.child_proxy, self.parent.getParent())
-        # pm.parent(child_proxy, self.grand_parent)
-
-        if not self.springMagic.is_pose_match:
-            self.child_proxy.setTranslation(self.child.getTranslation(space='world'), space='world')
-            self.child_proxy.setRotation(self.child.getRotation(space='world'), space='world')
-
-    def __prepare_animation_key(self):
-        if not self.springMagic.is_pose_match:
-            # remove exists keys
-            pm.cutKey(self.parent, time=(self.springMagic.start_frame, self.springMagic.end_frame + 0.99999))
-            pm.cutKey(self.child, time=(self.springMagic.start_frame, self.springMagic.end_frame + 0.99999))
-
-            # set key
-            pm.setKeyframe(self.parent, attribute='rotate')
-
-            if self.spring.extend != 0.0:
-                pm.setKeyframe(self.child, attribute='tx')
-
-    def __create_aim_constraint(self):
-        # Create a constraint per transform to speed up computation, not active yet (weight=0)
-        self.aim_constraint = pm.aimConstraint(SpringData.cur_position_locator, SpringData.prev_position_locator, SpringData.prev_grand_child_position_locator, self.parent, aimVector=[1, 0, 0], upVector=[0, 1, 0], maintainOffset=False, weight=0)
-
-    def __init_pairblend_weight(self):
-        # if transform rotation has no animation, set a key at start frame to force the creation of a pairblend when the aim constraint is created
-        for rotation_input in ['rx', 'ry', 'rz']:
-            rotation_connection = pm.listConnections(self.parent + '.' + rotation_input, d=False, s=True)
-
-            if not rotation_connection:
-                pm.setKeyframe(self.parent, attribute=rotation_input)
-
-        pairblends = pm.listConnections(self.parent, type="pairBlend", destination=True, skipConversionNodes=True)
-
-        # Find the pairblend connected to the aim constraint
-        for pairblend in pairblends:
-
-            connected_constraint_list = cmds.listConnections(pairblend.name(), type='constraint', destination=False)
-
-            if self.aim_constraint.name() in connected_constraint_list:
-
-                # Get pairblend weight connected attribute
-                # return [u'joint2.blendAim1')]
-                weight_attribute_list = cmds.listConnections(pairblend + '.weight', d=False, s=True, p=True)
-
-                if weight_attribute_list:
-                    self.pairblend_weight_attribute = weight_attribute_list[0]
+        # infinite ground plane, no geometry needed
+        self.is_floor = isFloor
+        self.floor_height = floorHeight
 
-    def set_pairblend_weight(self, blend_value):
-        if self.pairblend_weight_attribute:
-            pm.setAttr(self.pairblend_weight_attribute, blend_value)
+        self.wind_list = []
 
-    def keyframe_child_proxy(self):
+        # chains are solved in a pool of processes if more than one worker
+        self.worker_count = workerCount
 
-        if self.child_proxy:
-            # Deactivate pairblend weight
-            # Aim constraint weight set to 0 is not enough, it paratizes the process
-            self.set_pairblend_weight(0.0)
+        # aim or verlet solver, constraint iterations of the verlet one
+        self.solver_mode = solverMode
+        self.iterations = iterations
 
-            self.child_proxy.setTranslation(self.child.getTranslation(space='world'), space='world')
-            pm.setKeyframe(self.child_proxy, attribute='translate')
-            self.child_proxy.setRotation(self.child.getRotation(space='world'), space='world')
-            pm.setKeyframe(self.child_proxy, attribute='rotate')
+        # each frame solved in 1 to sub_div steps, as many as its motion needs
+        self.is_adaptive = isAdaptive
 
-            self.set_pairblend_weight(1.0)
+        # chains settled within the tolerance are not solved until something moves, 0 to solve them all
+        self.sleep_tolerance = sleepTolerance
 
-    def apply_inertia(self, currentChildPosition):
-        ratio = self.spring.ratio / self.springMagic.sub_div
-        inertia_offset = [0.0, 0.0, 0.0]
+        # per phase timings of the last calculation, kept for display and export
+        self.is_profile = isProfile
+        self.profiler = None
 
-        if self.spring.inertia > 0.0:
-            bone_ref_loc_offset_dir = currentChildPosition - self.child_position
-            bone_ref_loc_offset_distance = ((bone_ref_loc_offset_dir) * (1 - ratio) * (1 - self.spring.inertia)).length()
 
-            inertia_offset = bone_ref_loc_offset_dir.normal() * (bone_ref_loc_offset_distance / self.springMagic.sub_div)
+class MayaScene(springScene.Scene):
+    # Scene interface on the current Maya scene
+    # proxies are computed from the sampled world matrices, no locator is created or keyed
+    # keys are only replaced when the curves are written, the scene is sampled as animated
+    # a keyless scene leaves the keys unchanged, for a preview
 
-        # apply mass
-        force_direction = self.child_position - self.previous_child_position
-        force_distance = force_direction.length() * self.spring.inertia
+    def __init__(self, is_keyless=False):
+        self.is_keyless = is_keyless
 
-        # offset position
-        inertia_offset += force_direction.normal() * (force_distance / self.springMagic.sub_div)
+        # proxy: (child, parent, local matrix, None for a pose match)
+        self.proxy_dict = OrderedDict()
 
-        return inertia_offset
+    def parent(self, node):
+        parent = pm.PyNode(node).getParent()
 
-    def apply_wind(self, frame):
-        wind_offset = [0.0, 0.0, 0.0]
+        return parent.name() if parent else None
 
-        if self.springMagic.wind:
-            wind_max_force = self.springMagic.wind.getAttr('MaxForce')
-            wind_min_force = self.springMagic.wind.getAttr('MinForce')
-            wind_frequency = self.springMagic.wind.getAttr('Frequency')
+    def descendants(self, node):
+        return [descendant.name() for descendant in pm.listRelatives(node, allDescendents=True, type='transform')][::-1]
 
-            mid_force = (wind_max_force + wind_min_force) / 2
+    def paths(self, nodes):
+        return getLongNames(nodes)
 
-            # get source x - axis direction in world space
-            wind_direction = get_matrix(self.springMagic.wind)[:3]
-            # sDirection = sObj.getMatrix()[0][:3]
-            wind_direction = dt.Vector(wind_direction[0], wind_direction[1], wind_direction[2]).normal()
-            wind_distance = math.sin(frame * wind_frequency) * (wind_max_force - wind_min_force) + mid_force
+    def world_matrix(self, node, time):
+        return sampleScene([time], [(node, 'worldMatrix')], []).matrices[0, 0]
 
-            # offset position
-            wind_offset = wind_direction.normal() * wind_distance
+    def rest_pose(self, node, time):
+        joint_orient = None
 
-        return wind_offset
+        if cmds.attributeQuery('jointOrient', node=node, exists=True):
+            joint_orient = cmds.getAttr(node + '.jointOrient', time=time)[0]
 
-    def detect_collision(self, new_obj_pos, new_child_pos, capsule_list):
-        col_pre = col_cur = None
+        return (cmds.getAttr(node + '.rotate', time=time)[0],
+                cmds.getAttr(node + '.rotateOrder'),
+                cmds.getAttr(node + '.rotateAxis', time=time)[0],
+                joint_orient,
+                cmds.getAttr(node + '.scale', time=time)[0])
 
-        child_pos_corrected = self.child_position
+    def create_proxy(self, node, child, time, is_pose_match):
+        proxy = node + kNullSuffix
+        parent = self.parent(node)
+        matrix = None
 
-        if self.springMagic.is_collision and capsule_list:
+        # child world pose in the parent space
+        if not is_pose_match:
+            matrix = self.world_matrix(child, time)
 
-            if preCheckCollision(new_obj_pos, self.bone_length, capsule_list):
+            if parent:
+                matrix = np.matmul(matrix, np.linalg.inv(self.world_matrix(parent, time)))
 
-                # check collision from previous pos to cur pos
-                col_pre, col_body_pre, hitCylinder_pre = springMath.checkCollision(new_child_pos, self.child_position, capsule_list, True)
+        self.proxy_dict[proxy] = (child, parent, matrix)
 
-                # check collision from cur pos to previous pos
-                col_cur, col_body_cur, hitCylinder_cur = springMath.checkCollision(new_child_pos, self.child_position, capsule_list, False)
+        return proxy
 
-                if col_pre and (col_cur is None):
-                    new_child_pos = col_pre
-                elif col_cur and (col_pre is None):
-                    child_pos_corrected = col_cur
-                elif col_pre and col_cur:
+    def delete_proxies(self):
+        self.proxy_dict.clear()
 
-                    # move cur child pose to closest out point if both pre and cur pos are already inside of col body
-                    # if distance(col_pre, new_child_pos) < distance(col_cur, new_child_pos):
-                    mid_point = (self.child_position + new_child_pos) / 2
+    def sample(self, times, matrix_keys, value_keys):
+        if not self.proxy_dict:
+            return sampleScene(times, matrix_keys, value_keys)
 
-                    if springMath.distance(col_pre, mid_point) < springMath.distance(col_cur, mid_point):
-                        new_child_pos = col_pre
-                    else:
-                        new_child_pos = col_cur
+        cache = springCache.SampleCache(times, matrix_keys, value_keys)
 
-                    if self.springMagic.is_fast_move:
-                        child_pos_corrected = new_child_pos
+        # pose match proxies are the child world pose in the parent space on each step,
+        # child and parent are sampled in the same pass as the rest of the scene
+        proxy_key_set = set(key for key in cache.matrix_keys if key[0] in self.proxy_dict)
+        world_key_list = []
 
-                # # draw debug locator
-                # if col_pre and col_cur:
-                #     locator1 = pm.spaceLocator(name=obj.name() + '_col_pre_locator_' + str(i))
-                #     locator1.setTranslation(col_pre)
-                #     locator1 = pm.spaceLocator(name=obj.name() + '_col_cur_locator_' + str(i))
-                #     locator1.setTranslation(col_cur)
+        for proxy, attribute in proxy_key_set:
+            child, parent, matrix = self.proxy_dict[proxy]
 
-        return True if col_pre or col_cur else False, new_child_pos, child_pos_corrected
+            if matrix is None:
+                world_key_list += [(node, 'worldMatrix') for node in [child, parent] if node]
 
-    def detect_plane_hit(self, new_obj_pos, new_child_pos, grand_parent_has_plane_collision):
-        has_hit_plane = False
+        scene_key_list = [key for key in cache.matrix_keys if key not in proxy_key_set]
+        scene_cache = sampleScene(times, list(OrderedDict.fromkeys(scene_key_list + world_key_list)), value_keys)
 
-        if self.springMagic.is_collision and self.springMagic.collision_planes_list[0]:
-            collision_plane = self.springMagic.collision_planes_list[0]
-            has_plane_collision = springMath.checkPlaneCollision(new_obj_pos, new_child_pos, collision_plane)
+        for key_index, key in enumerate(cache.matrix_keys):
+            if key not in proxy_key_set:
+                cache.matrices[:, key_index] = scene_cache.matrices[:, scene_cache.matrix_index[key]]
+                continue
 
-            if has_plane_collision or grand_parent_has_plane_collision:
-                new_child_pos = repeatMoveToPlane(self.parent, new_child_pos, self.child, collision_plane, 3)
-                has_hit_plane = True
+            child, parent, matrix = self.proxy_dict[key[0]]
 
-        return has_hit_plane, new_child_pos
+            if matrix is not None:
+                cache.matrices[:, key_index] = matrix
+                continue
 
-    # calculate upvector by interpolation y axis for twist
-    def compute_up_vector(self):
-        twist_ratio = self.spring.twist_ratio / self.springMagic.sub_div
+            matrices = scene_cache.matrices[:, scene_cache.matrix_index[(child, 'worldMatrix')]]
+            if parent:
+                matrices = np.matmul(matrices, np.linalg.inv(scene_cache.matrices[:, scene_cache.matrix_index[(parent, 'worldMatrix')]]))
 
-        cur_obj_yAxis = get_matrix(self.child_proxy)[4:7]
-        prev_up_vector = dt.Vector(self.up_vector[0], self.up_vector[1], self.up_vector[2]).normal()
-        cur_up_vector = dt.Vector(cur_obj_yAxis[0], cur_obj_yAxis[1], cur_obj_yAxis[2]).normal()
+            cache.matrices[:, key_index] = matrices
 
-        up_vector = (prev_up_vector * (1 - twist_ratio)) + (cur_up_vector * twist_ratio)
+        cache.values[:] = scene_cache.values
 
-        return up_vector
+        return cache
 
-    def aim_by_ratio(self, upVector, newChildPos, childPosCorrected):
-        ratio = self.spring.ratio / self.springMagic.sub_div
-        tension = self.spring.tension / (1.0 / (springMath.sigmoid(1 - self.springMagic.sub_div) + 0.5))
+    def write_curves(self, curve_cache, start_time, end_time, output_times=None):
+        if self.is_keyless:
+            return
 
-        # print("obj: " + str(self.parent.name()))
-        # print("newChildPos: " + str(newChildPos))
-        # print("childPosCorrected: " + str(childPosCorrected))
-        # print("grand_child_position: " + str(self.grand_child_position))
-        # print("upVector: " + str(upVector))
-        # print("ratio: " + str(ratio))
-        # print("tension: " + str(tension))
+        writeAnimCurves(curve_cache, start_time, end_time, output_times)
 
-        SpringData.cur_position_locator.setTranslation(newChildPos)
-        SpringData.prev_position_locator.setTranslation(childPosCorrected)
-
-        pm.aimConstraint(self.parent, e=True, worldUpVector=upVector)
-
-        pm.aimConstraint(SpringData.cur_position_locator, self.parent, e=True, w=ratio)
-        pm.aimConstraint(SpringData.prev_position_locator, self.parent, e=True, w=1 - ratio)
-
-        if self.has_child_collide and self.grand_child_position and tension != 0:
-            SpringData.prev_grand_child_position_locator.setTranslation(self.grand_child_position)
-            pm.aimConstraint(SpringData.prev_grand_child_position_locator, self.parent, e=True, w=(1 - ratio) * tension)
-
-        pm.setKeyframe(self.parent, attribute='rotate')
-
-        pm.aimConstraint(SpringData.cur_position_locator, SpringData.prev_position_locator, SpringData.prev_grand_child_position_locator, self.parent, e=True, w=0.0)
-
-    def extend_bone(self, childPosCorrected):
-        if self.spring.extend != 0.0:
-            child_translation = self.child.getTranslation()
-            # get length between bone pos and child pos
-            x2 = (childPosCorrected - get_translation(self.parent)).length()
-            x3 = (self.bone_length * (1 - self.spring.extend)) + (x2 * self.spring.extend)
-            self.child.setTranslation([x3, child_translation[1], child_translation[2]])
-            pm.setKeyframe(self.child, attribute='tx')
-        # else:
-        #     self.child.setTranslation([self.bone_length, child_translation[1], child_translation[2]])
 
 def createCollisionPlane():
 
-    # remove exist plane
-    collision_plane = get_node('*' + kCollisionPlaneSuffix + '*')
-
-    if collision_plane:
-        pm.delete(collision_plane)
-
+    # planes add up, existing ones are kept
     collision_plane = pm.polyPlane(name="the" + kCollisionPlaneSuffix, sx=1, sy=1, w=10, h=10, ch=1)[0]
 
     # one side display
@@ -418,10 +224,10 @@ def removeBody(clear=False):
 
     pm.delete(cylinder_list)
 
-    collision_plane = get_node('*' + kCollisionPlaneSuffix + '*')
+    collision_plane_list = getCollisionPlanes()
 
-    if collision_plane:
-        pm.delete(collision_plane)
+    if collision_plane_list:
+        pm.delete(collision_plane_list)
 
 
 def addWindObj():
@@ -441,12 +247,34 @@ def addWindObj():
     # pm.addAttr(windCone, longName='Wave', attributeType='float')
     # pm.setAttr(windCone.name() + '.Wave', 0.5, e=1, keyable=1)
 
+    # turbulence is off until Turbulence is set, scale is the inverse of the gust size
+    pm.addAttr(windCone, longName='Turbulence', attributeType='float')
+    pm.setAttr(windCone.name() + '.Turbulence', 0, e=1, keyable=1)
+    pm.addAttr(windCone, longName='TurbulenceScale', attributeType='float')
+    pm.setAttr(windCone.name() + '.TurbulenceScale', 0.1, e=1, keyable=1)
+    pm.addAttr(windCone, longName='TurbulenceSeed', attributeType='long')
+    pm.setAttr(windCone.name() + '.TurbulenceSeed', len(pm.ls(kWindObjectName + '*', type='transform')), e=1, keyable=1)
+
     setWireShading(windCone, False)
 
     pm.makeIdentity(apply=True)
     windCone.setRotation([0, 0, 90])
 
 
+def getLongNames(names):
+    # full paths of uniquely named transforms in one query, in the order of names
+    # ls without names lists the whole scene
+    if not names:
+        return []
+
+    path_dict = dict((path.rpartition('|')[2], path) for path in cmds.ls(names, long=True))
+
+    if len(path_dict) != len(names):
+        return [cmds.ls(name, long=True)[0] for name in names]
+
+    return [path_dict[name.rpartition('|')[2]] for name in names]
+
+
 def bindControls(linked_chains=False):
     selected_ctrls = pm.ls(sl=True)
     pm.select(clear=True)
@@ -455,10 +283,10 @@ def bindControls(linked_chains=False):
     if linked_chains:
         # Create list for every ctrls chains
         # ie [[ctrl1, ctrl1.1, ctrl1.2], [ctrl2, ctrl2.1, ctrl2.2, ctrl2.3]]
-        all_ctrls_descendants_list = pm.listRelatives(selected_ctrls, allDescendents=True)
-        top_hierarchy_ctrls_list = [x for x in selected_ctrls if x not in all_ctrls_descendants_list]
+        ctrl_dict = OrderedDict((ctrl.name(), ctrl) for ctrl in selected_ctrls)
+        ctrls_index = springScene.HierarchyIndex(getLongNames(list(ctrl_dict)))
 
-        ctrls_chains_list = map(lambda x: [x] + [y for y in pm.listRelatives(x, allDescendents=True) if y in selected_ctrls][::-1], top_hierarchy_ctrls_list)
+        ctrls_chains_list = [[ctrl_dict[name] for name in chain] for chain in ctrls_index.chains()]
     # No sorting possible because the controlers have no lineage
     else:
         ctrls_chains_list = [selected_ctrls]
@@ -530,40 +358,316 @@ def bindPose():
 
 # Prepare all information to call SpringMagicMaya function
 def startCompute(spring, springMagic, progression_callback=None):
+    # a preview changes the bones values
+    stopPreview()
 
     autokeyframe_state = cmds.autoKeyframe(query=True, state=True)
     cmds.autoKeyframe(state=False)
 
     # get selection obj
     objs = pm.ls(sl=True)
+    name_list = [obj.name() for obj in objs]
 
-    # check objects validity
-    for obj in objs:
-        # has duplicate name obj
-        nameCntErr = (len(pm.ls(obj.name())) > 1)
+    # check objects validity, a name shared with another object comes with its path
+    for name in name_list:
+        if '|' in name:
+            raise ValueError(name + ' has duplicate name object! Stopped!')
 
-        # is a duplicate obj
-        nameValidErr = (obj.name().find('|') > 0)
+    # selection hierarchy read in one query
+    objs_index = springScene.HierarchyIndex(getLongNames(name_list))
 
-        if nameCntErr or nameValidErr:
-            raise ValueError(obj.name() + ' has duplicate name object! Stopped!')
+    if objs_index.duplicate_names:
+        raise ValueError(sorted(objs_index.duplicate_names)[0] + ' has duplicate name object! Stopped!')
 
+    for obj, name in zip(objs, name_list):
         obj_translation = obj.getTranslation()
+        parent = objs_index.parent(name)
+
+        if (obj_translation[0] < 0 or abs(obj_translation[1]) > 0.001 or abs(obj_translation[2]) > 0.001) and parent in objs_index.name_set:
+            pm.warning(parent + "'s X axis not point to child! May get broken result!")
+
+    searchSceneObjects(springMagic)
+
+    SpringMagicMaya(objs, spring, springMagic, progression_callback)
+
+    cmds.autoKeyframe(state=autokeyframe_state)
+
+
+def startSweep(springs, springMagic):
+    # Solve the selection with each spring in one pass, nothing is keyed
+    # the variant picked is keyed with applySweepVariant, its own extend decides if translate X is keyed
+    objs = pm.ls(sl=True)
+
+    stopPreview()
+
+    # remove spring nulls left by older versions, add recursive incase name spaces
+    pm.delete(pm.ls('*' + kNullSuffix + '*', recursive=True))
+
+    searchSceneObjects(springMagic)
+
+    solver, curve_cache_list = springScene.sweep_chains(
+        MayaScene(is_keyless=True),
+        [obj.name() for obj in objs],
+        springs,
+        springMagic.start_frame,
+        springMagic.end_frame,
+        springMagic.sub_div,
+        springMagic.is_loop,
+        springMagic.is_pose_match,
+        springMagic.is_fast_move,
+        createColliderSet(springMagic),
+        createWindField(springMagic),
+        springMagic.worker_count,
+        solver_mode=springMagic.solver_mode,
+        iterations=springMagic.iterations,
+        is_adaptive=springMagic.is_adaptive,
+        sleep_tolerance=springMagic.sleep_tolerance)
+
+    return curve_cache_list
+
+
+def getOutputTimes(springMagic):
+    # keyed times, every step if subframes are kept
+    if not springMagic.wipe_subframe:
+        return None
+
+    return springScene.output_times(springMagic.start_frame, springMagic.end_frame, springMagic.output_step)
+
+
+def applySweepVariant(curve_cache, springMagic):
+    # key the curves of a sweep variant, as at the end of a calculation
+    autokeyframe_state = cmds.autoKeyframe(query=True, state=True)
+    cmds.autoKeyframe(state=False)
+
+    writeAnimCurves(curve_cache, springMagic.start_frame, springMagic.end_frame, getOutputTimes(springMagic))
+
+    cmds.autoKeyframe(state=autokeyframe_state)
+
+
+class SpringPreview:
+    # Keyless preview of a calculation, solved values of the frame are set on the bones on every time change
+    # no key, locator or constraint is created, commit keys the result as a calculation does
+
+    def __init__(self, curve_cache, springMagic):
+        self.curve_cache = curve_cache
+        self.springMagic = springMagic
+
+        # (F, K) values on whole frames, the plugs set together
+        self.frame_list = range(springMagic.start_frame, springMagic.end_frame + 1)
+        self.values = np.array([curve_cache.curve(node, attribute, self.frame_list)[1] for node, attribute in curve_cache.keys]).T
+
+        plug_dict = OrderedDict()
+        for key_index, (node, attribute) in enumerate(curve_cache.keys):
+            plug_dict.setdefault(node + ('.rotate' if attribute.startswith('rotate') else '.' + attribute), []).append(key_index)
+
+        # plugs driven by anything else than curves can't be set
+        self.plug_list = []
+        self.original_value_list = []
+
+        for plug, key_index_list in plug_dict.items():
+            source_list = []
+            for attribute_plug in [plug] + ([plug + axis for axis in 'XYZ'] if plug.endswith('.rotate') else []):
+                source_list += cmds.listConnections(attribute_plug, source=True, destination=False, skipConversionNodes=True) or []
+
+            if any(not cmds.nodeType(source).startswith('animCurve') for source in source_list):
+                pm.warning(plug + ' is driven, it is not previewed')
+                continue
+
+            self.plug_list.append((plug, key_index_list))
+
+            # values to restore on plugs not driven by curves
+            if not source_list:
+                self.original_value_list.append((plug, cmds.getAttr(plug)))
+
+        self.script_job = None
+        self.autokeyframe_state = None
 
-        if (obj_translation[0] < 0 or abs(obj_translation[1]) > 0.001 or abs(obj_translation[2]) > 0.001) and obj.getParent() and (obj.getParent() in objs):
-            pm.warning(obj.getParent().name() + "'s X axis not point to child! May get broken result!")
+    def start(self):
+        # no key should be set by the preview
+        self.autokeyframe_state = cmds.autoKeyframe(query=True, state=True)
+        cmds.autoKeyframe(state=False)
 
+        self.script_job = cmds.scriptJob(event=['timeChanged', self.update])
+        self.update()
+
+    def update(self):
+        frame_index = int(round(cmds.currentTime(query=True))) - self.springMagic.start_frame
+
+        if frame_index < 0 or frame_index >= len(self.frame_list):
+            return
+
+        value_list = self.values[frame_index]
+
+        for plug, key_index_list in self.plug_list:
+            cmds.setAttr(plug, *value_list[key_index_list].tolist())
+
+    def stop(self):
+        if self.script_job is not None and cmds.scriptJob(exists=self.script_job):
+            cmds.scriptJob(kill=self.script_job, force=True)
+
+        self.script_job = None
+
+        for plug, value in self.original_value_list:
+            cmds.setAttr(plug, *(value[0] if isinstance(value, list) else [value]))
+
+        if self.autokeyframe_state is not None:
+            cmds.autoKeyframe(state=self.autokeyframe_state)
+
+        # curves drive the bones again
+        cmds.currentTime(cmds.currentTime(query=True), edit=True)
+
+    def commit(self):
+        self.stop()
+
+        writeAnimCurves(self.curve_cache, self.springMagic.start_frame, self.springMagic.end_frame, getOutputTimes(self.springMagic))
+
+
+# Preview shown in the scene, only one at a time
+SM_preview = None
+
+
+def startPreview(spring, springMagic):
+    # Solve the selection without changing the scene and preview it while scrubbing
+    global SM_preview
+
+    stopPreview()
+
+    objs = pm.ls(sl=True)
+
+    searchSceneObjects(springMagic)
+
+    profiler = springProfile.Profiler() if springMagic.is_profile else springProfile.NullProfiler()
+    springMagic.profiler = profiler
+
+    solver, curve_cache = springScene.solve_chains(
+        MayaScene(is_keyless=True),
+        [obj.name() for obj in objs],
+        spring,
+        springMagic.start_frame,
+        springMagic.end_frame,
+        springMagic.sub_div,
+        springMagic.is_loop,
+        springMagic.is_pose_match,
+        springMagic.is_fast_move,
+        springMagic.wipe_subframe,
+        createColliderSet(springMagic),
+        createWindField(springMagic),
+        springMagic.worker_count,
+        profiler,
+        is_write=False,
+        solver_mode=springMagic.solver_mode,
+        iterations=springMagic.iterations,
+        is_adaptive=springMagic.is_adaptive,
+        sleep_tolerance=springMagic.sleep_tolerance)
+
+    profiler.stop()
+
+    SM_preview = SpringPreview(curve_cache, springMagic)
+    SM_preview.start()
+
+
+def stopPreview():
+    global SM_preview
+
+    if SM_preview:
+        SM_preview.stop()
+        SM_preview = None
+
+
+def commitPreview():
+    # key the previewed result
+    global SM_preview
+
+    if SM_preview:
+        SM_preview.commit()
+        SM_preview = None
+
+
+def searchSceneObjects(springMagic):
     # Search for collision objects
     if springMagic.is_collision:
-        springMagic.collision_planes_list = [get_node('*' + kCollisionPlaneSuffix + '*')]
+        springMagic.collision_planes_list = getCollisionPlanes()
 
-    # Search for a wind object
-    if pm.ls(kWindObjectName):
-        springMagic.wind = pm.ls(kWindObjectName)[0]
+    # Search for wind objects, every one blows
+    springMagic.wind_list = pm.ls(kWindObjectName + '*', type='transform')
 
-    SpringMagicMaya(objs, spring, springMagic, progression_callback)
 
-    cmds.autoKeyframe(state=autokeyframe_state)
+def createColliderSet(springMagic):
+    # Capsules, planes and floor used on every step, given by name to the solver
+    capsule_list = getCapsule(True) if springMagic.is_collision else []
+    capsule_ends_list = [pm.listRelatives(capsule, children=1, type='transform')[:2] for capsule in capsule_list]
+    collision_plane_list = springMagic.collision_planes_list if springMagic.is_collision and springMagic.collision_planes_list else []
+
+    return springCollision.ColliderSet(
+        capsule_names=[capsule.name() for capsule in capsule_list],
+        capsule_end_names=[[capsule_end.name() for capsule_end in capsule_ends] for capsule_ends in capsule_ends_list],
+        plane_names=[collision_plane.name() for collision_plane in collision_plane_list],
+        # plane vertices don't move in object space, only the planes world matrices are sampled
+        plane_vertex_positions_list=[[list(point) for point in collision_plane.getShape().getPoints(space='object')] for collision_plane in collision_plane_list],
+        floor=(cmds.upAxis(query=True, axis=True), springMagic.floor_height) if springMagic.is_floor else None)
+
+
+def createWindField(springMagic):
+    # Wind objects given by name to the solver, older ones have no turbulence
+    wind_name_list = [wind.name() for wind in springMagic.wind_list]
+
+    return springWind.WindField(
+        wind_name_list,
+        [wind_name for wind_name in wind_name_list if cmds.attributeQuery('Turbulence', node=wind_name, exists=True)])
+
+
+def exportShotData(file_path, objs, springMagic):
+    # Selected transforms, their hierarchy, colliders and wind in a file for springBatch
+    # animated channels are sampled on whole frames of the range
+    start_frame = springMagic.start_frame
+    end_frame = springMagic.end_frame
+    frame_list = range(start_frame, end_frame + 1)
+
+    searchSceneObjects(springMagic)
+    colliders = createColliderSet(springMagic)
+
+    scene = springScene.MemoryScene()
+    maya_scene = MayaScene()
+
+    node_list = [obj.name() for obj in objs] + colliders.capsule_names + colliders.plane_names
+    node_list += [end_name for end_names in colliders.capsule_end_names for end_name in end_names]
+
+    wind = createWindField(springMagic)
+    node_list += wind.emitter_names
+
+    # ancestors and descendants, parents first
+    node_set = set()
+    for node in node_list:
+        node_set.update([node] + maya_scene.descendants(node))
+
+        parent = maya_scene.parent(node)
+        while parent:
+            node_set.add(parent)
+            parent = maya_scene.parent(parent)
+
+    for node in sorted(node_set, key=lambda node: pm.PyNode(node).longName().count('|')):
+        rotate, rotate_order, rotate_axis, joint_orient, scale = maya_scene.rest_pose(node, start_frame)
+        scene.add_transform(node, maya_scene.parent(node), cmds.getAttr(node + '.translate', time=start_frame)[0], rotate, scale,
+                            rotate_order, rotate_axis, joint_orient)
+
+        for attribute in [attribute + axis for attribute in ['translate', 'rotate', 'scale'] for axis in 'XYZ']:
+            value_list = [cmds.getAttr(node + '.' + attribute, time=frame) for frame in frame_list]
+
+            if max(value_list) != min(value_list):
+                scene.set_keys(node, attribute, frame_list, value_list)
+
+    for wind_name, attribute in wind.value_keys():
+        value_list = [cmds.getAttr(wind_name + '.' + attribute, time=frame) for frame in frame_list]
+        scene.set_attribute(wind_name, attribute, value_list[0])
+
+        if max(value_list) != min(value_list):
+            scene.set_keys(wind_name, attribute, frame_list, value_list)
+
+    springBatch.saveShotData(file_path, scene, colliders, wind)
+
+
+# Checkpoints of the last calculation, the next one on the same bones resumes from its first changed frame
+SM_solveCheckpoints = springCheckpoint.SolveCheckpoints()
 
 
 # @decorators.viewportOff
@@ -579,200 +683,209 @@ def SpringMagicMaya(objs, spring, springMagic, progression_callback=None):
     end_frame = springMagic.end_frame
     sub_div = springMagic.sub_div
 
-    # remove all spring nulls, add recursive incase name spaces
-    pm.delete(pm.ls('*' + kNullSuffix + '*', recursive=True))
+    profiler = springProfile.Profiler() if springMagic.is_profile else springProfile.NullProfiler()
+    springMagic.profiler = profiler
 
-    # get all capsules in scene
-    capsule_list = getCapsule(True) if springMagic.is_collision else None
+    # remove spring nulls left by older versions, add recursive incase name spaces
+    pm.delete(pm.ls('*' + kNullSuffix + '*', recursive=True))
 
     if progression_callback:
         progression_callback(0)
 
-    # Save object previous frame information in a ordered dict
-    spring_data_dict = OrderedDict()
+    scene = MayaScene()
 
-    # Initialize data on the first frame
+    # Initialize data on the first frame, the keys of the range are replaced when the curves are written
     pm.currentTime(start_frame, edit=True)
 
     # Create a list of objects chains
-    # ie [[nt.Joint(u'joint1'), nt.Joint(u'joint2'), nt.Joint(u'joint4')], [nt.Joint(u'joint7'), nt.Joint(u'joint8'), nt.Joint(u'joint10')]]
-    all_joints_descendants_list = pm.listRelatives(objs, allDescendents=True, type='transform')
-    top_hierarchy_joints_list = [x for x in objs if x not in all_joints_descendants_list]
-
-    # transforms_chains_list = map(lambda x: [x] + [y for y in pm.listRelatives(x, allDescendents=True) if y in objs][::-1], top_hierarchy_joints_list)
-
-    # Deal with the specific case of root bone with no parent.
-    # The root bone is considered the driver, so we remove it from the calculation.
-    transforms_chains_list = map(lambda x: ([x] if x.getParent() else []) + [y for y in pm.listRelatives(x, allDescendents=True) if y in objs][::-1], top_hierarchy_joints_list)
-
-    # Remove empty lists
-    transforms_chains_list = [x for x in transforms_chains_list if x != []]
-
-    # Create progression bar generator values
-    number_of_progession_step = 0
-
-    if springMagic.is_pose_match:
-        number_of_progession_step += end_frame - start_frame + 1
-
-    if springMagic.is_loop:
-        # Doesn't process the first frame on the first loop
-        number_of_progession_step += ((end_frame - start_frame) * 2 + 1) * sub_div
-    else:
-        # Doesn't process the first frame
-        number_of_progession_step += (end_frame - start_frame) * sub_div
+    # ie [[u'joint1', u'joint2', u'joint4'], [u'joint7', u'joint8', u'joint10']]
+    # a root bone with no parent is considered the driver, it is removed from the calculation
+    transforms_chains_list = springScene.find_chains(scene, [obj.name() for obj in objs])
 
-    progression_increment = 100.0 / number_of_progession_step
-    progression_generator = frange(progression_increment, 100.0 + progression_increment, progression_increment)
+    # Create a bone for each transforms at start frame
+    bone_list = []
 
-    # Create spring data for each transforms at start frame
-    for transforms_chain in transforms_chains_list:
+    for chain_index, transforms_chain in enumerate(transforms_chains_list):
 
         if SpringMagicMaya.isInterrupted():
             break
 
-        transforms_cycle = cycle(transforms_chain)
-
-        # Prime the pump
-        parent = first_transform = next(transforms_cycle)
-        grand_parent = parent.getParent()
-        child = next(transforms_cycle)
-        grand_child = next(transforms_cycle)
-
-        # skip end bone
-        for transform in transforms_chain[:-1]:
-
-            if SpringMagicMaya.isInterrupted():
-                break
-
-            # End of cycle iteration
-            if grand_child == first_transform:
-                grand_child = None
+        with profiler.phase('setup', len(transforms_chain) - 1):
+            bone_list += springScene.create_chain_bones(scene, transforms_chain, chain_index, start_frame, springMagic.is_pose_match)
+
+    # Colliders, plane and wind used on every step
+    colliders = createColliderSet(springMagic)
+
+    solver = springSolver.SpringSolver(
+        spring,
+        bone_list,
+        colliders,
+        createWindField(springMagic),
+        sub_div,
+        springMagic.is_fast_move,
+        profiler,
+        springMagic.solver_mode,
+        springMagic.iterations,
+        springMagic.sleep_tolerance)
+
+    # Times of the steps, the first frame is skipped on first calculation pass
+    # Loop cycles compute first frame, until the chains end the range as they started it
+    # adaptive steps depend on the motion, the whole frames are sampled to pick them
+    cache = None
+    if springMagic.is_adaptive:
+        time_list, time_index_list, cache = springScene.sample_adaptive(scene, solver, start_frame, end_frame, sub_div, springMagic.is_loop)
+    else:
+        time_list, time_index_list = springScene.step_times(start_frame, end_frame, sub_div, springMagic.is_loop)
 
-            spring_data_dict[parent.name()] = SpringData(springMagic, spring, parent, child, grand_child, grand_parent)
+    # Create progression bar generator values
+    # pose match proxies are sampled with the rest of the scene, the steps are the only progression
+    # every loop cycle planned is counted, the progression ends once its chains settle
+    progression_increment = 100.0 / max(len(time_index_list), 1)
+    progression_generator = frange(progression_increment, 100.0 + progression_increment, progression_increment)
 
-            grand_parent, parent, child, grand_child = parent, child, grand_child, next(transforms_cycle)
+    collision_counters = springCollision.CollisionCounters()
 
-    # Save joints position over timeline
-    # Parse timeline just one time
-    if springMagic.is_pose_match:
-        for frame in range(0, end_frame - start_frame + 1):
+    def step_done():
+        progression = clamp(next(progression_generator, 100.0), 0, 100)
 
-            if SpringMagicMaya.isInterrupted():
-                break
+        if progression_callback:
+            progression_callback(progression)
 
-            pm.currentTime(start_frame + frame, edit=True)
+        SpringMagicMaya.progress(progression)
 
-            for spring_data in spring_data_dict.values():
+    # parallel solve progresses by solved partition
+    def partition_done(done_count, partition_count):
+        progression = clamp(100.0 * done_count / partition_count, 0, 100)
 
-                if not SpringMagicMaya.isInterrupted():
-                    spring_data.keyframe_child_proxy()
+        if progression_callback:
+            progression_callback(progression)
 
-            progression = progression_generator.next()
-            progression = clamp(progression, 0, 100)
+        SpringMagicMaya.progress(progression)
 
+    # Read all the scene values needed by the solver over the whole range in one pass, solve,
+    # then write all the solved keys at once, directly on the output times if subframes are wiped
+    if not SpringMagicMaya.isInterrupted():
+        output_time_list = getOutputTimes(springMagic)
+
+        springScene.solve_scene(
+            scene,
+            solver,
+            time_list,
+            time_index_list,
+            start_frame,
+            end_frame,
+            output_time_list,
+            springMagic.worker_count,
+            collision_counters,
+            SpringMagicMaya.isInterrupted,
+            step_done,
+            partition_done,
+            SM_solveCheckpoints,
+            cache=cache)
+
+        # a loop stops before the steps of the cycles its chains didn't need
+        if not SpringMagicMaya.isInterrupted():
             if progression_callback:
-                progression_callback(progression)
+                progression_callback(100.0)
 
-            SpringMagicMaya.progress(progression)
+            SpringMagicMaya.progress(100.0)
 
-    # Generate frame index
-    # Skip first frame on first calculation pass
-    frame_increment = 1.0 / sub_div
-    frame_generator = frange(frame_increment, end_frame - start_frame + frame_increment, frame_increment)
+    scene.delete_proxies()
 
-    # On second calculation pass compute first frame
-    if springMagic.is_loop:
-        frame_generator = chain(frame_generator, frange(0, end_frame - start_frame + frame_increment, frame_increment))
+    if len(colliders):
+        logging.info(collision_counters)
 
-    for frame in frame_generator:
+    if springMagic.sleep_tolerance > 0.0:
+        logging.info(collision_counters.sleep_summary())
 
-        # print('Frame: ' + str(frame))
+    profiler.stop()
 
-        if SpringMagicMaya.isInterrupted():
-            break
+    if profiler.enabled:
+        logging.info('Spring Magic profile\n{0}'.format(profiler))
 
-        pm.currentTime(start_frame + frame, edit=True)
 
-        for previous_frame_spring_data in spring_data_dict.values():
+def getPlug(node_name, attribute):
+    selection_list = om.MSelectionList()
+    selection_list.add(node_name)
 
-            if SpringMagicMaya.isInterrupted():
-                break
+    plug = om.MFnDependencyNode(selection_list.getDependNode(0)).findPlug(attribute, False)
 
-            grand_parent_spring_data = None
-            if previous_frame_spring_data.grand_parent and previous_frame_spring_data.grand_parent.name() in spring_data_dict.keys():
-                grand_parent_spring_data = spring_data_dict[previous_frame_spring_data.grand_parent.name()]
+    # world matrix is an array attribute, first instance is the one of the node
+    if plug.isArray:
+        plug = plug.elementByLogicalIndex(0)
 
-            # get current position of parent and child
-            parent_pos = get_translation(previous_frame_spring_data.parent)
+    return plug
 
-            # print("obj: " + str(previous_frame_spring_data.parent.name()))
 
-            new_child_pos = get_translation(previous_frame_spring_data.child_proxy)
+def readPlugs(cache, time_index, matrix_plug_list, value_plug_list, *context):
+    for plug_index, plug in enumerate(matrix_plug_list):
+        cache.matrices[time_index, plug_index] = np.reshape(list(om.MFnMatrixData(plug.asMObject(*context)).matrix()), (4, 4))
 
-            # Apply inertia
-            new_child_pos += previous_frame_spring_data.apply_inertia(new_child_pos)
+    for plug_index, plug in enumerate(value_plug_list):
+        cache.values[time_index, plug_index] = plug.asDouble(*context)
 
-            # apply wind
-            new_child_pos += previous_frame_spring_data.apply_wind(start_frame + frame)
 
-            # detect collision
-            has_collision, new_child_pos, child_pos_corrected = previous_frame_spring_data.detect_collision(parent_pos, new_child_pos, capsule_list)
+def sampleScene(time_list, matrix_key_list, value_key_list):
+    # Evaluate every needed plug for every (sub)frame in one pass
+    # plugs are evaluated in a time context, the timeline doesn't move
+    cache = springCache.SampleCache(time_list, matrix_key_list, value_key_list)
 
-            # detect plane collision
-            grand_parent_has_plane_collision = False
-            if grand_parent_spring_data:
-                grand_parent_has_plane_collision = grand_parent_spring_data.has_plane_collide
+    matrix_plug_list = [getPlug(node_name, attribute) for node_name, attribute in cache.matrix_keys]
+    value_plug_list = [getPlug(node_name, attribute) for node_name, attribute in cache.value_keys]
 
-            has_hit_plane, new_child_pos = previous_frame_spring_data.detect_plane_hit(parent_pos, new_child_pos, grand_parent_has_plane_collision)
+    time_unit = om.MTime.uiUnit()
 
-            # calculate upvector by interpolation y axis for twist
-            up_vector = previous_frame_spring_data.compute_up_vector()
+    for time_index, time in enumerate(cache.times):
+        context = om.MDGContext(om.MTime(time, time_unit))
 
-            # apply aim constraint to do actual rotation
-            previous_frame_spring_data.aim_by_ratio(up_vector, new_child_pos, child_pos_corrected)
+        if hasattr(om, 'MDGContextGuard'):
+            # Maya 2019 and above, plugs read in the guard are evaluated in its context
+            with om.MDGContextGuard(context):
+                readPlugs(cache, time_index, matrix_plug_list, value_plug_list)
+        else:
+            readPlugs(cache, time_index, matrix_plug_list, value_plug_list, context)
 
-            # Extend bone if needed (update child translation)
-            previous_frame_spring_data.extend_bone(child_pos_corrected)
+    # API matrices are in internal units, xform and the rest of the tool use UI units
+    cache.matrices[:, :, 3, :3] *= om.MDistance(1.0, om.MDistance.internalUnit()).asUnits(om.MDistance.uiUnit())
 
-            # Update current transform with the new values
-            previous_frame_spring_data.update(has_collision, has_hit_plane, child_pos_corrected)
+    return cache
 
-            # Update the grand parent has_child_collide value
-            if grand_parent_spring_data:
-                grand_parent_spring_data.has_child_collide = has_collision
 
-        progression = progression_generator.next()
-        progression = clamp(progression, 0, 100)
+def writeAnimCurves(curve_cache, start_frame, end_frame, output_time_list=None):
+    # One bulk write per attribute, replace the keys of the frame range
+    time_unit = om.MTime.uiUnit()
 
-        if progression_callback:
-            progression_callback(progression)
+    # curves store angles in radians and distances in internal unit
+    distance_factor = om.MDistance(1.0, om.MDistance.uiUnit()).asUnits(om.MDistance.internalUnit())
 
-        SpringMagicMaya.progress(progression)
+    for node_name, attribute in curve_cache.keys:
+        time_list, value_list = curve_cache.curve(node_name, attribute, output_time_list)
 
-    # bake result on frame
-    if springMagic.wipe_subframe and not SpringMagicMaya.isInterrupted():
-        transform_to_bake_list = [spring_data.parent for spring_data in spring_data_dict.values()]
+        if not len(time_list):
+            continue
 
-        # Deactivate all pairblend otherwise bake doesn't work with animation layers
-        for spring_data in spring_data_dict.values():
-            spring_data.set_pairblend_weight(0.0)
+        if attribute.startswith('rotate'):
+            value_list = np.radians(value_list)
+        else:
+            value_list = value_list * distance_factor
+
+        cmds.cutKey(node_name, attribute=attribute, time=(start_frame, end_frame + 0.99999), clear=True)
 
-        bakeAnim(transform_to_bake_list, start_frame, end_frame)
+        plug = getPlug(node_name, attribute)
+        anim_curve = oma.MFnAnimCurve()
+        anim_curve_list = oma.MAnimUtil.findAnimation(plug)
 
+        if len(anim_curve_list):
+            anim_curve.setObject(anim_curve_list[0])
+        else:
+            anim_curve.create(plug)
 
-def bakeAnim(objList, startFrame, endFrame):
-    pm.bakeResults(
-        objList,
-        t=(startFrame, endFrame),
-        sampleBy=1,
-        disableImplicitControl=False,
-        preserveOutsideKeys=True,
-        sparseAnimCurveBake=False,
-        removeBakedAttributeFromLayer=False,
-        bakeOnOverrideLayer=False,
-        minimizeRotation=True,
-        shape=False,
-        simulation=False)
+        anim_curve.addKeys(
+            om.MTimeArray([om.MTime(time, time_unit) for time in time_list]),
+            om.MDoubleArray(list(value_list)),
+            oma.MFnAnimCurve.kTangentGlobal,
+            oma.MFnAnimCurve.kTangentGlobal,
+            True)
 
 
 SM_boneTransformDict = {}
@@ -797,51 +910,6 @@ def pasteBonePose():
             obj.setRotation(SM_boneTransformDict[obj][1])
 
 
-def preCheckCollision(objPos, objLength, capsuleList):
-
-    # print('objPos:' + str(objPos))
-    # print('objLength:' + str(objLength))
-
-    # pre check bone length compare with collision body radius
-    # will improve performance if bone is far from capsule
-    for capsule in capsuleList:
-        capsule_children_list = pm.listRelatives(capsule, children=1, type='transform')
-
-        p = capsule_children_list[0].getTranslation(space='world')
-        q = capsule_children_list[1].getTranslation(space='world')
-        r = capsule.getAttr('scaleZ')
-
-        bone_to_capsule_distance = springMath.dist_to_line(p, q, objPos)
-
-        # print('p:' + str(p))
-        # print('q:' + str(q))
-        # print('r:' + str(r))
-        # print('boneToCapsuleDistance:' + str(bone_to_capsule_distance))
-
-        # means close enough to have a hit change
-        if bone_to_capsule_distance < objLength + r:
-            return True
-
-    return False
-
-
-def repeatMoveToPlane(obj, objPos, objTarget, colPlane, times):
-    # Y axis direction of plane
-    n = dt.Vector(get_matrix(colPlane)[4:7])
-    q = get_translation(colPlane)
-    d = n.dot(q)
-
-    # for i in range(times):
-    #     pt = objPos
-    #     obj.setTranslation(proj_pt_to_plane(pt, n, d), space='world')
-    #     if (i + 1) != times:
-    #         obj.setTranslation(get_translation(objTarget), space='world')
-    pt = objPos
-    outPos = springMath.proj_pt_to_plane(pt, n, d)
-
-    return outPos
-
-
 def setWireShading(obj, tmp):
     obj.getShape().overrideEnabled.set(True)
     obj.getShape().overrideShading.set(False)
@@ -924,6 +992,11 @@ def getCapsule(getAll):
     return cylinderLst
 
 
+def getCollisionPlanes():
+    # every collision plane transform of the scene
+    return pm.ls('*' + kCollisionPlaneSuffix + '*', type='transform')
+
+
 def addCapsuleBody():
     # create capsule body for collision
     # place capsule at ori point of nothing selected in scene
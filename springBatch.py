@@ -0,0 +1,288 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Command line batch runner, solves a queue of shots from a json config
+# python springBatch.py shots.json     shots exported with core.exportShotData
+# mayapy springBatch.py shots.json     Maya scene files as well
+#
+# {
+#     "workers": 4,
+#     "report": "report.json",
+#     "defaults": {"spring": {"ratio": 0.5, "twistRatio": 0.3}, "subDiv": 4.0, "isAdaptive": true},
+#     "shots": [
+#         {"name": "shot010", "data": "shot010.json", "output": "shot010_spring.json",
+#          "chains": ["hair_01", "tail_01"], "startFrame": 1001, "endFrame": 1100},
+#         {"name": "shot020", "scene": "shot020.mb", "output": "shot020_spring.mb",
+#          "chains": ["cape_root"], "startFrame": 1001, "endFrame": 1200, "isCollision": true, "solverMode": "verlet"}
+#     ]
+# }
+#
+#####################################################################################
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import timeit
+import traceback
+
+import springCollision
+import springProfile
+import springScene
+import springSolver
+import springWind
+
+from collections import OrderedDict
+
+kShotDefaults = OrderedDict([
+    ('spring', OrderedDict([('ratio', 0.5), ('twistRatio', 0.0), ('tension', 0.0), ('extend', 0.0), ('inertia', 0.0)])),
+    ('subDiv', 1.0),
+    ('isLoop', False),
+    ('isPoseMatch', False),
+    ('isCollision', False),
+    ('isFastMove', False),
+    ('wipeSubframe', True),
+    ('outputStep', 1.0),
+    ('solverMode', springSolver.kAimMode),
+    ('iterations', springSolver.kDefaultIterations),
+    ('isAdaptive', False),
+    ('sleepTolerance', 0.0),
+    ('isFloor', False),
+    ('floorHeight', 0.0),
+    ('upAxis', 'y'),
+    ('workerCount', 1),
+    ('profile', False)])
+
+
+def saveShotData(file_path, scene, colliders, wind=None):
+    # MemoryScene with the colliders and wind found in the Maya scene
+    shot_dict = OrderedDict([
+        ('scene', scene.to_dict()),
+        ('capsules', [[capsule_name] + list(end_names) for capsule_name, end_names in zip(colliders.capsule_names, colliders.capsule_end_names)]),
+        ('planes', [[plane_name, vertex_positions.tolist()] for plane_name, vertex_positions in zip(colliders.plane_names, colliders.plane_vertex_positions_list)]),
+        ('wind', [[emitter_name, emitter_name in wind.turbulent_names] for emitter_name in wind.emitter_names] if wind else [])])
+
+    with open(file_path, 'w') as json_file:
+        json.dump(shot_dict, json_file)
+
+
+def loadShotData(file_path):
+    # return the scene, capsule names and ends, planes and wind field
+    with open(file_path) as json_file:
+        shot_dict = json.load(json_file)
+
+    # older files have a single emitter name or None
+    emitter_list = shot_dict['wind'] or []
+    if not isinstance(emitter_list, list):
+        emitter_list = [[emitter_list, False]]
+
+    return (springScene.MemoryScene.from_dict(shot_dict['scene']),
+            [(capsule[0], capsule[1:]) for capsule in shot_dict['capsules']],
+            [(plane[0], plane[1]) for plane in shot_dict['planes']],
+            springWind.WindField([emitter_name for emitter_name, is_turbulent in emitter_list],
+                                 [emitter_name for emitter_name, is_turbulent in emitter_list if is_turbulent]))
+
+
+def shotSettings(shot, defaults=None):
+    # shot values over config defaults over kShotDefaults
+    settings = OrderedDict()
+
+    for layer in [kShotDefaults, defaults or {}, shot]:
+        for key, value in layer.items():
+            if key == 'spring':
+                settings['spring'] = OrderedDict(list(settings.get('spring', {}).items()) + list(value.items()))
+            else:
+                settings[key] = value
+
+    return settings
+
+
+def createSpring(settings):
+    return springSolver.Spring(**settings['spring'])
+
+
+def runMemoryShot(settings, profiler, counters):
+    scene, capsule_list, plane_list, wind = loadShotData(settings['data'])
+
+    if not settings['isCollision']:
+        capsule_list = []
+        plane_list = []
+
+    colliders = springCollision.ColliderSet(
+        [capsule_name for capsule_name, end_names in capsule_list],
+        [end_names for capsule_name, end_names in capsule_list],
+        [plane_name for plane_name, vertex_positions in plane_list],
+        [vertex_positions for plane_name, vertex_positions in plane_list],
+        (settings['upAxis'], settings['floorHeight']) if settings['isFloor'] else None)
+
+    solver, curve_cache = springScene.solve_chains(
+        scene, settings['chains'], createSpring(settings), settings['startFrame'], settings['endFrame'], settings['subDiv'],
+        settings['isLoop'], settings['isPoseMatch'], settings['isFastMove'], settings['wipeSubframe'],
+        colliders, wind, settings['workerCount'], profiler, counters, output_step=settings['outputStep'],
+        solver_mode=settings['solverMode'], iterations=settings['iterations'], is_adaptive=settings['isAdaptive'],
+        sleep_tolerance=settings['sleepTolerance'])
+
+    # solved keys are in the scene, the output can be solved again
+    if settings.get('output'):
+        saveShotData(settings['output'], scene, colliders, wind)
+
+    return solver
+
+
+def runMayaShot(settings, profiler, counters):
+    # needs mayapy, maya.standalone is initialized by the worker
+    import pymel.core as pm
+    import core
+
+    pm.openFile(settings['scene'], force=True)
+
+    springMagic = core.SpringMagic(
+        settings['startFrame'], settings['endFrame'], settings['subDiv'], settings['isLoop'], settings['isPoseMatch'],
+        settings['isCollision'], settings['isFastMove'], settings['wipeSubframe'], settings['isFloor'], settings['floorHeight'],
+        settings['workerCount'], outputStep=settings['outputStep'], solverMode=settings['solverMode'], iterations=settings['iterations'],
+        isAdaptive=settings['isAdaptive'], sleepTolerance=settings['sleepTolerance'])
+
+    core.searchSceneObjects(springMagic)
+
+    spring = createSpring(settings)
+    scene = core.MayaScene()
+
+    pm.currentTime(settings['startFrame'], edit=True)
+
+    solver, curve_cache = springScene.solve_chains(
+        scene, settings['chains'], spring, settings['startFrame'], settings['endFrame'], settings['subDiv'],
+        settings['isLoop'], settings['isPoseMatch'], settings['isFastMove'], settings['wipeSubframe'],
+        core.createColliderSet(springMagic), core.createWindField(springMagic),
+        settings['workerCount'], profiler, counters, output_step=settings['outputStep'],
+        solver_mode=settings['solverMode'], iterations=settings['iterations'], is_adaptive=settings['isAdaptive'],
+        sleep_tolerance=settings['sleepTolerance'])
+
+    output = settings.get('output') or settings['scene']
+    pm.saveAs(output, force=True, type='mayaBinary' if output.lower().endswith('.mb') else 'mayaAscii')
+
+    return solver
+
+
+def runShot(shot, defaults=None):
+    # report of one shot, errors are reported instead of stopping the queue
+    settings = shotSettings(shot, defaults)
+
+    report = OrderedDict([
+        ('name', settings.get('name') or settings.get('data') or settings.get('scene')),
+        ('status', 'ok'),
+        ('time', 0.0),
+        ('bones', 0),
+        ('steps', 0)])
+
+    profiler = springProfile.Profiler() if settings['profile'] else springProfile.NullProfiler()
+    counters = springCollision.CollisionCounters()
+    start_time = timeit.default_timer()
+
+    try:
+        if settings.get('scene'):
+            solver = runMayaShot(settings, profiler, counters)
+        else:
+            solver = runMemoryShot(settings, profiler, counters)
+
+        report['bones'] = len(solver.bones)
+        report['steps'] = counters.step_count
+        report['skippedBoneSteps'] = counters.skipped_bone_step_count
+    except Exception:
+        report['status'] = 'failed'
+        report['error'] = traceback.format_exc()
+
+    report['time'] = timeit.default_timer() - start_time
+
+    profiler.stop()
+
+    if profiler.enabled:
+        report['profile'] = profiler.to_dict()
+
+    return report
+
+
+def initializeWorker(is_maya):
+    if is_maya:
+        import maya.standalone
+        maya.standalone.initialize(name='python')
+
+
+def runShotArguments(arguments):
+    return runShot(*arguments)
+
+
+def runBatch(config, worker_count=None, report_path=None):
+    # solve all the shots, one per worker, return the reports in the config order
+    worker_count = worker_count or config.get('workers', 1)
+    defaults = config.get('defaults', {})
+    shot_list = config['shots']
+
+    # pool workers can't start a pool of their own
+    if worker_count > 1:
+        defaults = OrderedDict(list(defaults.items()) + [('workerCount', 1)])
+        shot_list = [OrderedDict([(key, value) for key, value in shot.items() if key != 'workerCount']) for shot in shot_list]
+
+    is_maya = any(shot.get('scene') for shot in shot_list)
+
+    if worker_count > 1 and len(shot_list) > 1:
+        pool = multiprocessing.Pool(min(worker_count, len(shot_list)), initializeWorker, (is_maya,))
+
+        try:
+            report_list = pool.map(runShotArguments, [(shot, defaults) for shot in shot_list], chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        initializeWorker(is_maya)
+        report_list = [runShot(shot, defaults) for shot in shot_list]
+
+    report_path = report_path or config.get('report')
+    if report_path:
+        with open(report_path, 'w') as json_file:
+            json.dump(report_list, json_file, indent=4)
+
+    return report_list
+
+
+def summary(report_list):
+    line_list = ['{0:<30} {1:>8} {2:>8} {3:>8} {4:>10}'.format('shot', 'status', 'bones', 'steps', 'time (s)')]
+
+    for report in report_list:
+        line_list.append('{0:<30} {1:>8} {2:>8} {3:>8} {4:>10.2f}'.format(
+            report['name'], report['status'], report['bones'], report['steps'], report['time']))
+
+    line_list.append('{0:<30} {1:>8} {2:>8} {3:>8} {4:>10.2f}'.format(
+        'total', '{0}/{1}'.format(sum(report['status'] == 'ok' for report in report_list), len(report_list)), '', '',
+        sum(report['time'] for report in report_list)))
+
+    for report in report_list:
+        if report['status'] != 'ok':
+            line_list += ['', report['name'], report['error']]
+
+    return '\n'.join(line_list)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Spring Magic batch runner')
+    parser.add_argument('config', help='json config of the shots')
+    parser.add_argument('--workers', type=int, default=None, help='shots solved at the same time')
+    parser.add_argument('--report', default=None, help='json file of the per shot reports')
+    args = parser.parse_args()
+
+    with open(args.config) as json_file:
+        config = json.load(json_file, object_pairs_hook=OrderedDict)
+
+    report_path = os.path.abspath(args.report) if args.report else None
+
+    # relative paths are relative to the config
+    os.chdir(os.path.dirname(os.path.abspath(args.config)))
+
+    report_list = runBatch(config, args.workers, report_path)
+    print(summary(report_list))
+
+    sys.exit(0 if all(report['status'] == 'ok' for report in report_list) else 1)
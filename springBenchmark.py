@@ -0,0 +1,645 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Solver benchmarks on synthetic rigs in a MemoryScene, no Maya scene needed
+# run from the springmagic folder: mayapy springBenchmark.py (or any python with numpy)
+# --save results.json then --baseline results.json compares a change with a previous run
+# --all also compares the cost per quality of the solver modes around colliders,
+# of the adaptive sub division against uniform ones, of sleeping settled chains and of the loop cycles
+# and times the preview of a 50 chains rig
+#
+#####################################################################################
+
+import argparse
+import json
+import timeit
+
+import numpy as np
+
+import springCache
+import springCheckpoint
+import springCollision
+import springMath
+import springProfile
+import springScene
+import springSolver
+import springWind
+
+from collections import OrderedDict
+
+
+def makeCapsules(capsule_count, size=100.0, seed=0):
+    # capsules spread in a size^3 box, as long as a forearm of a 180 units body
+    random = np.random.RandomState(seed)
+
+    p = random.uniform(0.0, size, (capsule_count, 3))
+    q = p + randomDirections(random, capsule_count) * random.uniform(10.0, 30.0, (capsule_count, 1))
+    r = random.uniform(2.0, 6.0, capsule_count)
+
+    return p, q, r
+
+
+def makeBones(bone_count, size=100.0, seed=1):
+    # previous and current child positions of moving bones
+    random = np.random.RandomState(seed)
+
+    pre_pos = random.uniform(0.0, size, (bone_count, 3))
+    cur_pos = pre_pos + randomDirections(random, bone_count) * random.uniform(0.5, 5.0, (bone_count, 1))
+
+    return cur_pos, pre_pos
+
+
+def randomDirections(random, count):
+    directions = random.normal(size=(count, 3))
+    return directions / np.linalg.norm(directions, axis=1)[:, None]
+
+
+def timeCall(function, repeat):
+    # best time of repeat calls, in milliseconds
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000.0
+
+
+def benchmarkBroadPhase(capsule_count_list=(5, 10, 20, 40, 60, 120, 240), bone_count=400, repeat=5):
+    # Capsule collision of bone_count bones, brute force bones x capsules against the broad phase grid
+    # the grid is rebuilt in every timed call, as it is on every step of a solve
+    cur_pos, pre_pos = makeBones(bone_count)
+
+    print('Capsule collision, {0} bones'.format(bone_count))
+    print('{0:>9} {1:>14} {2:>14} {3:>14} {4:>10}'.format('capsules', 'brute (ms)', 'grid (ms)', 'tested pairs', 'speed up'))
+
+    result_list = []
+
+    for capsule_count in capsule_count_list:
+        p, q, r = makeCapsules(capsule_count)
+
+        brute_result = springMath.check_collision_array(cur_pos, pre_pos, p, q, r, True)
+        snapshot = springCollision.CapsuleSnapshot(range(capsule_count), p, q, r)
+        grid_result = snapshot.check_collision(cur_pos, pre_pos, True)
+
+        # both must find the same hits
+        assert (brute_result[0] == grid_result[0]).all()
+        assert np.allclose(brute_result[1][brute_result[0]], grid_result[1][grid_result[0]])
+        assert (brute_result[2] == grid_result[2]).all()
+
+        brute_time = timeCall(lambda: springMath.check_collision_array(cur_pos, pre_pos, p, q, r, True), repeat)
+        grid_time = timeCall(lambda: springCollision.CapsuleSnapshot(range(capsule_count), p, q, r).check_collision(cur_pos, pre_pos, True), repeat)
+
+        print('{0:>9} {1:>14.2f} {2:>14.2f} {3:>14} {4:>9.1f}x'.format(
+            capsule_count, brute_time, grid_time, snapshot.pair_query_count, brute_time / grid_time))
+
+        result_list.append((capsule_count, brute_time, grid_time, snapshot.pair_query_count))
+
+    return result_list
+
+
+def makeRig(chain_count, bone_count, frame_count=100, capsule_count=0, plane_count=0, is_floor=False, is_wind=False, wind_count=1, is_turbulence=False, seed=0,
+            hold_ratio=0.0, is_cyclic=False, **kwargs):
+    # Synthetic rig in a MemoryScene: chains of joints along X, each under a swinging driver
+    # bone_count is a number of bones or a (min, max) range drawn for each chain
+    # drivers hold their pose over the last hold_ratio of the frames, cyclic drivers hold it in their start pose
+    # return the scene, the transforms to solve, the colliders and the wind
+    random = np.random.RandomState(seed)
+
+    scene = springScene.MemoryScene()
+    node_name_list = []
+
+    # drivers are keyed on every frame
+    key_times = np.arange(frame_count + 1, dtype=float)
+    motion_times = np.minimum(key_times, frame_count * (1.0 - hold_ratio))
+
+    # whole periods over the motion of cyclic drivers
+    frequencies = [0.15, 0.1, 0.2]
+    if is_cyclic:
+        motion_length = frame_count * (1.0 - hold_ratio)
+        frequencies = [2 * np.pi * max(round(frequency * motion_length / (2 * np.pi)), 1) / motion_length for frequency in frequencies]
+
+    for chain_index in range(chain_count):
+        driver_name = 'driver{0}'.format(chain_index)
+        position = random.uniform(-50.0, 50.0, 3)
+        phase = random.uniform(0.0, 2 * np.pi)
+
+        scene.add_transform(driver_name)
+        scene.set_keys(driver_name, 'translateX', key_times, position[0] + 10.0 * np.sin(motion_times * frequencies[0] + phase))
+        scene.set_keys(driver_name, 'translateY', key_times, position[1] + 5.0 * np.cos(motion_times * frequencies[1]))
+        scene.set_keys(driver_name, 'translateZ', key_times, np.full(len(key_times), position[2]))
+        scene.set_keys(driver_name, 'rotateZ', key_times, 40.0 * np.sin(motion_times * frequencies[2] + phase))
+
+        # slightly bent chains, bone_count bones aiming at the next joint
+        chain_bone_count = bone_count if np.isscalar(bone_count) else random.randint(bone_count[0], bone_count[1] + 1)
+        length = random.uniform(2.0, 5.0)
+        parent = driver_name
+
+        for index in range(chain_bone_count + 1):
+            joint_name = 'chain{0}_joint{1}'.format(chain_index, index)
+            scene.add_transform(joint_name, parent, translate=(length if index else 0.0, 0.0, 0.0), joint_orient=random.uniform(-15.0, 15.0, 3))
+
+            node_name_list.append(joint_name)
+            parent = joint_name
+
+    # capsules in the chains area
+    capsule_names = ['capsule{0}'.format(index) for index in range(capsule_count)]
+    capsule_end_names = [[capsule_name + '_a', capsule_name + '_b'] for capsule_name in capsule_names]
+
+    p, q, r = makeCapsules(capsule_count, size=100.0, seed=seed)
+
+    for capsule_name, end_names, capsule_p, capsule_q, radius in zip(capsule_names, capsule_end_names, p - 50.0, q - 50.0, r):
+        scene.add_transform(capsule_name, scale=(1.0, 1.0, radius))
+
+        for end_name, position in zip(end_names, [capsule_p, capsule_q]):
+            scene.add_transform(end_name, translate=position)
+
+    # 40 units wide planes, slightly tilted, under the chains
+    plane_names = ['plane{0}'.format(index) for index in range(plane_count)]
+    plane_vertex_positions = [[-0.5, 0.0, 0.5], [0.5, 0.0, 0.5], [-0.5, 0.0, -0.5], [0.5, 0.0, -0.5]]
+
+    for plane_name in plane_names:
+        scene.add_transform(plane_name, translate=random.uniform(-50.0, 50.0, 3), rotate=random.uniform(-20.0, 20.0, 3), scale=(40.0, 40.0, 40.0))
+
+    colliders = springCollision.ColliderSet(
+        capsule_names,
+        capsule_end_names,
+        plane_names,
+        [plane_vertex_positions] * plane_count,
+        ('y', -20.0) if is_floor else None)
+
+    # first wind blowing along X, the others from random directions
+    wind_names = ['wind'] + ['wind{0}'.format(index) for index in range(1, wind_count)] if is_wind else []
+
+    for index, wind_name in enumerate(wind_names):
+        scene.add_transform(wind_name, translate=random.uniform(-50.0, 50.0, 3) if index else (0.0, 0.0, 0.0), rotate=random.uniform(-180.0, 180.0, 3) if index else (0.0, 0.0, 0.0))
+
+        for attribute, value in zip(springWind.kWindAttributes, [1.0, 0.5, 1.0]):
+            scene.set_attribute(wind_name, attribute, value)
+
+        if is_turbulence:
+            for attribute, value in zip(springWind.kTurbulenceAttributes, [2.0, 0.1, index]):
+                scene.set_attribute(wind_name, attribute, value)
+
+    wind = springWind.WindField(wind_names, wind_names if is_turbulence else [])
+
+    return scene, node_name_list, colliders, wind
+
+
+def runPipeline(rig, frame_count, sub_div=1.0, is_loop=False, is_pose_match=False, worker_count=1, spring=None, profiler=None, counters=None,
+                mode=springSolver.kAimMode, iterations=springSolver.kDefaultIterations, is_adaptive=False, sleep_tolerance=0.0,
+                max_loop_cycles=springSolver.kMaxLoopCycles):
+    # every stage of a SpringMagicMaya calculation on a rig from makeRig
+    # return the solver, its curve cache and the time of each stage in milliseconds
+    # adaptive sub division picks the steps while sampling
+    scene, node_name_list, colliders, wind = rig
+    spring = spring or springSolver.Spring(ratio=0.5, twistRatio=0.3, tension=0.5, extend=0.0, inertia=0.5)
+
+    stage_time_dict = OrderedDict()
+    start_time = timeit.default_timer()
+
+    def stage_done(stage):
+        stage_time_dict[stage] = (timeit.default_timer() - start_time) * 1000.0 - sum(stage_time_dict.values())
+
+    bone_list = []
+    for chain_index, chain in enumerate(springScene.find_chains(scene, node_name_list)):
+        bone_list += springScene.create_chain_bones(scene, chain, chain_index, 0.0, is_pose_match)
+
+    solver = springSolver.SpringSolver(spring, bone_list, colliders, wind, sub_div, profiler=profiler, mode=mode, iterations=iterations,
+                                       sleep_tolerance=sleep_tolerance)
+    stage_done('setup')
+
+    if is_adaptive:
+        times, time_index_list, cache = springScene.sample_adaptive(scene, solver, 0, frame_count, sub_div, is_loop)
+    else:
+        times, time_index_list = springScene.step_times(0, frame_count, sub_div, is_loop, max_loop_cycles)
+
+        cache = scene.sample(times, solver.get_sampled_matrix_keys(), solver.get_sampled_value_keys())
+    stage_done('sample')
+
+    curve_cache = springCache.CurveCache(cache.times, solver.get_curve_keys())
+    solver.start(cache, curve_cache)
+    stage_done('start')
+
+    if worker_count > 1:
+        springSolver.solve_parallel(solver, cache, curve_cache, time_index_list, worker_count, counters)
+    else:
+        solver.solve(cache, curve_cache, time_index_list, counters)
+    stage_done('solve')
+
+    scene.write_curves(curve_cache, 0, frame_count, range(frame_count + 1))
+    scene.delete_proxies()
+    stage_done('write')
+
+    return solver, curve_cache, stage_time_dict
+
+
+def solvedPositions(scene, solver, frame_count):
+    # world positions of the solved bones children on every frame, (bones, frames, 3)
+    times = np.arange(frame_count + 1, dtype=float)
+    world_matrix_cache = {}
+
+    return np.array([scene.world_matrices(bone.child, times, world_matrix_cache)[:, 3, :3] for bone in solver.bones.values()])
+
+
+def capsuleDepths(positions, capsule_snapshot):
+    # depth of (N, 3) positions in the deepest capsule, 0 outside of all of them
+    p, q, r = capsule_snapshot.p, capsule_snapshot.q, capsule_snapshot.r
+    axis = q - p
+
+    if not len(r):
+        return np.zeros(len(positions))
+
+    t = np.clip(np.einsum('nck,ck->nc', positions[:, None] - p, axis) / np.maximum(np.einsum('ck,ck->c', axis, axis), 1e-8), 0.0, 1.0)
+    distances = np.linalg.norm(positions[:, None] - (p + t[..., None] * axis), axis=-1)
+
+    return np.maximum(r - distances, 0.0).max(axis=1)
+
+
+def sameCurves(curve_cache, other_curve_cache):
+    # bitwise identical results, NaN of unsolved steps included
+    return (np.array_equal(np.isnan(curve_cache.values), np.isnan(other_curve_cache.values)) and
+            np.array_equal(np.nan_to_num(curve_cache.values), np.nan_to_num(other_curve_cache.values)))
+
+
+# Rigs of the suite, from a single chain to a crowd, each feature on its own
+kBenchmarkCases = [
+    dict(name='1 chain', chain_count=1, bone_count=10),
+    dict(name='50 chains', chain_count=50, bone_count=(5, 30)),
+    dict(name='50 chains, 60 capsules', chain_count=50, bone_count=(5, 30), capsule_count=60),
+    dict(name='50 chains, 4 planes, floor', chain_count=50, bone_count=(5, 30), plane_count=4, is_floor=True),
+    dict(name='50 chains, wind, loop', chain_count=50, bone_count=(5, 30), is_wind=True, is_loop=True),
+    dict(name='50 chains, 3 turbulent winds', chain_count=50, bone_count=(5, 30), is_wind=True, wind_count=3, is_turbulence=True),
+    dict(name='50 chains, sub div 4', chain_count=50, bone_count=(5, 30), sub_div=4.0),
+    dict(name='50 chains, sub div 8', chain_count=50, bone_count=(5, 30), sub_div=8.0, frame_count=25),
+    dict(name='50 chains, 2 workers', chain_count=50, bone_count=(5, 30), worker_count=2),
+    dict(name='50 chains, 8 workers', chain_count=50, bone_count=(5, 30), worker_count=8),
+    dict(name='500 chains, everything', chain_count=500, bone_count=(5, 30), capsule_count=60, plane_count=4, is_floor=True, is_wind=True, frame_count=10),
+]
+
+
+def benchmarkSuite(case_list=kBenchmarkCases, frame_count=50, repeat=1, baseline=None, is_profile=False):
+    # Time each stage of the pipeline on the synthetic rigs, best of repeat runs
+    # baseline is a result list of a previous run, compared by case name
+    # with is_profile the solver phases of the last run of each case are printed too
+    baseline_dict = dict((result['name'], result) for result in baseline or [])
+
+    print('{0:<28} {1:>6} {2:>6} {3:>10} {4:>10} {5:>10} {6:>10} {7:>10} {8:>12} {9:>10}'.format(
+        'case', 'bones', 'steps', 'setup', 'sample', 'start', 'solve', 'write', 'us/bone step', 'baseline'))
+
+    result_list = []
+
+    for case in case_list:
+        case = dict(case)
+        case.setdefault('frame_count', frame_count)
+
+        stage_time_list = []
+        for _ in range(repeat):
+            profiler = springProfile.Profiler() if is_profile else None
+            counters = springCollision.CollisionCounters()
+            solver, _, stage_time_dict = runPipeline(makeRig(**case), case['frame_count'], case.get('sub_div', 1.0), case.get('is_loop', False), profiler=profiler,
+                                                     counters=counters, worker_count=case.get('worker_count', 1))
+            stage_time_list.append(stage_time_dict)
+
+        stage_time_dict = dict((stage, min(stage_times[stage] for stage_times in stage_time_list)) for stage in stage_time_list[0])
+
+        # loops stop once their chains settle
+        step_count = counters.step_count
+        bone_step_time = stage_time_dict['solve'] * 1000.0 / (step_count * len(solver.bones))
+
+        result = dict(name=case['name'], bone_count=len(solver.bones), step_count=step_count, bone_step_time=bone_step_time, stage_times=stage_time_dict)
+        result_list.append(result)
+
+        # solve time ratio to the baseline, above 1 is slower
+        baseline_result = baseline_dict.get(case['name'])
+        ratio = '{0:.2f}x'.format(stage_time_dict['solve'] / baseline_result['stage_times']['solve']) if baseline_result else '-'
+
+        print('{0:<28} {1:>6} {2:>6} {3:>10.1f} {4:>10.1f} {5:>10.1f} {6:>10.1f} {7:>10.1f} {8:>12.1f} {9:>10}'.format(
+            case['name'], len(solver.bones), step_count, stage_time_dict['setup'], stage_time_dict['sample'], stage_time_dict['start'],
+            stage_time_dict['solve'], stage_time_dict['write'], bone_step_time, ratio))
+
+        if is_profile:
+            profiler.stop()
+            print(profiler)
+            print('')
+
+    return result_list
+
+
+# Solver modes compared around colliders: (mode, sub division, iterations)
+kSolverModeSettings = [
+    (springSolver.kAimMode, 1.0, 0),
+    (springSolver.kAimMode, 2.0, 0),
+    (springSolver.kAimMode, 4.0, 0),
+    (springSolver.kAimMode, 8.0, 0),
+    (springSolver.kVerletMode, 1.0, 1),
+    (springSolver.kVerletMode, 1.0, 2),
+    (springSolver.kVerletMode, 1.0, 4),
+    (springSolver.kVerletMode, 1.0, 8),
+]
+
+
+def benchmarkSolverModes(setting_list=kSolverModeSettings, chain_count=20, bone_count=(5, 20), frame_count=30, capsule_count=120):
+    # Cost per quality of the aim mode sub divisions against the verlet mode iterations, chains among capsules
+    # inside is the share of solved bones in a capsule on the keyed frames, depth their mean depth in a capsule
+    # jitter is the mean frame to frame acceleration of the solved bones, lower is smoother
+    print('Solver modes, {0} chains, {1} frames, {2} capsules'.format(chain_count, frame_count, capsule_count))
+    print('{0:>8} {1:>8} {2:>10} {3:>12} {4:>10} {5:>10} {6:>10}'.format('mode', 'sub div', 'iterations', 'solve (ms)', 'inside %', 'depth', 'jitter'))
+
+    result_list = []
+
+    for mode, sub_div, iterations in setting_list:
+        # solving writes the curves, start from a new rig each time
+        rig = makeRig(chain_count, bone_count, frame_count, capsule_count=capsule_count)
+        scene, node_name_list, colliders, wind = rig
+
+        solver, _, stage_time_dict = runPipeline(rig, frame_count, sub_div, mode=mode, iterations=iterations)
+
+        positions = solvedPositions(scene, solver, frame_count)
+
+        # capsules of the rig don't move
+        capsule_snapshot, _ = colliders.snapshots(scene.sample([0.0], colliders.matrix_keys(), colliders.value_keys()), 0)
+        depths = capsuleDepths(positions.reshape(-1, 3), capsule_snapshot)
+
+        inside = 100.0 * np.mean(depths > 1e-3)
+        depth = depths.mean()
+        jitter = np.linalg.norm(positions[:, 2:] - 2 * positions[:, 1:-1] + positions[:, :-2], axis=-1).mean()
+
+        print('{0:>8} {1:>8.0f} {2:>10} {3:>12.1f} {4:>10.2f} {5:>10.4f} {6:>10.3f}'.format(
+            mode, sub_div, iterations if mode == springSolver.kVerletMode else '-', stage_time_dict['solve'], inside, depth, jitter))
+
+        result_list.append((mode, sub_div, iterations, stage_time_dict['solve'], inside, depth, jitter))
+
+    return result_list
+
+
+# Sub divisions compared on a rig holding its pose after an action: (sub division, adaptive)
+kAdaptiveSettings = [
+    (1.0, False),
+    (2.0, False),
+    (4.0, False),
+    (8.0, False),
+    (8.0, True),
+]
+
+
+def benchmarkAdaptive(setting_list=kAdaptiveSettings, chain_count=20, bone_count=(5, 15), frame_count=60, capsule_count=120, hold_ratio=0.5):
+    # Cost per quality of the adaptive sub division against uniform ones, the drivers hold their pose
+    # over the last hold_ratio of the frames, error is the mean distance of the solved bones on the keyed
+    # frames to the ones of the highest uniform sub division, in bone lengths
+    print('Adaptive sub division, {0} chains, {1} frames, {2} capsules, {3:.0f}% held'.format(chain_count, frame_count, capsule_count, 100 * hold_ratio))
+    print('{0:>8} {1:>9} {2:>8} {3:>12} {4:>12} {5:>10} {6:>10}'.format('sub div', 'adaptive', 'steps', 'sample (ms)', 'solve (ms)', 'error', 'inside %'))
+
+    reference_sub_div = max(sub_div for sub_div, is_adaptive in setting_list if not is_adaptive)
+    result_list = []
+    position_dict = {}
+
+    # the reference first
+    for sub_div, is_adaptive in sorted(setting_list, key=lambda setting: setting != (reference_sub_div, False)):
+        rig = makeRig(chain_count, bone_count, frame_count, capsule_count=capsule_count, hold_ratio=hold_ratio)
+        scene, node_name_list, colliders, wind = rig
+
+        counters = springCollision.CollisionCounters()
+        solver, _, stage_time_dict = runPipeline(rig, frame_count, sub_div, counters=counters, is_adaptive=is_adaptive)
+
+        positions = solvedPositions(scene, solver, frame_count)
+        position_dict[(sub_div, is_adaptive)] = positions
+
+        error = np.mean(np.linalg.norm(positions - position_dict[(reference_sub_div, False)], axis=-1) / solver.store.bone_length[:, None])
+
+        capsule_snapshot, _ = colliders.snapshots(scene.sample([0.0], colliders.matrix_keys(), colliders.value_keys()), 0)
+        inside = 100.0 * np.mean(capsuleDepths(positions.reshape(-1, 3), capsule_snapshot) > 1e-3)
+
+        result_list.append((sub_div, is_adaptive, counters.step_count, stage_time_dict['sample'], stage_time_dict['solve'], error, inside))
+
+    for result in sorted(result_list, key=lambda result: (result[1], result[0])):
+        print('{0:>8.0f} {1:>9} {2:>8} {3:>12.1f} {4:>12.1f} {5:>10.4f} {6:>10.2f}'.format(result[0], 'yes' if result[1] else 'no', *result[2:]))
+
+    return result_list
+
+
+def benchmarkSleep(sleep_tolerance_list=(0.0, 1e-4, springSolver.kSleepTolerance, 1e-2), chain_count=20, bone_count=(5, 15), frame_count=300,
+                   capsule_count=60, hold_ratio=0.8):
+    # Bone steps skipped by sleeping chains on a long shot holding its pose over the last hold_ratio of the frames
+    # error is the largest difference of the solved rotations with the solve without sleep, in degrees
+    print('Sleeping chains, {0} chains, {1} frames, {2} capsules, {3:.0f}% held'.format(chain_count, frame_count, capsule_count, 100 * hold_ratio))
+    print('{0:>10} {1:>10} {2:>12} {3:>10}'.format('tolerance', 'skipped %', 'solve (ms)', 'error'))
+
+    reference_curve_cache = None
+    result_list = []
+
+    for sleep_tolerance in sleep_tolerance_list:
+        rig = makeRig(chain_count, bone_count, frame_count, capsule_count=capsule_count, hold_ratio=hold_ratio)
+
+        counters = springCollision.CollisionCounters()
+        _, curve_cache, stage_time_dict = runPipeline(rig, frame_count, counters=counters, sleep_tolerance=sleep_tolerance)
+
+        if reference_curve_cache is None:
+            reference_curve_cache = curve_cache
+
+        skipped = 100.0 * counters.skipped_bone_step_count / max(counters.bone_step_count, 1)
+        error = np.max(np.abs(curve_cache.values - reference_curve_cache.values))
+
+        print('{0:>10g} {1:>10.1f} {2:>12.1f} {3:>10.4f}'.format(sleep_tolerance, skipped, stage_time_dict['solve'], error))
+
+        result_list.append((sleep_tolerance, skipped, stage_time_dict['solve'], error))
+
+    return result_list
+
+
+# Loop settings: (ratio, inertia, frames), long springs on short cycles need more warm up
+kLoopSettings = [
+    (0.5, 0.5, 100),
+    (0.2, 0.5, 24),
+    (0.1, 0.5, 24),
+    (0.1, 0.8, 48),
+]
+
+
+def benchmarkLoop(setting_list=kLoopSettings, max_loop_cycle_list=(1, springSolver.kMaxLoopCycles), chain_count=20, bone_count=(3, 6), reference_cycles=16):
+    # Loop cycles solved until the chains settle on cyclic drivers, 1 cycle is the former fixed second pass
+    # passes is the number of bone steps solved over the ones of a pass of the range, error the largest
+    # distance of the solved bones on the keyed frames to the ones of a loop of reference_cycles cycles, in bone lengths
+    print('Loop cycles, {0} chains'.format(chain_count))
+    print('{0:>8} {1:>8} {2:>8} {3:>8} {4:>8} {5:>12} {6:>10}'.format('ratio', 'inertia', 'frames', 'cycles', 'passes', 'solve (ms)', 'error'))
+
+    result_list = []
+
+    for ratio, inertia, frame_count in setting_list:
+        spring = springSolver.Spring(ratio=ratio, twistRatio=0.3, tension=0.5, inertia=inertia)
+
+        position_dict = {}
+        for max_loop_cycles in (reference_cycles,) + tuple(max_loop_cycle_list):
+            rig = makeRig(chain_count, bone_count, frame_count, is_cyclic=True)
+
+            counters = springCollision.CollisionCounters()
+            solver, _, stage_time_dict = runPipeline(rig, frame_count, is_loop=True, spring=spring, counters=counters, max_loop_cycles=max_loop_cycles)
+            position_dict[max_loop_cycles] = solvedPositions(rig[0], solver, frame_count)
+
+            if max_loop_cycles == reference_cycles:
+                continue
+
+            pass_count = counters.bone_step_count / float(len(solver.bones) * frame_count)
+            error = np.max(np.linalg.norm(position_dict[max_loop_cycles] - position_dict[reference_cycles], axis=-1) / solver.store.bone_length[:, None])
+
+            print('{0:>8.2f} {1:>8.1f} {2:>8} {3:>8} {4:>8.2f} {5:>12.1f} {6:>10.4f}'.format(
+                ratio, inertia, frame_count, max_loop_cycles, pass_count, stage_time_dict['solve'], error))
+
+            result_list.append((ratio, inertia, frame_count, max_loop_cycles, pass_count, stage_time_dict['solve'], error))
+
+    return result_list
+
+
+def benchmarkParallel(worker_count_list=(1, 2, 4, 8), chain_count=64, bone_count=20, frame_count=100, capsule_count=20):
+    # Serial solve against the process pool, results must be identical
+    print('Parallel solve, {0} chains of {1} bones, {2} frames, {3} capsules'.format(chain_count, bone_count, frame_count, capsule_count))
+    print('{0:>9} {1:>14} {2:>10}'.format('workers', 'time (ms)', 'speed up'))
+
+    reference_curve_cache = None
+    result_list = []
+
+    for worker_count in worker_count_list:
+        # solving changes the bones state, start from a new rig each time
+        rig = makeRig(chain_count, bone_count, frame_count, capsule_count=capsule_count)
+        _, curve_cache, stage_time_dict = runPipeline(rig, frame_count, worker_count=worker_count)
+
+        if reference_curve_cache is None:
+            reference_curve_cache = curve_cache
+        else:
+            assert sameCurves(curve_cache, reference_curve_cache)
+
+        solve_time = stage_time_dict['solve']
+        print('{0:>9} {1:>14.2f} {2:>9.2f}x'.format(worker_count, solve_time, result_list[0][1] / solve_time if result_list else 1.0))
+
+        result_list.append((worker_count, solve_time))
+
+    return result_list
+
+
+def benchmarkSweep(variant_count_list=(1, 2, 4, 8), chain_count=50, bone_count=(5, 30), frame_count=50, capsule_count=20):
+    # Sweep of ratio values in one pass against a solve per value, results must be identical
+    print('Parameter sweep, {0} chains, {1} frames, {2} capsules'.format(chain_count, frame_count, capsule_count))
+    print('{0:>9} {1:>14} {2:>14} {3:>10}'.format('variants', 'sweep (ms)', 'solves (ms)', 'speed up'))
+
+    result_list = []
+
+    for variant_count in variant_count_list:
+        spring_list = [springSolver.Spring(ratio=ratio, twistRatio=0.3, tension=0.5, inertia=0.5) for ratio in np.linspace(0.2, 0.8, variant_count)]
+
+        scene, node_name_list, colliders, wind = makeRig(chain_count, bone_count, frame_count, capsule_count=capsule_count)
+
+        start_time = timeit.default_timer()
+        _, variant_curve_cache_list = springScene.sweep_chains(scene, node_name_list, spring_list, 0, frame_count, colliders=colliders)
+        sweep_time = (timeit.default_timer() - start_time) * 1000.0
+
+        solve_time = 0.0
+        for spring, variant_curve_cache in zip(spring_list, variant_curve_cache_list):
+            # solving writes the curves, start from a new rig each time
+            scene, node_name_list, colliders, wind = makeRig(chain_count, bone_count, frame_count, capsule_count=capsule_count)
+
+            start_time = timeit.default_timer()
+            _, curve_cache = springScene.solve_chains(scene, node_name_list, spring, 0, frame_count, wipe_subframe=False, colliders=colliders)
+            solve_time += (timeit.default_timer() - start_time) * 1000.0
+
+            assert sameCurves(variant_curve_cache, curve_cache)
+
+        print('{0:>9} {1:>14.2f} {2:>14.2f} {3:>9.2f}x'.format(variant_count, sweep_time, solve_time, solve_time / sweep_time))
+
+        result_list.append((variant_count, sweep_time, solve_time))
+
+    return result_list
+
+
+def benchmarkPreview(chain_count=50, bone_count=(5, 30), frame_count=50, capsule_count=20, repeat=3):
+    # Latency of the keyless preview: the solve before it shows, the values set on a time change
+    # and a calculation resumed from the checkpoints after an edit of the last frame
+    # the frame update is SpringPreview.update without the setAttr calls, which need Maya
+    spring = springSolver.Spring(ratio=0.5, twistRatio=0.3, tension=0.5, inertia=0.5)
+    scene, node_name_list, colliders, wind = makeRig(chain_count, bone_count, frame_count, capsule_count=capsule_count)
+
+    print('Preview, {0} chains, {1} frames, {2} capsules'.format(chain_count, frame_count, capsule_count))
+    print('{0:<28} {1:>10} {2:>14}'.format('stage', 'steps', 'time (ms)'))
+
+    def solve(checkpoints=None, is_write=True):
+        counters = springCollision.CollisionCounters()
+        start_time = timeit.default_timer()
+
+        _, curve_cache = springScene.solve_chains(scene, node_name_list, spring, 0, frame_count, colliders=colliders, counters=counters,
+                                                  checkpoints=checkpoints, is_write=is_write)
+
+        return curve_cache, counters.step_count, (timeit.default_timer() - start_time) * 1000.0
+
+    # a keyless solve leaves the scene as it is, every run is the same
+    preview_time_list = [solve(is_write=False) for _ in range(repeat)]
+    curve_cache, preview_step_count, _ = preview_time_list[0]
+    preview_time = min(solve_time for _, _, solve_time in preview_time_list)
+
+    # values of each frame grouped by plug, as the preview sets them
+    frame_list = range(frame_count + 1)
+    values = np.array([curve_cache.curve(node, attribute, frame_list)[1] for node, attribute in curve_cache.keys]).T
+
+    plug_dict = OrderedDict()
+    for key_index, (node, attribute) in enumerate(curve_cache.keys):
+        plug_dict.setdefault(node + ('.rotate' if attribute.startswith('rotate') else '.' + attribute), []).append(key_index)
+
+    plug_list = list(plug_dict.items())
+
+    def update_frames():
+        for frame_index in frame_list:
+            value_list = values[frame_index]
+
+            for plug, key_index_list in plug_list:
+                value_list[key_index_list].tolist()
+
+    update_time = timeCall(update_frames, repeat) / len(frame_list)
+
+    # an edit of the last frame of a driver resumes from the checkpoint before it
+    checkpoints = springCheckpoint.SolveCheckpoints()
+    _, full_step_count, full_time = solve(checkpoints)
+
+    resume_time_list = []
+    for index in range(repeat):
+        key_times, key_values = scene.curves[('driver0', 'translateY')]
+        scene.set_keys('driver0', 'translateY', key_times, np.where(key_times == frame_count, key_values + 1.0, key_values))
+
+        _, resume_step_count, resume_time = solve(checkpoints)
+        resume_time_list.append(resume_time)
+
+    for stage, step_count, stage_time in [
+            ('calculation', full_step_count, full_time),
+            ('preview solve', preview_step_count, preview_time),
+            ('frame update', '-', update_time),
+            ('last frame edit, resumed', resume_step_count, min(resume_time_list))]:
+        print('{0:<28} {1:>10} {2:>14.3f}'.format(stage, str(step_count), stage_time))
+
+    return OrderedDict([('calculation', full_time), ('preview', preview_time), ('update', update_time), ('resume', min(resume_time_list))])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Spring Magic solver benchmarks')
+    parser.add_argument('--frames', type=int, default=50, help='frames of the suite rigs')
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each case, the best one is kept')
+    parser.add_argument('--baseline', help='json results of a previous run to compare with')
+    parser.add_argument('--save', help='save the suite results to a json file')
+    parser.add_argument('--profile', action='store_true', help='print the solver phases of each case')
+    parser.add_argument('--all', action='store_true', help='also run the broad phase and parallel benchmarks')
+    arguments = parser.parse_args()
+
+    baseline = None
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    suite_result_list = benchmarkSuite(frame_count=arguments.frames, repeat=arguments.repeat, baseline=baseline, is_profile=arguments.profile)
+
+    if arguments.save:
+        with open(arguments.save, 'w') as save_file:
+            json.dump(suite_result_list, save_file, indent=4)
+
+    if arguments.all:
+        benchmarkBroadPhase()
+        benchmarkParallel()
+        benchmarkSweep()
+        benchmarkPreview()
+        benchmarkSolverModes()
+        benchmarkAdaptive()
+        benchmarkSleep()
+        benchmarkLoop()
@@ -0,0 +1,114 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Storage of the scene values sampled over the frame range
+# Filled in one pass before the calculation, then only read by the solver
+#
+#####################################################################################
+
+import numpy as np
+
+
+class SampleCache:
+
+    def __init__(self, times, matrix_keys, value_keys):
+        # keys are (node name, attribute name) tuples
+        self.times = np.asarray(times, dtype=float)
+
+        self.matrix_keys = list(matrix_keys)
+        self.value_keys = list(value_keys)
+
+        self.matrix_index = dict((key, index) for index, key in enumerate(self.matrix_keys))
+        self.value_index = dict((key, index) for index, key in enumerate(self.value_keys))
+
+        # contiguous arrays, time first so a whole (sub)frame is a single slice
+        self.matrices = np.zeros((len(self.times), len(self.matrix_keys), 4, 4))
+        self.values = np.zeros((len(self.times), len(self.value_keys)))
+
+    def __len__(self):
+        return len(self.times)
+
+    def matrix(self, node, attribute, time_index):
+        return self.matrices[time_index, self.matrix_index[(node, attribute)]]
+
+    def translation(self, node, attribute, time_index):
+        return self.matrices[time_index, self.matrix_index[(node, attribute)], 3, :3]
+
+    def value(self, node, attribute, time_index):
+        return self.values[time_index, self.value_index[(node, attribute)]]
+
+    def subset(self, matrix_keys, value_keys):
+        # copy of the cache limited to some keys, all the times are kept
+        cache = SampleCache(self.times, matrix_keys, value_keys)
+
+        cache.matrices[:] = self.matrices[:, [self.matrix_index[key] for key in cache.matrix_keys]]
+        cache.values[:] = self.values[:, [self.value_index[key] for key in cache.value_keys]]
+
+        return cache
+
+    @classmethod
+    def merge(cls, caches):
+        # one cache of all the times of caches sampled on the same keys, in time order
+        times = np.concatenate([cache.times for cache in caches])
+        order = np.argsort(times, kind='mergesort')
+
+        merged_cache = cls(times[order], caches[0].matrix_keys, caches[0].value_keys)
+        merged_cache.matrices[:] = np.concatenate([cache.matrices for cache in caches])[order]
+        merged_cache.values[:] = np.concatenate([cache.values for cache in caches])[order]
+
+        return merged_cache
+
+
+def curve_key(node, attribute, variant=0):
+    # curves of the variants of a sweep are told apart by a third value
+    return (node, attribute) if variant == 0 else (node, attribute, variant)
+
+
+class CurveCache:
+
+    def __init__(self, times, keys):
+        # Solved values of (node name, attribute name) keys for every step
+        # unsolved steps stay NaN and are never written
+        self.times = np.asarray(times, dtype=float)
+
+        self.keys = list(keys)
+        self.key_index = dict((key, index) for index, key in enumerate(self.keys))
+
+        self.values = np.full((len(self.times), len(self.keys)), np.nan)
+
+    def variant(self, variant):
+        # curves of one variant of a sweep, with the keys of a single solve
+        key_list = [key for key in self.keys if (key[2] if len(key) > 2 else 0) == variant]
+
+        curve_cache = CurveCache(self.times, [key[:2] for key in key_list])
+        curve_cache.values[:] = self.values[:, [self.key_index[key] for key in key_list]]
+
+        return curve_cache
+
+    def set_curves(self, keys, values):
+        # copy the (T, K) values of keys solved in another cache on the same times
+        # steps it didn't solve are kept
+        for index, key in enumerate(keys):
+            solved = ~np.isnan(values[:, index])
+            self.values[solved, self.key_index[key]] = values[solved, index]
+
+    def curve(self, node, attribute, output_times=None):
+        # return the solved times and values of an attribute
+        # resampled on output_times if given (inside the solved range only)
+        values = self.values[:, self.key_index[(node, attribute)]]
+        solved = ~np.isnan(values)
+
+        times = self.times[solved]
+        values = values[solved]
+
+        if output_times is None or not len(times):
+            return times, values
+
+        output_times = np.asarray(output_times, dtype=float)
+        output_times = output_times[(output_times >= times[0] - 1e-6) & (output_times <= times[-1] + 1e-6)]
+
+        return output_times, np.interp(output_times, times, values)
@@ -0,0 +1,122 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Incremental re-solve
+# SolveCheckpoints keeps the solver state after each whole frame of a calculation,
+# with the sampled values and settings it was solved from. The next calculation on
+# the same bones resumes from the last checkpoint before its first changed step,
+# the keys before it are left untouched
+# A loop keeps checkpoints on its first pass, every cycle after it is solved again
+#
+#####################################################################################
+
+import numpy as np
+
+from collections import OrderedDict
+
+
+def same_values(values, other_values):
+    # NaN stands for None in solver states
+    values = np.asarray(values)
+    other_values = np.asarray(other_values)
+
+    if values.shape != other_values.shape:
+        return False
+
+    if values.dtype.kind != 'f':
+        return np.array_equal(values, other_values)
+
+    return bool(np.all((values == other_values) | (np.isnan(values) & np.isnan(other_values))))
+
+
+class SolveCheckpoints:
+    # step positions are indices in the time_index_list of the calculation
+    # position -1 is the initial state, before the first step
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.signature = None
+        self.cache = None
+        self.time_index_list = None
+        self.curve_values = None
+        self.first_cycle_values = None
+        self.states = OrderedDict()
+
+    def __len__(self):
+        return len(self.states)
+
+    def checkpoint_positions(self, times, time_index_list):
+        # positions of the steps ending a whole frame, before the first cycle of a loop
+        # a changed step is first solved in the first pass, the cycles are solved again from it
+        time_index_list = list(time_index_list)
+        first_cycle_position = time_index_list.index(0) if 0 in time_index_list else len(time_index_list)
+
+        return [position for position, time_index in enumerate(time_index_list[:first_cycle_position]) if abs(times[time_index] - round(times[time_index])) < 1e-6]
+
+    def resume_position(self, solver, cache, time_index_list):
+        # position of the checkpoint to resume from, -1 to solve from the start
+        if (self.signature != solver.get_signature() or self.time_index_list != list(time_index_list)
+                or not np.array_equal(self.cache.times, cache.times)
+                or self.cache.matrix_keys != cache.matrix_keys or self.cache.value_keys != cache.value_keys):
+            return -1
+
+        # a new rest pose changes the start of every chain
+        initial_state = solver.get_state()
+        for field, values in self.states[-1].items():
+            if not same_values(values, initial_state[field]):
+                return -1
+
+        changed_time_list = solver.get_changed_times(cache, self.cache, self.curve_values)
+
+        # start frame holds the initial pose
+        if changed_time_list[0]:
+            return -1
+
+        first_changed_position = len(time_index_list)
+        for position, time_index in enumerate(time_index_list):
+            if changed_time_list[time_index]:
+                first_changed_position = position
+                break
+
+        return max(position for position in self.states if position < first_changed_position)
+
+    def resume(self, solver, cache, curve_cache, time_index_list):
+        # restore the solver and the solved curves before the first changed step
+        # return the position of the checkpoint, -1 if the calculation starts over
+        if self.signature is None:
+            return -1
+
+        position = self.resume_position(solver, cache, time_index_list)
+
+        if position >= 0:
+            solver.set_state(self.states[position])
+
+            # a loop compares its cycles with the values of the first pass
+            curve_cache.values[:] = self.curve_values if self.first_cycle_values is None else self.first_cycle_values
+
+        return position
+
+    def start(self, solver, cache, time_index_list, resume_position):
+        # checkpoints after resume_position are solved again
+        if resume_position < 0:
+            self.states = OrderedDict([(-1, solver.get_state())])
+        else:
+            self.states = OrderedDict((position, state) for position, state in self.states.items() if position <= resume_position)
+
+        self.signature = solver.get_signature()
+        self.cache = cache
+        self.time_index_list = list(time_index_list)
+
+    def add(self, position, state):
+        self.states[position] = state
+
+    def finish(self, curve_cache, first_cycle_values=None):
+        # solved values, and the ones a loop started its first cycle with
+        self.curve_values = curve_cache.values.copy()
+        self.first_cycle_values = None if first_cycle_values is None else first_cycle_values.copy()
@@ -0,0 +1,405 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Collider snapshots
+# Colliders are read once per (sub)frame into arrays, then every bone of every
+# level tests against these arrays instead of querying the scene again
+#
+#####################################################################################
+
+import numpy as np
+
+import springMath
+
+
+class CollisionCounters:
+    # Count scene queries done to build snapshots and bone tests done against them
+    # scene queries must grow with the number of colliders, not with bones x colliders
+    # bone steps of sleeping chains are skipped, not solved
+
+    def __init__(self):
+        self.step_count = 0
+        self.collider_count = 0
+        self.scene_query_count = 0
+        self.bone_query_count = 0
+        self.pair_query_count = 0
+        self.bone_step_count = 0
+        self.skipped_bone_step_count = 0
+
+    def add_step(self, *snapshot_list):
+        # all the collider snapshots of one step
+        self.step_count += 1
+        collider_count = 0
+
+        for snapshot in snapshot_list:
+            if snapshot is None:
+                continue
+
+            collider_count += len(snapshot)
+            self.scene_query_count += snapshot.scene_query_count
+            self.bone_query_count += snapshot.bone_query_count
+            self.pair_query_count += snapshot.pair_query_count
+
+        self.collider_count = max(self.collider_count, collider_count)
+
+    def add_bone_steps(self, bone_count, skipped_count):
+        # numpy counts are cast, the counters end up in json reports
+        self.bone_step_count += int(bone_count)
+        self.skipped_bone_step_count += int(skipped_count)
+
+    def merge(self, counters):
+        # counters of another solve of the same steps (a parallel partition)
+        self.step_count = max(self.step_count, counters.step_count)
+        self.collider_count = max(self.collider_count, counters.collider_count)
+        self.scene_query_count += counters.scene_query_count
+        self.bone_query_count += counters.bone_query_count
+        self.pair_query_count += counters.pair_query_count
+        self.bone_step_count += counters.bone_step_count
+        self.skipped_bone_step_count += counters.skipped_bone_step_count
+
+    def scene_queries_per_step(self):
+        return self.scene_query_count / float(max(self.step_count, 1))
+
+    def sleep_summary(self):
+        return 'Sleep: {0} of {1} bone steps skipped ({2:.1f}%)'.format(
+            self.skipped_bone_step_count, self.bone_step_count, 100.0 * self.skipped_bone_step_count / max(self.bone_step_count, 1))
+
+    def __str__(self):
+        return ('Collision: {0} steps with {1} colliders, {2:g} scene queries per step, '
+                '{3} bone queries read from snapshots, {4} bone x collider narrow phase tests').format(
+            self.step_count, self.collider_count, self.scene_queries_per_step(), self.bone_query_count, self.pair_query_count)
+
+
+def _expand_counts(counts):
+    # for items repeated counts times, return the item index and the rank in its repetition
+    counts = np.asarray(counts, dtype=int)
+    item_index = np.repeat(np.arange(len(counts)), counts)
+    rank = np.arange(len(item_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    return item_index, rank
+
+
+def bounding_boxes(p, q, r=0.0):
+    # axis aligned boxes of segments (N, 3) thickened by r
+    p = np.asarray(p, dtype=float).reshape(-1, 3)
+    q = np.asarray(q, dtype=float).reshape(-1, 3)
+    r = np.reshape(r, (-1, 1))
+
+    return np.minimum(p, q) - r, np.maximum(p, q) + r
+
+
+class CapsuleGrid:
+    # Uniform grid of capsules bounding boxes, broad phase of the capsule collision
+    # cells are about the size of a capsule, every capsule is stored in all the cells it covers
+    kMaxCellsPerAxis = 32
+
+    def __init__(self, lower, upper):
+        self.lower = np.asarray(lower, dtype=float).reshape(-1, 3)
+        self.upper = np.asarray(upper, dtype=float).reshape(-1, 3)
+
+        if not len(self.lower):
+            self.cell_keys = self.cell_capsules = np.zeros(0, dtype=int)
+            return
+
+        self.origin = self.lower.min(axis=0)
+        span = self.upper.max(axis=0) - self.origin
+
+        # median size to not let a single big capsule (a floor) make cells huge
+        cell_size = np.median((self.upper - self.lower).max(axis=1))
+        self.cell_size = max(cell_size, span.max() / self.kMaxCellsPerAxis, springMath.SM_EPSILON)
+        self.shape = np.maximum(np.ceil(span / self.cell_size).astype(int), 1)
+
+        capsule_index, cell_keys = self.box_cells(self.lower, self.upper)
+
+        order = np.argsort(cell_keys, kind='mergesort')
+        self.cell_keys = cell_keys[order]
+        self.cell_capsules = capsule_index[order]
+
+    def __len__(self):
+        return len(self.lower)
+
+    def box_cells(self, lower, upper):
+        # (box index, cell key) for every cell covered by the boxes, boxes outside of the grid cover no cell
+        lower_cells = np.floor((lower - self.origin) / self.cell_size).astype(int)
+        upper_cells = np.floor((upper - self.origin) / self.cell_size).astype(int)
+
+        inside = np.all(upper_cells >= 0, axis=1) & np.all(lower_cells < self.shape, axis=1)
+
+        lower_cells = np.clip(lower_cells, 0, self.shape - 1)
+        upper_cells = np.clip(upper_cells, 0, self.shape - 1)
+        spans = upper_cells - lower_cells + 1
+
+        box_index, rank = _expand_counts(np.where(inside, spans.prod(axis=1), 0))
+        spans = spans[box_index]
+
+        cells = lower_cells[box_index] + np.stack([rank // (spans[:, 1] * spans[:, 2]),
+                                                   (rank // spans[:, 2]) % spans[:, 1],
+                                                   rank % spans[:, 2]], axis=1)
+
+        return box_index, (cells[:, 0] * self.shape[1] + cells[:, 1]) * self.shape[2] + cells[:, 2]
+
+    def query(self, lower, upper):
+        # (box index, capsule index) pairs of overlapping boxes, sorted by box then capsule
+        lower = np.asarray(lower, dtype=float).reshape(-1, 3)
+        upper = np.asarray(upper, dtype=float).reshape(-1, 3)
+
+        if not len(self) or not len(lower):
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+        box_index, cell_keys = self.box_cells(lower, upper)
+
+        # capsules stored in every covered cell
+        starts = np.searchsorted(self.cell_keys, cell_keys, side='left')
+        counts = np.searchsorted(self.cell_keys, cell_keys, side='right') - starts
+
+        cell_index, rank = _expand_counts(counts)
+        box_index = box_index[cell_index]
+        capsule_index = self.cell_capsules[starts[cell_index] + rank]
+
+        # a pair is found once per shared cell
+        pair_keys = np.unique(box_index * len(self) + capsule_index)
+        box_index = pair_keys // len(self)
+        capsule_index = pair_keys % len(self)
+
+        overlap = np.all(lower[box_index] <= self.upper[capsule_index], axis=1)
+        overlap &= np.all(upper[box_index] >= self.lower[capsule_index], axis=1)
+
+        return box_index[overlap], capsule_index[overlap]
+
+
+class CapsuleSnapshot:
+    # Every capsule of the scene at one step
+    # p, q are (M, 3) end positions, r is (M,) radius
+
+    def __init__(self, capsule_names, p, q, r, scene_query_count=0):
+        self.capsule_names = list(capsule_names)
+        self.p = np.asarray(p, dtype=float).reshape(-1, 3)
+        self.q = np.asarray(q, dtype=float).reshape(-1, 3)
+        self.r = np.asarray(r, dtype=float).reshape(-1)
+
+        # rebuilt with the snapshot, on every step
+        self.grid = CapsuleGrid(*bounding_boxes(self.p, self.q, self.r))
+
+        self.scene_query_count = scene_query_count
+        self.bone_query_count = 0
+        self.pair_query_count = 0
+
+    @classmethod
+    def from_cache(cls, cache, time_index, capsule_names, capsule_end_names):
+        # 2 end positions and a radius per capsule, whatever the number of bones
+        p = [cache.translation(end_names[0], 'worldMatrix', time_index) for end_names in capsule_end_names]
+        q = [cache.translation(end_names[1], 'worldMatrix', time_index) for end_names in capsule_end_names]
+        r = [cache.value(capsule_name, 'scaleZ', time_index) for capsule_name in capsule_names]
+
+        return cls(capsule_names, p, q, r, len(p) + len(q) + len(r))
+
+    def __len__(self):
+        return len(self.r)
+
+    def candidate_pairs(self, cur_pos, pre_pos):
+        # (bone index, capsule index) of capsules near bones moving from pre_pos to cur_pos
+        # a segment can only hit a capsule if their bounding boxes overlap
+        self.bone_query_count += len(cur_pos)
+
+        return self.grid.query(*bounding_boxes(cur_pos, pre_pos))
+
+    def is_near(self, cur_pos, pre_pos, margins):
+        # (N,) True for bones moving from pre_pos to cur_pos within about margins of a capsule
+        # broad phase only, it doesn't count as a query of the solve
+        near = np.zeros(len(np.reshape(cur_pos, (-1, 3))), dtype=bool)
+        near[self.grid.query(*bounding_boxes(cur_pos, pre_pos, margins))[0]] = True
+
+        return near
+
+    def check_collision(self, cur_pos, pre_pos, isRevert, pairs=None):
+        # same as springMath.check_collision_array, narrow phase only on the candidate pairs
+        # return hit mask (N,), closest collision points (N, 3), index of the hit capsule (N,) or -1
+        cur_pos = np.asarray(cur_pos, dtype=float).reshape(-1, 3)
+        pre_pos = np.asarray(pre_pos, dtype=float).reshape(-1, 3)
+
+        if pairs is None:
+            pairs = self.candidate_pairs(cur_pos, pre_pos)
+
+        bone_index, capsule_index = pairs
+        self.pair_query_count += len(bone_index)
+
+        hit = np.zeros(len(cur_pos), dtype=bool)
+        closest_pt = np.zeros((len(cur_pos), 3))
+        hit_capsule_index = np.full(len(cur_pos), -1)
+
+        if not len(bone_index):
+            return hit, closest_pt, hit_capsule_index
+
+        if isRevert:
+            sa, sb = cur_pos, pre_pos
+        else:
+            sa, sb = pre_pos, cur_pos
+
+        hits, points = springMath.segment_capsule_isect_array(sa[bone_index], sb[bone_index], self.p[capsule_index], self.q[capsule_index], self.r[capsule_index])
+
+        # closest hit from previous position for each bone, first capsule wins on equality
+        lengths = np.where(hits, springMath.distance_array(pre_pos[bone_index], points), np.inf)
+        order = np.lexsort((capsule_index, lengths, bone_index))
+        first = order[np.concatenate([[True], bone_index[order][1:] != bone_index[order][:-1]])]
+        first = first[lengths[first] < 9999]
+
+        hit[bone_index[first]] = True
+        closest_pt[bone_index[first]] = points[first]
+        hit_capsule_index[bone_index[first]] = capsule_index[first]
+
+        return hit, closest_pt, hit_capsule_index
+
+
+class PlaneSnapshot:
+    # Collision planes at one step: world triangles, unit normal (plane Y axis) and offset
+    # triangles are (P, T, 3, 3), normals (P, 3), offsets (P,)
+    # unbounded planes (the floor) have no triangles, they are infinite
+
+    # the 2 triangles of a 1x1 subdivisions polyPlane
+    kPlaneTriangles = ((0, 1, 2), (3, 1, 2))
+
+    def __init__(self, plane_names, triangles, normals, offsets, bounded, scene_query_count=0):
+        self.plane_names = list(plane_names)
+        self.triangles = np.asarray(triangles, dtype=float).reshape(len(self.plane_names), len(self.kPlaneTriangles), 3, 3)
+        self.normals = np.asarray(normals, dtype=float).reshape(-1, 3)
+        self.offsets = np.asarray(offsets, dtype=float).reshape(-1)
+        self.bounded = np.asarray(bounded, dtype=bool).reshape(-1)
+
+        self.scene_query_count = scene_query_count
+        self.bone_query_count = 0
+        self.pair_query_count = 0
+
+    @classmethod
+    def from_cache(cls, cache, time_index, plane_names, plane_vertex_positions_list, floor=None):
+        # only the world matrix of each plane is read, vertices come in object space
+        # floor is (up axis, height) of an infinite ground plane, it needs no scene query
+        plane_name_list = []
+        triangle_list = []
+        normal_list = []
+        offset_list = []
+        bounded_list = []
+
+        for plane_name, vertex_positions in zip(plane_names, plane_vertex_positions_list):
+            matrix = cache.matrix(plane_name, 'worldMatrix', time_index)
+
+            vertices = np.dot(vertex_positions, matrix[:3, :3]) + matrix[3, :3]
+            normal = springMath.normal_array(matrix[1, :3])
+
+            plane_name_list.append(plane_name)
+            triangle_list.append([vertices[list(triangle)] for triangle in cls.kPlaneTriangles])
+            normal_list.append(normal)
+            offset_list.append(np.dot(normal, matrix[3, :3]))
+            bounded_list.append(True)
+
+        if floor is not None:
+            up_axis, height = floor
+
+            plane_name_list.append(None)
+            triangle_list.append(np.zeros((len(cls.kPlaneTriangles), 3, 3)))
+            normal_list.append(np.identity(3)['xyz'.index(up_axis)])
+            offset_list.append(height)
+            bounded_list.append(False)
+
+        return cls(plane_name_list, triangle_list, normal_list, offset_list, bounded_list, len(plane_names))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def project(self, positions, plane_index):
+        # positions (N, 3) on their plane (N,) along its normal
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        normals = self.normals[plane_index]
+
+        return positions - normals * (springMath.dot_array(positions, normals) - self.offsets[plane_index])[:, None]
+
+    def is_near(self, cur_pos, pre_pos, margins):
+        # (N,) True for bones moving from pre_pos to cur_pos within margins of a plane or through it
+        # bounded planes only around their vertices, it doesn't count as a query of the solve
+        cur_pos = np.asarray(cur_pos, dtype=float).reshape(-1, 3)
+        pre_pos = np.asarray(pre_pos, dtype=float).reshape(-1, 3)
+
+        if not len(self):
+            return np.zeros(len(cur_pos), dtype=bool)
+
+        to_plane_distance = np.dot(cur_pos, self.normals.T) - self.offsets
+        to_plane_distance_pre = np.dot(pre_pos, self.normals.T) - self.offsets
+
+        near = np.minimum(np.abs(to_plane_distance), np.abs(to_plane_distance_pre)) < np.reshape(margins, (-1, 1))
+        near |= to_plane_distance * to_plane_distance_pre < 0
+
+        lower, upper = bounding_boxes(cur_pos, pre_pos, margins)
+        vertices = self.triangles.reshape(len(self), -1, 3)
+        in_bounds = np.all(lower[:, None] <= vertices.max(axis=1), axis=2) & np.all(upper[:, None] >= vertices.min(axis=1), axis=2)
+
+        return np.any(near & (in_bounds | ~self.bounded), axis=1)
+
+    def check_collision(self, obj_pos, child_pos):
+        # bones (N, 3) above a plane with their child under it, child projection inside of the plane
+        # bones x planes in one pass, the first plane crossed from obj_pos wins
+        # return hit plane index (N,) or -1 and child projections (N, 3)
+        obj_pos = np.asarray(obj_pos, dtype=float).reshape(-1, 3)
+        child_pos = np.asarray(child_pos, dtype=float).reshape(-1, 3)
+
+        self.bone_query_count += len(obj_pos)
+        self.pair_query_count += len(obj_pos) * len(self)
+
+        if not len(self):
+            return np.full(len(obj_pos), -1), child_pos.copy()
+
+        to_plane_distance = np.dot(obj_pos, self.normals.T) - self.offsets
+        to_plane_distance_child = np.dot(child_pos, self.normals.T) - self.offsets
+
+        project_pos_child = child_pos[:, None] - self.normals[None] * to_plane_distance_child[..., None]
+
+        in_plane = np.broadcast_to(~self.bounded, to_plane_distance.shape).copy()
+        for triangle_index in range(self.triangles.shape[1]):
+            a, b, c = [self.triangles[None, :, triangle_index, vertex_index] for vertex_index in range(3)]
+            in_plane |= self.bounded & springMath.pt_in_triangle_array(project_pos_child, a, b, c)
+
+        hits = (to_plane_distance > 0) & (to_plane_distance_child < 0) & in_plane
+
+        # segment parameter of the crossing, the child is under the plane so it is > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing = np.where(hits, to_plane_distance / (to_plane_distance - to_plane_distance_child), np.inf)
+
+        plane_index = np.argmin(crossing, axis=1)
+        plane_index = np.where(hits.any(axis=1), plane_index, -1)
+
+        bone_index = np.arange(len(obj_pos))
+        project_pos = np.where((plane_index >= 0)[:, None], project_pos_child[bone_index, np.maximum(plane_index, 0)], child_pos)
+
+        return plane_index, project_pos
+
+
+class ColliderSet:
+    # Names of the scene colliders, snapshots of them are built from the sample cache on every step
+    # capsule_end_names are the 2 end transforms of each capsule
+    # plane vertices are in object space, floor is (up axis, height) or None
+
+    def __init__(self, capsule_names=(), capsule_end_names=(), plane_names=(), plane_vertex_positions_list=(), floor=None):
+        self.capsule_names = list(capsule_names)
+        self.capsule_end_names = [list(end_names) for end_names in capsule_end_names]
+        self.plane_names = list(plane_names)
+        self.plane_vertex_positions_list = [np.asarray(vertex_positions, dtype=float) for vertex_positions in plane_vertex_positions_list]
+        self.floor = floor
+
+    def __len__(self):
+        return len(self.capsule_names) + len(self.plane_names) + (self.floor is not None)
+
+    def matrix_keys(self):
+        matrix_key_list = [(end_name, 'worldMatrix') for end_names in self.capsule_end_names for end_name in end_names]
+        matrix_key_list += [(plane_name, 'worldMatrix') for plane_name in self.plane_names]
+
+        return matrix_key_list
+
+    def value_keys(self):
+        return [(capsule_name, 'scaleZ') for capsule_name in self.capsule_names]
+
+    def snapshots(self, cache, time_index):
+        # capsule and plane snapshots of one step
+        return (CapsuleSnapshot.from_cache(cache, time_index, self.capsule_names, self.capsule_end_names),
+                PlaneSnapshot.from_cache(cache, time_index, self.plane_names, self.plane_vertex_positions_list, self.floor))
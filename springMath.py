@@ -1,6 +1,5 @@
 import math
-import pymel.core as pm
-import pymel.core.datatypes as dt
+import numpy as np
 
 
 def sigmoid(x):
@@ -19,13 +18,6 @@ def dist_to_plane(pt, n, d):
     return n.dot(pt) - (d / n.dot(n))
 
 
-def dist_to_line(a, b, p):
-    ap = p - a
-    ab = b - a
-    result = a + ((ap.dot(ab) / ab.dot(ab)) * ab)
-    return distance(result, p)
-
-
 def is_same_side_of_plane(pt, test_pt, n, d):
     d1 = math.copysign(1, dist_to_plane(pt, n, d))
     d2 = math.copysign(1, dist_to_plane(test_pt, n, d))
@@ -198,6 +190,7 @@ def segment_capsule_isect(sa, sb, p, q, r):
 
 def checkCollision(cur_pos, pre_pos, capsuleLst, isRevert):
     # calculate collision with all the capsule in scene
+    # capsuleLst is a list of [capsule, p, q, r] sampled for the current frame
     if isRevert:
         sa = cur_pos
         sb = pre_pos
@@ -208,12 +201,7 @@ def checkCollision(cur_pos, pre_pos, capsuleLst, isRevert):
     isHited = False
     closest_pt_dict = {}
 
-    for obj in capsuleLst:
-        objChildren = pm.listRelatives(obj, children=1, type='transform')
-        p = objChildren[0].getTranslation(space='world')
-        q = objChildren[1].getTranslation(space='world')
-        r = obj.getAttr('scaleZ') * 1
-
+    for obj, p, q, r in capsuleLst:
         hit, closest_pt, hitCylinder = segment_capsule_isect(sa, sb, p, q, r)
 
         if hit:
@@ -240,52 +228,211 @@ def checkCollision(cur_pos, pre_pos, capsuleLst, isRevert):
         return None, None, None
 
 
-def ckeckPointInTri(pos, pa, pb, pc):
-    ra = math.acos(((pa - pos).normal()).dot((pb - pos).normal()))
-    ra = dt.degrees(ra)
-    rb = math.acos(((pb - pos).normal()).dot((pc - pos).normal()))
-    rb = dt.degrees(rb)
-    rc = math.acos(((pc - pos).normal()).dot((pa - pos).normal()))
-    rc = dt.degrees(rc)
+##########################
+# Array versions
+# Same results as the scalar functions above, for every bone segment (N) against
+# every capsule (M) in one call. Vectors are (..., 3) arrays, shapes broadcast.
+##########################
 
-    return (abs(ra + rb + rc) > 359)
+SM_EPSILON = 1e-6
 
 
-def getVertexPositions(obj):
-    vertex_positions_list = []
+def normal_array(v):
+    # zero length vectors stay null like dt.Vector.normal()
+    length = np.linalg.norm(v, axis=-1)[..., None]
+    return np.where(length > 0.0, v / np.where(length > 0.0, length, 1.0), 0.0)
 
-    for vertex in obj.vtx:
-        vertex_positions_list.append(vertex.getPosition(space='world'))
 
-    return vertex_positions_list
+def dot_array(a, b):
+    return np.sum(a * b, axis=-1)
 
 
-def checkPlaneCollision(objPos, childPos, colPlane):
+def distance_array(a, b):
+    return np.linalg.norm(b - a, axis=-1)
 
-    v_coords = getVertexPositions(colPlane)
 
-    collision_plane_matrix = pm.xform(colPlane, worldSpace=1, matrix=1, q=1)
-    n = dt.Vector(collision_plane_matrix[4:7])    # Y axis direction of plane
-    q = v_coords[1]
-    d = n.dot(q)
+def lerp_vec_array(a, b, t):
+    return a * (1 - t[..., None]) + b * t[..., None]
+
+
+def dist_to_plane_array(pt, n, d):
+    return dot_array(n, pt) - (d / dot_array(n, n))
+
+
+def is_same_side_of_plane_array(pt, test_pt, n, d):
+    return np.copysign(1, dist_to_plane_array(pt, n, d)) * np.copysign(1, dist_to_plane_array(test_pt, n, d)) == 1.0
+
+
+def pt_in_sphere_array(pt, c, r):
+    return distance_array(c, pt) <= r
+
+
+def pt_in_cylinder_array(pt, p, q, r):
+    n = normal_array(q - p)
+    mid = (p + q) / 2.0
+
+    inside = is_same_side_of_plane_array(pt, mid, n, dot_array(n, p))
+    inside &= is_same_side_of_plane_array(pt, mid, n, dot_array(n, q))
+
+    # projection on the plane of q
+    proj_pt = pt - n * (dot_array(n, pt) - dot_array(n, q))[..., None]
+
+    return inside & (distance_array(proj_pt, q) <= r)
+
 
-    # get obj distance to plane
-    toPlaneDistance = dist_to_plane(objPos, n, d)
-    toPlaneDistance_child = dist_to_plane(childPos, n, d)
+def pt_in_capsule_array(pt, p, q, r):
+    return pt_in_cylinder_array(pt, p, q, r) | pt_in_sphere_array(pt, p, r) | pt_in_sphere_array(pt, q, r)
+
+
+def segment_sphere_isect_array(sa, sb, c, r):
+    # return hit mask and intersection points, points are meaningless where there is no hit
+    with np.errstate(invalid='ignore'):
+        d = normal_array(sb - sa)
+
+        m = sa - c
+        b = dot_array(m, d)
+        c = dot_array(m, m) - r * r
+
+        discr = b * b - c
+        t = -b - np.sqrt(np.maximum(discr, 0.0))
+
+        found = ~((c > 0.0) & (b > 0.0)) & (discr >= 0.0) & (t >= 0.0)
+        hit = found & (t <= distance_array(sa, sb))
+
+    return hit, sa + d * t[..., None]
+
+
+def segment_cylinder_isect_array(sa, sb, p, q, r):
+    # return hit mask and intersection points, points are meaningless where there is no hit
+    d = q - p
+    m = sa - p
+    n = sb - sa
+    md = dot_array(m, d)
+    nd = dot_array(n, d)
+    dd = dot_array(d, d)
+    nn = dot_array(n, n)
+    mn = dot_array(m, n)
+
+    a = dd * nn - nd * nd
+    k = dot_array(m, m) - r * r
+    c = dd * k - md * md
+    b = dd * mn - nd * md
+    discr = b * b - a * c
 
-    # child projection position on plane
-    projectPos_child = proj_pt_to_plane(childPos, n, d)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # segment outside of the cylinder end planes
+        outside = ((md < 0) & (md + nd < 0)) | ((md > dd) & (md + nd > dd))
 
-    inPlane = False
+        # segment parallel to the cylinder axis
+        parallel = np.abs(a) < SM_EPSILON
+        parallel_t = np.where(md < 0, -mn / nn, np.where(md > dd, (nd - mn) / nn, 0.0))
+        parallel_hit = ~(c > 0)
 
-    if ckeckPointInTri(projectPos_child, v_coords[0], v_coords[1], v_coords[2]):
-        inPlane = True
-    elif ckeckPointInTri(projectPos_child, v_coords[3], v_coords[1], v_coords[2]):
-        inPlane = True
+        # intersection with the cylinder side
+        t = (-b - np.sqrt(np.maximum(discr, 0.0))) / a
+        side_found = ~(discr < 0) & ~((t < 0.0) | (t > 1.0))
 
-    # bone above plane and bone child under plane and child project point on plane
-    # means has collision with plane
-    if (toPlaneDistance > 0) and (toPlaneDistance_child < 0) and inPlane:
-        return projectPos_child
+        # intersection outside of the side, test the end caps
+        below = md + t * nd < 0.0
+        above = ~below & (md + t * nd > dd)
+
+        below_t = -md / nd
+        below_hit = (nd > 0.0) & (k + 2 * below_t * (mn + below_t * nn) <= 0.0)
+
+        above_t = (dd - md) / nd
+        above_hit = (nd < 0.0) & (k + dd - 2 * md + above_t * (2 * (mn - nd) + above_t * nn) <= 0.0)
+
+        side_t = np.where(below, below_t, np.where(above, above_t, t))
+        side_hit = side_found & np.where(below, below_hit, np.where(above, above_hit, True))
+
+        hit = ~outside & np.where(parallel, parallel_hit, side_hit)
+        t = np.where(parallel, parallel_t, side_t)
+
+        points = lerp_vec_array(sa, sb, t)
+
+    return hit, points
+
+
+def segment_capsule_isect_array(sa, sb, p, q, r):
+    # return hit mask and closest intersection points to the (swapped) segment start
+    sa, sb, p, q = np.broadcast_arrays(sa, sb, p, q)
+    r = np.broadcast_to(r, sa.shape[:-1])
+
+    sa_inside = pt_in_capsule_array(sa, p, q, r)
+    sb_inside = pt_in_capsule_array(sb, p, q, r)
+
+    # both inside. extend sb to get intersection
+    both_inside = (sa_inside & sb_inside)[..., None]
+    only_sa_inside = (sa_inside & ~sb_inside)[..., None]
+
+    new_sa = np.where(both_inside, sa + normal_array(sb - sa) * 200.0, np.where(only_sa_inside, sb, sa))
+    new_sb = np.where(both_inside | only_sa_inside, sa, sb)
+
+    hit_list = []
+    point_list = []
+    for hit, points in [segment_sphere_isect_array(new_sa, new_sb, p, r),
+                        segment_sphere_isect_array(new_sa, new_sb, q, r),
+                        segment_cylinder_isect_array(new_sa, new_sb, p, q, r)]:
+        hit_list.append(hit)
+        point_list.append(points)
+
+    hits = np.stack(hit_list)
+    points = np.stack(point_list)
+
+    # first closest hit, as the scalar loop does
+    distances = np.where(hits, distance_array(new_sa[None], points), np.inf)
+    closest = np.argmin(distances, axis=0)
+
+    closest_pt = np.take_along_axis(points, closest[None, ..., None], axis=0)[0]
+
+    return hits.any(axis=0), closest_pt
+
+
+def check_collision_array(cur_pos, pre_pos, p, q, r, isRevert):
+    # calculate collision of N bones (cur_pos, pre_pos (N, 3)) with M capsules (p, q (M, 3), r (M,))
+    # return hit mask (N,), closest collision points (N, 3), index of the hit capsule (N,) or -1
+    cur_pos = np.asarray(cur_pos, dtype=float).reshape(-1, 3)
+    pre_pos = np.asarray(pre_pos, dtype=float).reshape(-1, 3)
+    p = np.asarray(p, dtype=float).reshape(-1, 3)
+    q = np.asarray(q, dtype=float).reshape(-1, 3)
+    r = np.asarray(r, dtype=float).reshape(-1)
+
+    if not len(r):
+        return np.zeros(len(cur_pos), dtype=bool), np.zeros((len(cur_pos), 3)), np.full(len(cur_pos), -1)
+
+    if isRevert:
+        sa, sb = cur_pos, pre_pos
     else:
-        return None
+        sa, sb = pre_pos, cur_pos
+
+    hits, points = segment_capsule_isect_array(sa[:, None], sb[:, None], p[None], q[None], r[None])
+
+    # closest hit from previous position, first capsule wins on equality
+    lengths = np.where(hits, distance_array(pre_pos[:, None], points), np.inf)
+    capsule_index = np.argmin(lengths, axis=1)
+
+    bone_index = np.arange(len(cur_pos))
+    hit = lengths[bone_index, capsule_index] < 9999
+
+    return hit, points[bone_index, capsule_index], np.where(hit, capsule_index, -1)
+
+
+def pt_in_triangle_array(pt, a, b, c):
+    # barycentric inside test of points already on the triangle plane, edges included
+    v0 = b - a
+    v1 = c - a
+    v2 = pt - a
+
+    d00 = dot_array(v0, v0)
+    d01 = dot_array(v0, v1)
+    d11 = dot_array(v1, v1)
+    d20 = dot_array(v2, v0)
+    d21 = dot_array(v2, v1)
+
+    denom = d00 * d11 - d01 * d01
+    denom = np.where(np.abs(denom) > SM_EPSILON * SM_EPSILON, denom, np.inf)
+
+    v = (d11 * d20 - d01 * d21) / denom
+    w = (d00 * d21 - d01 * d20) / denom
+
+    return (v >= -SM_EPSILON) & (w >= -SM_EPSILON) & (v + w <= 1.0 + SM_EPSILON) & np.isfinite(denom)
@@ -0,0 +1,140 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Per phase profiling of a calculation: call count, wall time and scene queries
+# NullProfiler has the same interface and does nothing, it is the default so
+# phases can stay instrumented at near zero cost
+#
+#####################################################################################
+
+import json
+import timeit
+
+from collections import OrderedDict
+
+
+class PhaseTimer:
+    # context manager adding its wall time to a phase of a profiler
+
+    def __init__(self, profiler, name, scene_query_count):
+        self.profiler = profiler
+        self.name = name
+        self.scene_query_count = scene_query_count
+
+    def __enter__(self):
+        self.start_time = timeit.default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self.profiler.add(self.name, timeit.default_timer() - self.start_time, 1, self.scene_query_count)
+
+
+class NullPhaseTimer:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+kNullPhaseTimer = NullPhaseTimer()
+
+
+class Profiler:
+    # phases are kept in the order they are first entered, times in seconds
+    # each phase is [call count, wall time, scene query count]
+    enabled = True
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.start_time = timeit.default_timer()
+        self.total_time = None
+
+        # time spent in other processes, merged from workers
+        self.worker_time = 0.0
+
+    def phase(self, name, scene_query_count=0):
+        return PhaseTimer(self, name, scene_query_count)
+
+    def add(self, name, phase_time, call_count=1, scene_query_count=0):
+        phase = self.phases.setdefault(name, [0, 0.0, 0])
+        phase[0] += call_count
+        phase[1] += phase_time
+        phase[2] += scene_query_count
+
+    def add_scene_queries(self, name, scene_query_count):
+        self.add(name, 0.0, 0, scene_query_count)
+
+    def merge(self, profiler, is_worker=False):
+        # phases of another profiler, from a worker process their time doesn't add to the wall time
+        for name, (call_count, phase_time, scene_query_count) in profiler.phases.items():
+            self.add(name, phase_time, call_count, scene_query_count)
+
+            if is_worker:
+                self.worker_time += phase_time
+
+    def stop(self):
+        self.total_time = timeit.default_timer() - self.start_time
+
+    def elapsed_time(self):
+        if self.total_time is None:
+            return timeit.default_timer() - self.start_time
+
+        return self.total_time
+
+    def other_time(self):
+        # wall time out of any phase
+        return max(self.elapsed_time() - sum(phase[1] for phase in self.phases.values()) + self.worker_time, 0.0)
+
+    def to_dict(self):
+        return OrderedDict([
+            ('total_time', self.elapsed_time()),
+            ('worker_time', self.worker_time),
+            ('other_time', self.other_time()),
+            ('phases', [OrderedDict([('name', name), ('call_count', call_count), ('time', phase_time), ('scene_query_count', scene_query_count)])
+                        for name, (call_count, phase_time, scene_query_count) in self.phases.items()])])
+
+    def save(self, file_path):
+        with open(file_path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file, indent=4)
+
+    def __str__(self):
+        total_time = self.elapsed_time()
+
+        line_list = ['{0:<20} {1:>8} {2:>10} {3:>6} {4:>14}'.format('phase', 'calls', 'time (ms)', '%', 'scene queries')]
+
+        for name, (call_count, phase_time, scene_query_count) in list(self.phases.items()) + [('other', (0, self.other_time(), 0))]:
+            line_list.append('{0:<20} {1:>8} {2:>10.1f} {3:>6.1f} {4:>14}'.format(
+                name, call_count, phase_time * 1000.0, phase_time * 100.0 / max(total_time + self.worker_time, 1e-9), scene_query_count))
+
+        line_list.append('{0:<20} {1:>8} {2:>10.1f}'.format('total', '', total_time * 1000.0))
+
+        if self.worker_time:
+            line_list.append('{0:<20} {1:>8} {2:>10.1f}'.format('in workers', '', self.worker_time * 1000.0))
+
+        return '\n'.join(line_list)
+
+
+class NullProfiler:
+    # profiling disabled
+    enabled = False
+
+    def phase(self, name, scene_query_count=0):
+        return kNullPhaseTimer
+
+    def add(self, name, phase_time, call_count=1, scene_query_count=0):
+        pass
+
+    def add_scene_queries(self, name, scene_query_count):
+        pass
+
+    def merge(self, profiler, is_worker=False):
+        pass
+
+    def stop(self):
+        pass
@@ -0,0 +1,659 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Scene interface of the spring calculation
+# The calculation only reads hierarchy, rest poses and sampled matrices from a
+# Scene and writes its curves back to it. core.MayaScene works on the Maya scene,
+# MemoryScene holds everything in memory so the whole calculation runs without Maya
+#
+#####################################################################################
+
+import copy
+import json
+
+import numpy as np
+
+import springCache
+import springProfile
+import springSolver
+
+from collections import OrderedDict
+
+
+class Scene:
+    # Nodes are given by name, matrices are (4, 4) arrays with translations in UI units
+    # angles are in degrees
+
+    def parent(self, node):
+        # parent node name, None for a root
+        raise NotImplementedError
+
+    def descendants(self, node):
+        # all the transforms under node, parents first
+        raise NotImplementedError
+
+    def paths(self, nodes):
+        # full path ('|root|parent|node') of each node, all read at once
+        raise NotImplementedError
+
+    def world_matrix(self, node, time):
+        raise NotImplementedError
+
+    def rest_pose(self, node, time):
+        # rotate, rotateOrder, rotateAxis, jointOrient (None if not a joint) and scale values
+        raise NotImplementedError
+
+    def create_proxy(self, node, child, time, is_pose_match):
+        # Transform under the parent of node with the world pose of child at time,
+        # or following child over time for pose match, read when sampled. Return its name
+        raise NotImplementedError
+
+    def delete_proxies(self):
+        raise NotImplementedError
+
+    def sample(self, times, matrix_keys, value_keys):
+        # SampleCache of (node, 'matrix' or 'worldMatrix') and (node, attribute) keys
+        raise NotImplementedError
+
+    def write_curves(self, curve_cache, start_time, end_time, output_times=None):
+        # replace the keys of the range by the solved values, on output_times if given
+        raise NotImplementedError
+
+
+class MemoryScene(Scene):
+    # Transforms with static or keyed attributes, keys are interpolated linearly
+    # written curves become keys, so the result can be sampled again
+
+    kProxySuffix = '_SpringNull'
+
+    def __init__(self):
+        self.parents = OrderedDict()
+        self.children = {}
+
+        # (node, attribute) static values and (times, values) keys
+        self.attributes = {}
+        self.curves = {}
+
+        # local matrices function of times, replace the transform attributes (proxies)
+        self.matrix_functions = {}
+        self.proxy_list = []
+
+        # (node, time) world matrices, a rig is read at the same time while it is set up
+        self.world_matrix_cache = {}
+
+    def add_transform(self, node, parent=None, translate=(0.0, 0.0, 0.0), rotate=(0.0, 0.0, 0.0), scale=(1.0, 1.0, 1.0),
+                      rotate_order=0, rotate_axis=(0.0, 0.0, 0.0), joint_orient=None):
+        # joint_orient None for a transform which is not a joint
+        # a new node doesn't move the others
+        if node in self.parents:
+            self.world_matrix_cache.clear()
+
+        self.parents[node] = parent
+        self.children[node] = []
+
+        if parent is not None:
+            self.children[parent].append(node)
+
+        for attribute, values in zip(['translate', 'rotate', 'scale'], [translate, rotate, scale]):
+            for axis, value in zip('XYZ', values):
+                self.attributes[(node, attribute + axis)] = float(value)
+
+        self.attributes[(node, 'rotateOrder')] = int(rotate_order)
+        self.attributes[(node, 'rotateAxis')] = tuple(rotate_axis)
+        self.attributes[(node, 'jointOrient')] = None if joint_orient is None else tuple(joint_orient)
+
+    def set_attribute(self, node, attribute, value):
+        self.world_matrix_cache.clear()
+        self.attributes[(node, attribute)] = value
+
+    def set_keys(self, node, attribute, times, values):
+        self.world_matrix_cache.clear()
+
+        order = np.argsort(times)
+        self.curves[(node, attribute)] = (np.asarray(times, dtype=float)[order], np.asarray(values, dtype=float)[order])
+
+    def attribute_values(self, node, attribute, times):
+        times = np.asarray(times, dtype=float)
+
+        if (node, attribute) in self.curves:
+            key_times, key_values = self.curves[(node, attribute)]
+            return np.interp(times, key_times, key_values)
+
+        return np.full(len(times), self.attributes[(node, attribute)], dtype=float)
+
+    def local_matrices(self, node, times, world_matrix_cache=None):
+        if node in self.matrix_functions:
+            return self.matrix_functions[node](np.asarray(times, dtype=float), world_matrix_cache)
+
+        vectors = [np.stack([self.attribute_values(node, attribute + axis, times) for axis in 'XYZ'], axis=-1) for attribute in ['translate', 'rotate', 'scale']]
+        joint_orient = self.attributes[(node, 'jointOrient')] or (0.0, 0.0, 0.0)
+
+        return springSolver.compose_local_matrices(
+            vectors[0],
+            vectors[1],
+            self.attributes[(node, 'rotateOrder')],
+            vectors[2],
+            springSolver.euler_to_matrix(self.attributes[(node, 'rotateAxis')])[0],
+            springSolver.euler_to_matrix(joint_orient)[0])
+
+    def world_matrices(self, node, times, world_matrix_cache=None):
+        # world_matrix_cache keeps the results of a same sampling, parents are shared
+        if world_matrix_cache is not None and node in world_matrix_cache:
+            return world_matrix_cache[node]
+
+        matrices = self.local_matrices(node, times, world_matrix_cache)
+
+        if self.parents[node] is not None:
+            matrices = np.matmul(matrices, self.world_matrices(self.parents[node], times, world_matrix_cache))
+
+        if world_matrix_cache is not None:
+            world_matrix_cache[node] = matrices
+
+        return matrices
+
+    def parent(self, node):
+        return self.parents[node]
+
+    def descendants(self, node):
+        descendant_list = []
+        stack = list(reversed(self.children[node]))
+
+        while stack:
+            descendant = stack.pop()
+            descendant_list.append(descendant)
+            stack += reversed(self.children[descendant])
+
+        return descendant_list
+
+    def paths(self, nodes):
+        path_dict = {None: ''}
+
+        for node in nodes:
+            # ancestors without a path yet, then their paths from the top one
+            ancestor_list = []
+            while node not in path_dict:
+                ancestor_list.append(node)
+                node = self.parents[node]
+
+            for ancestor in reversed(ancestor_list):
+                path_dict[ancestor] = path_dict[self.parents[ancestor]] + '|' + ancestor
+
+        return [path_dict[node] for node in nodes]
+
+    def world_matrix(self, node, time):
+        if (node, time) not in self.world_matrix_cache:
+            matrix = self.local_matrices(node, [time])[0]
+
+            if self.parents[node] is not None:
+                matrix = np.matmul(matrix, self.world_matrix(self.parents[node], time))
+
+            self.world_matrix_cache[(node, time)] = matrix
+
+        return self.world_matrix_cache[(node, time)]
+
+    def rest_pose(self, node, time):
+        return ([self.attribute_values(node, 'rotate' + axis, [time])[0] for axis in 'XYZ'],
+                self.attributes[(node, 'rotateOrder')],
+                self.attributes[(node, 'rotateAxis')],
+                self.attributes[(node, 'jointOrient')],
+                [self.attribute_values(node, 'scale' + axis, [time])[0] for axis in 'XYZ'])
+
+    def create_proxy(self, node, child, time, is_pose_match):
+        proxy = node + self.kProxySuffix
+        parent = self.parents[node]
+
+        # child world pose in the parent space
+        matrix = self.world_matrix(child, time)
+
+        if parent is not None:
+            matrix = np.matmul(matrix, np.linalg.inv(self.world_matrix(parent, time)))
+
+        def proxy_matrices(times, world_matrix_cache=None):
+            if not is_pose_match:
+                return np.tile(matrix, (len(times), 1, 1))
+
+            matrices = self.world_matrices(child, times, world_matrix_cache)
+
+            if parent is not None:
+                matrices = np.matmul(matrices, np.linalg.inv(self.world_matrices(parent, times, world_matrix_cache)))
+
+            return matrices
+
+        self.add_transform(proxy, parent)
+        self.matrix_functions[proxy] = proxy_matrices
+        self.proxy_list.append(proxy)
+
+        return proxy
+
+    def delete_proxies(self):
+        self.world_matrix_cache.clear()
+
+        for proxy in self.proxy_list:
+            parent = self.parents.pop(proxy)
+
+            if parent is not None:
+                self.children[parent].remove(proxy)
+
+            del self.children[proxy]
+            del self.matrix_functions[proxy]
+
+        self.proxy_list = []
+
+    def sample(self, times, matrix_keys, value_keys):
+        cache = springCache.SampleCache(times, matrix_keys, value_keys)
+        world_matrix_cache = {}
+
+        for index, (node, attribute) in enumerate(cache.matrix_keys):
+            if attribute == 'worldMatrix':
+                cache.matrices[:, index] = self.world_matrices(node, cache.times, world_matrix_cache)
+            else:
+                cache.matrices[:, index] = self.local_matrices(node, cache.times, world_matrix_cache)
+
+        for index, (node, attribute) in enumerate(cache.value_keys):
+            cache.values[:, index] = self.attribute_values(node, attribute, cache.times)
+
+        return cache
+
+    def write_curves(self, curve_cache, start_time, end_time, output_times=None):
+        for node, attribute in curve_cache.keys:
+            time_list, value_list = curve_cache.curve(node, attribute, output_times)
+
+            if not len(time_list):
+                continue
+
+            # keys out of the range are kept
+            if (node, attribute) in self.curves:
+                key_times, key_values = self.curves[(node, attribute)]
+                kept = (key_times < start_time) | (key_times > end_time + 0.99999)
+
+                time_list = np.concatenate([key_times[kept], time_list])
+                value_list = np.concatenate([key_values[kept], value_list])
+
+            self.set_keys(node, attribute, time_list, value_list)
+
+    def to_dict(self):
+        # transforms and keys, proxies are left out
+        attribute_dict = OrderedDict((node, OrderedDict()) for node in self.parents if node not in self.proxy_list)
+        for (node, attribute), value in self.attributes.items():
+            if node in attribute_dict:
+                attribute_dict[node][attribute] = value
+
+        return OrderedDict([
+            ('nodes', [OrderedDict([('name', node), ('parent', self.parents[node]), ('attributes', attributes)]) for node, attributes in attribute_dict.items()]),
+            ('curves', [OrderedDict([('node', node), ('attribute', attribute), ('times', list(times)), ('values', list(values))])
+                        for (node, attribute), (times, values) in sorted(self.curves.items()) if node in attribute_dict])])
+
+    @classmethod
+    def from_dict(cls, scene_dict):
+        # nodes are listed parents first
+        scene = cls()
+
+        for node_dict in scene_dict['nodes']:
+            scene.add_transform(node_dict['name'], node_dict['parent'])
+
+            for attribute, value in node_dict['attributes'].items():
+                scene.attributes[(node_dict['name'], attribute)] = tuple(value) if isinstance(value, list) else value
+
+        for curve_dict in scene_dict['curves']:
+            scene.set_keys(curve_dict['node'], curve_dict['attribute'], curve_dict['times'], curve_dict['values'])
+
+        return scene
+
+    def save(self, file_path):
+        with open(file_path, 'w') as json_file:
+            json.dump(self.to_dict(), json_file)
+
+    @classmethod
+    def load(cls, file_path):
+        with open(file_path) as json_file:
+            return cls.from_dict(json.load(json_file))
+
+
+class HierarchyIndex:
+    # Selected transforms indexed once from their full paths ('|root|parent|node'),
+    # parents, tops and chains are found with dictionaries and sets
+    # ancestors are matched by path, transforms under other parents may have the same name
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.path_set = set(self.paths)
+        self.names = [path.rpartition('|')[2] for path in self.paths]
+        self.parents = dict((name, path.rpartition('|')[0].rpartition('|')[2] or None) for name, path in zip(self.names, self.paths))
+
+        # names given to several of the transforms
+        self.name_set = set()
+        self.duplicate_names = set()
+
+        for name in self.names:
+            if name in self.name_set:
+                self.duplicate_names.add(name)
+
+            self.name_set.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def parent(self, name):
+        return self.parents[name]
+
+    def top_path(self, path):
+        # path of the highest indexed transform of a path, the path itself if no ancestor is indexed
+        ancestor_path = ''
+
+        for component in path.split('|')[1:]:
+            ancestor_path += '|' + component
+
+            if ancestor_path in self.path_set:
+                return ancestor_path
+
+    def top(self, path):
+        return self.top_path(path).rpartition('|')[2]
+
+    def chains(self, is_root_driver=False):
+        # indexed transforms under each top one, parents first, tops in the index order
+        # with is_root_driver a top without parent drives its chain, it isn't part of it
+        top_path_list = [self.top_path(path) for path in self.paths]
+        chain_dict = OrderedDict((path, []) for path, top_path in zip(self.paths, top_path_list) if path == top_path)
+
+        for index, (name, path, top_path) in enumerate(zip(self.names, self.paths, top_path_list)):
+            chain_dict[top_path].append((path.count('|'), index, name))
+
+        chain_list = []
+
+        for top_path, member_list in chain_dict.items():
+            chain = [name for depth, index, name in sorted(member_list)]
+
+            if is_root_driver and top_path.count('|') == 1:
+                chain = chain[1:]
+
+            if chain:
+                chain_list.append(chain)
+
+        return chain_list
+
+
+def find_chains(scene, node_names):
+    # Chains of transforms to solve, parents first, one for each top selected transform
+    # a top transform without parent drives its chain, it isn't part of it
+    return HierarchyIndex(scene.paths(node_names)).chains(is_root_driver=True)
+
+
+def create_bone(scene, name, child, grand_child, grand_parent, time, depth=0, chain_index=0):
+    # SpringBone from the scene values at time, its proxy is set apart
+    rotation, rotate_order, rotate_axis, joint_orient, scale = scene.rest_pose(name, time)
+
+    return springSolver.SpringBone(
+        name=name,
+        child=child,
+        grand_child=grand_child,
+        grand_parent=grand_parent,
+        proxy=None,
+        rotation=rotation,
+        rotate_order=rotate_order,
+        rotate_axis=springSolver.euler_to_matrix(rotate_axis)[0],
+        joint_orient=springSolver.euler_to_matrix(joint_orient)[0] if joint_orient is not None else np.identity(3),
+        scale=scale,
+        world_matrix=scene.world_matrix(name, time),
+        child_position=scene.world_matrix(child, time)[3, :3],
+        grand_child_position=scene.world_matrix(grand_child, time)[3, :3] if grand_child else None,
+        depth=depth,
+        chain_index=chain_index)
+
+
+def create_chain_bones(scene, chain, chain_index, time, is_pose_match):
+    # one bone for each transform of the chain but the last one, with its proxy
+    # each bone aims at the next transform of the chain
+    bone_list = []
+    grand_parent = scene.parent(chain[0])
+
+    for depth, (name, child) in enumerate(zip(chain[:-1], chain[1:])):
+        grand_child = chain[depth + 2] if depth + 2 < len(chain) else None
+
+        # rest pose is read before the proxy prepares the keys
+        bone = create_bone(scene, name, child, grand_child, grand_parent, time, depth, chain_index)
+        bone.proxy = scene.create_proxy(name, child, time, is_pose_match)
+
+        bone_list.append(bone)
+        grand_parent = name
+
+    return bone_list
+
+
+def create_variant_bones(bones, springs):
+    # bones of a sweep, a copy of the bones for each spring, variant 0 is the bones themselves
+    bone_list = []
+
+    for variant, spring in enumerate(springs):
+        for bone in bones:
+            variant_bone = bone if variant == 0 else copy.deepcopy(bone)
+            variant_bone.variant = variant
+            variant_bone.spring = spring
+
+            bone_list.append(variant_bone)
+
+    return bone_list
+
+
+def step_times(start_frame, end_frame, sub_div=1.0, is_loop=False, max_loop_cycles=springSolver.kMaxLoopCycles):
+    # times of the steps and their solve order, the start frame holds the initial pose
+    # a loop solves the range up to max_loop_cycles more times, start frame included, until its chains settle
+    frame_increment = 1.0 / sub_div
+    frame_count = end_frame - start_frame + frame_increment
+
+    frame_list = []
+    while len(frame_list) * frame_increment < frame_count:
+        frame_list.append(float(len(frame_list) * frame_increment))
+
+    time_index_list = list(range(1, len(frame_list)))
+
+    if is_loop:
+        time_index_list += list(range(0, len(frame_list))) * max_loop_cycles
+
+    return [start_frame + frame for frame in frame_list], time_index_list
+
+
+def adaptive_step_times(start_frame, end_frame, frame_sub_divs, is_loop=False):
+    # times of the steps and their solve order, each frame after the start frame in its own number of steps
+    # return also the sub division of each step, the start frame one is the first frame one
+    time_list = [float(start_frame)]
+    step_sub_div_list = [frame_sub_divs[0] if len(frame_sub_divs) else 1]
+
+    for frame, sub_div in enumerate(frame_sub_divs):
+        time_list += [start_frame + frame + float(step) / sub_div for step in range(1, sub_div + 1)]
+        step_sub_div_list += [sub_div] * sub_div
+
+    time_index_list = list(range(1, len(time_list)))
+
+    if is_loop:
+        time_index_list += list(range(0, len(time_list))) * springSolver.kMaxLoopCycles
+
+    return time_list, time_index_list, step_sub_div_list
+
+
+def sample_adaptive(scene, solver, start_frame, end_frame, max_sub_div, is_loop=False):
+    # Sample the whole frames, pick the sub division of each frame, then sample the subframes it needs
+    # return the times of the steps, their solve order and the sample cache, the solver gets the step sub divisions
+    profiler = solver.profiler
+
+    matrix_key_list = solver.get_sampled_matrix_keys()
+    value_key_list = solver.get_sampled_value_keys()
+
+    frame_list, _ = step_times(start_frame, end_frame)
+
+    with profiler.phase('sample', len(frame_list) * (len(matrix_key_list) + len(value_key_list))):
+        cache = scene.sample(frame_list, matrix_key_list, value_key_list)
+
+    with profiler.phase('adaptive'):
+        frame_sub_div_list = solver.frame_sub_divs(cache, max_sub_div)
+
+    time_list, time_index_list, solver.step_sub_divs = adaptive_step_times(start_frame, end_frame, frame_sub_div_list, is_loop)
+
+    frame_set = set(frame_list)
+    subframe_list = [time for time in time_list if time not in frame_set]
+
+    if subframe_list:
+        with profiler.phase('sample', len(subframe_list) * (len(matrix_key_list) + len(value_key_list))):
+            cache = springCache.SampleCache.merge([cache, scene.sample(subframe_list, matrix_key_list, value_key_list)])
+
+    return time_list, time_index_list, cache
+
+
+def output_times(start_frame, end_frame, output_step=1.0):
+    # times keyed when subframes are wiped, every output_step frames and the end frame
+    # subframe steps stay in the solver, nothing is keyed between them
+    time_list = [float(time) for time in np.arange(start_frame, end_frame + 1e-6, output_step)]
+
+    if end_frame - time_list[-1] > 1e-6:
+        time_list.append(float(end_frame))
+
+    return time_list
+
+
+def checkpoint_callbacks(checkpoints, solver, checkpoint_position_list, resume_position):
+    # callbacks of the serial and parallel solves adding the states of the remaining steps at checkpoint_position_list
+    checkpoint_position_set = set(checkpoint_position_list)
+
+    def add_solver_state(position):
+        if position in checkpoint_position_set:
+            checkpoints.add(position + resume_position + 1, solver.get_state())
+
+    def add_partition_state(position, state):
+        checkpoints.add(position + resume_position + 1, state)
+
+    return add_solver_state, add_partition_state
+
+
+def solve_scene(scene, solver, times, time_index_list, start_frame, end_frame, output_times=None, worker_count=1, counters=None,
+                is_interrupted=None, step_callback=None, partition_callback=None, checkpoints=None, is_write=True, cache=None):
+    # Sample the scene, solve and write the curves back, return the curve cache
+    # stages are profiled by the solver profiler, a cache already sampled on times isn't sampled again
+    # with checkpoints of a previous calculation only the steps from the first changed one are solved and written
+    profiler = solver.profiler
+    time_index_list = list(time_index_list)
+
+    if cache is None:
+        matrix_key_list = solver.get_sampled_matrix_keys()
+        value_key_list = solver.get_sampled_value_keys()
+
+        with profiler.phase('sample', len(times) * (len(matrix_key_list) + len(value_key_list))):
+            cache = scene.sample(times, matrix_key_list, value_key_list)
+
+    # Solved values, start frame holds the initial pose
+    curve_cache = springCache.CurveCache(cache.times, solver.get_curve_keys())
+    resume_position = -1
+
+    if checkpoints is not None:
+        with profiler.phase('checkpoints'):
+            resume_position = checkpoints.resume(solver, cache, curve_cache, time_index_list)
+            checkpoints.start(solver, cache, time_index_list, resume_position)
+
+    if resume_position < 0:
+        solver.start(cache, curve_cache)
+
+    # remaining steps, checkpoint positions are relative to them
+    solve_time_index_list = time_index_list[resume_position + 1:]
+    checkpoint_position_list = []
+    checkpoint_callback = parallel_checkpoint_callback = None
+
+    if checkpoints is not None:
+        checkpoint_position_list = [position - resume_position - 1 for position in checkpoints.checkpoint_positions(cache.times, time_index_list) if position > resume_position]
+        checkpoint_callback, parallel_checkpoint_callback = checkpoint_callbacks(checkpoints, solver, checkpoint_position_list, resume_position)
+
+    if worker_count > 1 and len(solver.chain_indices()) > 1 and solve_time_index_list:
+        # wall time of the pool, workers phases are merged in the profiler
+        with profiler.phase('parallel solve'):
+            springSolver.solve_parallel(solver, cache, curve_cache, solve_time_index_list, worker_count, counters, is_interrupted, partition_callback,
+                                        checkpoints.states[resume_position] if resume_position >= 0 else None,
+                                        checkpoint_position_list, parallel_checkpoint_callback)
+    else:
+        solver.solve(cache, curve_cache, solve_time_index_list, counters, is_interrupted, step_callback, checkpoint_callback)
+
+    if checkpoints is not None:
+        checkpoints.finish(curve_cache, solver.first_cycle_values)
+
+    if not is_write:
+        return curve_cache
+
+    # keys before the first solved step are left untouched
+    if resume_position >= 0:
+        if not solve_time_index_list:
+            return curve_cache
+
+        start_frame = cache.times[min(solve_time_index_list)]
+        output_times = [time for time in (cache.times if output_times is None else output_times) if time >= start_frame - 1e-6]
+
+    # keep the steps solved before an interruption
+    with profiler.phase('bake', len(curve_cache.keys)):
+        scene.write_curves(curve_cache, start_frame, end_frame, output_times)
+
+    return curve_cache
+
+
+def create_bones(scene, node_names, start_frame, is_pose_match=False, profiler=None):
+    # bones of all the chains of node_names with their proxies
+    profiler = profiler or springProfile.NullProfiler()
+
+    bone_list = []
+    for chain_index, chain in enumerate(find_chains(scene, node_names)):
+        with profiler.phase('setup', len(chain) - 1):
+            bone_list += create_chain_bones(scene, chain, chain_index, start_frame, is_pose_match)
+
+    return bone_list
+
+
+def solve_chains(scene, node_names, spring, start_frame, end_frame, sub_div=1.0, is_loop=False, is_pose_match=False, is_fast_move=False,
+                 wipe_subframe=True, colliders=None, wind=None, worker_count=1, profiler=None, counters=None, checkpoints=None, is_write=True,
+                 output_step=1.0, solver_mode=springSolver.kAimMode, iterations=springSolver.kDefaultIterations, is_adaptive=False,
+                 sleep_tolerance=0.0):
+    # Whole calculation on the selected transforms node_names, as SpringMagicMaya without UI
+    # return the solver and its curve cache, curves are only solved if not is_write
+    # adaptive calculation solves each frame in 1 to sub_div steps, settled chains sleep with a sleep_tolerance
+    profiler = profiler or springProfile.NullProfiler()
+
+    try:
+        bone_list = create_bones(scene, node_names, start_frame, is_pose_match, profiler)
+        solver = springSolver.SpringSolver(spring, bone_list, colliders, wind, sub_div, is_fast_move, profiler, solver_mode, iterations, sleep_tolerance)
+
+        cache = None
+        if is_adaptive:
+            time_list, time_index_list, cache = sample_adaptive(scene, solver, start_frame, end_frame, sub_div, is_loop)
+        else:
+            time_list, time_index_list = step_times(start_frame, end_frame, sub_div, is_loop)
+
+        output_time_list = output_times(start_frame, end_frame, output_step) if wipe_subframe else None
+
+        curve_cache = solve_scene(scene, solver, time_list, time_index_list, start_frame, end_frame, output_time_list, worker_count, counters,
+                                  checkpoints=checkpoints, is_write=is_write, cache=cache)
+    finally:
+        scene.delete_proxies()
+
+    return solver, curve_cache
+
+
+def sweep_chains(scene, node_names, springs, start_frame, end_frame, sub_div=1.0, is_loop=False, is_pose_match=False, is_fast_move=False,
+                 colliders=None, wind=None, worker_count=1, profiler=None, counters=None, solver_mode=springSolver.kAimMode,
+                 iterations=springSolver.kDefaultIterations, is_adaptive=False, sleep_tolerance=0.0):
+    # Solve the chains with each spring of springs in one pass over the sampled values, nothing is written
+    # return the solver and a curve cache for each spring, the one picked is written with scene.write_curves
+    profiler = profiler or springProfile.NullProfiler()
+
+    try:
+        bone_list = create_variant_bones(create_bones(scene, node_names, start_frame, is_pose_match, profiler), springs)
+        solver = springSolver.SpringSolver(springs[0], bone_list, colliders, wind, sub_div, is_fast_move, profiler, solver_mode, iterations, sleep_tolerance)
+
+        cache = None
+        if is_adaptive:
+            time_list, time_index_list, cache = sample_adaptive(scene, solver, start_frame, end_frame, sub_div, is_loop)
+        else:
+            time_list, time_index_list = step_times(start_frame, end_frame, sub_div, is_loop)
+
+        curve_cache = solve_scene(scene, solver, time_list, time_index_list, start_frame, end_frame, None, worker_count, counters, is_write=False,
+                                  cache=cache)
+    finally:
+        scene.delete_proxies()
+
+    return solver, [curve_cache.variant(variant) for variant in range(len(springs))]
@@ -0,0 +1,1429 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Headless spring solver
+# Reproduce mathematically the aim constraint evaluation done by SpringData
+# All functions work on arrays of bones (first axis is the bone index) and never
+# call Maya, so a whole group of bones is solved in one call
+#
+# SpringSolver runs the whole calculation on sampled values, chains being
+# independent it can also solve them in a pool of processes
+#
+# In verlet mode the child positions are integrated and projected on the bone
+# length and the colliders a few iterations, the bones then aim at them
+#
+# An adaptive solve gives each frame its own number of steps, up to sub_div
+#
+# Conventions follow Maya: row vectors, v' = v * M, angles in degrees for eulers
+#
+#####################################################################################
+
+import math
+import os
+import sys
+import multiprocessing
+
+import numpy as np
+
+import springCache
+import springCollision
+import springMath
+import springProfile
+import springWind
+
+from collections import OrderedDict
+
+# Maya rotateOrder enum order
+kRotateOrders = ('xyz', 'yzx', 'zxy', 'xzy', 'yxz', 'zyx')
+
+kEpsilon = 1e-8
+
+kRotateAttributes = ['rotateX', 'rotateY', 'rotateZ']
+
+# aim blends the aim targets by ratio / sub_div, verlet integrates the child positions
+# then projects them on the bone length and the colliders a number of iterations
+kAimMode = 'aim'
+kVerletMode = 'verlet'
+kDefaultIterations = 4
+
+# constraint iterations stop for a bone moving less than this ratio of its length
+kConstraintTolerance = 1e-4
+
+# a chain sleeps while its animation and the colliders don't move, and its tips moved less than this
+# ratio of their bone length per frame for kSleepFrames frames, not on the turning point of a swing
+kSleepTolerance = 1e-3
+kSleepFrames = 3
+
+# a loop solves the range again, at most kMaxLoopCycles times, until the solved values of each chain
+# match the ones of the previous cycle kLoopMatchSteps steps in a row, then keeps the next ones of that cycle
+# orientations within kLoopTolerance radians, translate X within this ratio of the bone length
+kLoopTolerance = 1e-3
+kLoopMatchSteps = 2
+kMaxLoopCycles = 4
+
+# adaptive sub division, animated tip travel of a step in bone lengths, away from and near the colliders
+kFreeStepMotion = 0.5
+kColliderStepMotion = 0.1
+
+
+def sigmoid(x):
+    return 1 / (1 + math.exp(-x))
+
+
+def normalize(vectors):
+    # zero length vectors stay null, as dt.Vector.normal() does
+    vectors = np.asarray(vectors, dtype=float)
+    length = np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+    return np.where(length > kEpsilon, vectors / np.maximum(length, kEpsilon), 0.0)
+
+
+def rotation_part(matrices):
+    # 3x3 orientation of (N, 4, 4) world matrices, scale removed
+    return normalize(np.asarray(matrices, dtype=float)[..., :3, :3])
+
+
+def axis_rotation_matrices(angles, axis):
+    # angles in radians, axis in 'xyz'
+    angles = np.asarray(angles, dtype=float)
+    c = np.cos(angles)
+    s = np.sin(angles)
+
+    matrices = np.zeros(angles.shape + (3, 3))
+    i = 'xyz'.index(axis)
+    j, k = (i + 1) % 3, (i + 2) % 3
+
+    matrices[..., i, i] = 1.0
+    matrices[..., j, j] = c
+    matrices[..., j, k] = s
+    matrices[..., k, j] = -s
+    matrices[..., k, k] = c
+
+    return matrices
+
+
+def euler_to_matrix(eulers, rotate_orders=0):
+    # eulers (N, 3) in degrees, rotate_orders Maya enum (scalar or (N,))
+    eulers = np.radians(np.asarray(eulers, dtype=float).reshape(-1, 3))
+    rotate_orders = np.broadcast_to(np.asarray(rotate_orders, dtype=int), eulers.shape[:1])
+
+    matrices = np.empty(eulers.shape[:1] + (3, 3))
+
+    for order_index in np.unique(rotate_orders):
+        mask = rotate_orders == order_index
+        order = kRotateOrders[order_index]
+
+        # first rotated axis is on the left with row vectors
+        result = None
+        for axis in order:
+            axis_matrices = axis_rotation_matrices(eulers[mask, 'xyz'.index(axis)], axis)
+            result = axis_matrices if result is None else np.matmul(result, axis_matrices)
+
+        matrices[mask] = result
+
+    return matrices
+
+
+def _matrix_to_euler_order(matrices, order):
+    # With column vectors the matrix is Rk(c) * Rj(b) * Ri(a) for an order 'ijk'
+    columns = np.swapaxes(matrices, -1, -2)
+
+    i, j, k = ['xyz'.index(axis) for axis in order]
+    parity = 1.0 if (j - i) % 3 == 1 else -1.0
+
+    cos_b = np.sqrt(columns[:, i, i] ** 2 + columns[:, j, i] ** 2)
+    singular = cos_b < 1e-6
+
+    a = np.arctan2(parity * columns[:, k, j], columns[:, k, k])
+    b = np.arctan2(-parity * columns[:, k, i], cos_b)
+    c = np.arctan2(parity * columns[:, j, i], columns[:, i, i])
+
+    # gimbal lock, put all the rotation on the first axis
+    a = np.where(singular, np.arctan2(-parity * columns[:, j, k], columns[:, j, j]), a)
+    c = np.where(singular, 0.0, c)
+
+    eulers = np.empty((matrices.shape[0], 3))
+    eulers[:, i] = a
+    eulers[:, j] = b
+    eulers[:, k] = c
+
+    return np.degrees(eulers)
+
+
+def _closest_angle(angles, references):
+    return angles + 360.0 * np.round((references - angles) / 360.0)
+
+
+def matrix_to_euler(matrices, rotate_orders=0, previous_eulers=None):
+    # matrices (N, 3, 3), return eulers (N, 3) in degrees
+    # with previous_eulers, return the equivalent euler the closest to it (no flip)
+    matrices = np.asarray(matrices, dtype=float).reshape(-1, 3, 3)
+    rotate_orders = np.broadcast_to(np.asarray(rotate_orders, dtype=int), matrices.shape[:1])
+
+    eulers = np.empty((matrices.shape[0], 3))
+
+    for order_index in np.unique(rotate_orders):
+        mask = rotate_orders == order_index
+        order = kRotateOrders[order_index]
+        order_eulers = _matrix_to_euler_order(matrices[mask], order)
+
+        if previous_eulers is not None:
+            references = np.asarray(previous_eulers, dtype=float).reshape(-1, 3)[mask]
+
+            # the other euler solution is (a + 180, 180 - b, c + 180) on the order axes
+            i, j, k = ['xyz'.index(axis) for axis in order]
+            flipped = order_eulers.copy()
+            flipped[:, i] += 180.0
+            flipped[:, j] = 180.0 - flipped[:, j]
+            flipped[:, k] += 180.0
+
+            order_eulers = _closest_angle(order_eulers, references)
+            flipped = _closest_angle(flipped, references)
+
+            use_flipped = np.abs(flipped - references).sum(axis=1) < np.abs(order_eulers - references).sum(axis=1)
+            order_eulers = np.where(use_flipped[:, None], flipped, order_eulers)
+
+        eulers[mask] = order_eulers
+
+    return eulers
+
+
+def tension_factor(tension, sub_div):
+    # same as SpringData.aim_by_ratio
+    return tension / (1.0 / (sigmoid(1 - sub_div) + 0.5))
+
+
+def blend_up_vectors(previous_up_vectors, current_up_vectors, twist_ratio):
+    # interpolate y axis for twist, as SpringData.compute_up_vector
+    previous_up_vectors = normalize(previous_up_vectors)
+    current_up_vectors = normalize(current_up_vectors)
+    twist_ratio = np.reshape(twist_ratio, (-1, 1))
+
+    return previous_up_vectors * (1 - twist_ratio) + current_up_vectors * twist_ratio
+
+
+def weighted_aim_targets(new_child_positions, child_positions_corrected, grand_child_positions, use_tension, ratio, tension):
+    # Aim constraint aims at the weighted average of its targets positions
+    # weights are ratio, 1 - ratio and (1 - ratio) * tension for the grand child
+    ratio = np.reshape(ratio, (-1, 1))
+    tension = np.reshape(tension, (-1, 1))
+    use_tension = np.reshape(use_tension, (-1, 1))
+
+    current_weight = ratio
+    previous_weight = 1 - ratio
+    grand_child_weight = np.where(use_tension, (1 - ratio) * tension, 0.0)
+
+    weighted_sum = (np.asarray(new_child_positions, dtype=float) * current_weight +
+                    np.asarray(child_positions_corrected, dtype=float) * previous_weight +
+                    np.where(use_tension, np.asarray(grand_child_positions, dtype=float), 0.0) * grand_child_weight)
+
+    total_weight = current_weight + previous_weight + grand_child_weight
+
+    return weighted_sum / np.where(np.abs(total_weight) > kEpsilon, total_weight, 1.0)
+
+
+def aim_matrices(origins, targets, up_vectors):
+    # world orientation aiming X axis to target, Y axis to up vector
+    # aimVector=[1, 0, 0], upVector=[0, 1, 0], worldUpType='vector'
+    x_axis = normalize(np.asarray(targets, dtype=float) - np.asarray(origins, dtype=float))
+    z_axis = np.cross(x_axis, np.asarray(up_vectors, dtype=float))
+
+    # up vector parallel to aim, fall back on any perpendicular axis
+    degenerated = np.linalg.norm(z_axis, axis=-1) < kEpsilon
+    if np.any(degenerated):
+        fallback = np.where(np.abs(x_axis[degenerated, 1:2]) < 0.9, [[0.0, 1.0, 0.0]], [[0.0, 0.0, 1.0]])
+        z_axis[degenerated] = np.cross(x_axis[degenerated], fallback)
+
+    z_axis = normalize(z_axis)
+    y_axis = np.cross(z_axis, x_axis)
+
+    return np.stack([x_axis, y_axis, z_axis], axis=-2)
+
+
+def local_rotations(world_rotations, parent_rotations, joint_orients, rotate_axes, rotate_orders=0, previous_eulers=None):
+    # world = rotateAxis * rotate * jointOrient * parent, solve rotate
+    rotate_matrices = np.matmul(np.swapaxes(rotate_axes, -1, -2), world_rotations)
+    rotate_matrices = np.matmul(rotate_matrices, np.swapaxes(parent_rotations, -1, -2))
+    rotate_matrices = np.matmul(rotate_matrices, np.swapaxes(joint_orients, -1, -2))
+
+    return matrix_to_euler(rotate_matrices, rotate_orders, previous_eulers)
+
+
+def solve_aim(origins, new_child_positions, child_positions_corrected, grand_child_positions, use_tension,
+              previous_up_vectors, current_up_vectors, parent_matrices, joint_orients, rotate_axes, rotate_orders,
+              previous_eulers, ratio, twist_ratio, tension):
+    # Full replacement of the aim constraint evaluation for a group of bones
+    # ratio, twist_ratio and tension are already divided by the sub division (scalar or per bone)
+    # return local rotate values (N, 3) in degrees
+    up_vectors = blend_up_vectors(previous_up_vectors, current_up_vectors, twist_ratio)
+    targets = weighted_aim_targets(new_child_positions, child_positions_corrected, grand_child_positions, use_tension, ratio, tension)
+    world_rotations = aim_matrices(origins, targets, up_vectors)
+
+    return local_rotations(world_rotations, rotation_part(parent_matrices), joint_orients, rotate_axes, rotate_orders, previous_eulers)
+
+
+def compose_local_matrices(translates, eulers, rotate_orders, scales, rotate_axes, joint_orients):
+    # local matrix = scale * rotateAxis * rotate * jointOrient, translate on the last row
+    # pivots and segment scale compensate are ignored
+    translates = np.asarray(translates, dtype=float).reshape(-1, 3)
+
+    orientations = np.matmul(rotate_axes, euler_to_matrix(eulers, rotate_orders))
+    orientations = np.matmul(orientations, joint_orients)
+    orientations = orientations * np.asarray(scales, dtype=float).reshape(-1, 3, 1)
+
+    matrices = np.zeros((translates.shape[0], 4, 4))
+    matrices[:, :3, :3] = orientations
+    matrices[:, 3, :3] = translates
+    matrices[:, 3, 3] = 1.0
+
+    return matrices
+
+
+def transform_points(points, matrices):
+    # points (N, 3) by (N, 4, 4) matrices
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+
+    return np.einsum('ni,nij->nj', points, np.asarray(matrices)[:, :3, :3]) + np.asarray(matrices)[:, 3, :3]
+
+
+def extended_translations(translations, translate_x):
+    # (N, 3) local translations, X replaced where translate_x isn't NaN (bone extend)
+    translations = np.array(translations, dtype=float)
+    translations[:, 0] = np.where(np.isnan(translate_x), translations[:, 0], translate_x)
+
+    return translations
+
+
+def extended_lengths(bone_lengths, lengths, extend):
+    # same as SpringData.extend_bone, rest bone lengths stretched toward lengths as much as extend
+    return (bone_lengths * (1 - extend)) + (lengths * extend)
+
+
+def substep_ratio(ratio, sub_div):
+    # ratio of a frame spread on sub_div steps, compounded it gives ratio back on the frame
+    return 1.0 - (1.0 - np.clip(ratio, 0.0, 1.0)) ** (1.0 / sub_div)
+
+
+def step_ratio(ratio, sub_div, step_sub_div):
+    # ratio / sub_div for a step of a frame solved in step_sub_div steps instead of sub_div
+    # compounded over the frame it blends as much as the sub_div steps would
+    if step_sub_div == sub_div:
+        return ratio / sub_div
+
+    return 1.0 - (1.0 - np.clip(ratio / sub_div, 0.0, 1.0)) ** (float(sub_div) / step_sub_div)
+
+
+def verlet_coefficients(ratio, inertia, sub_div):
+    # stiffness and damping of a step, ratio and inertia being the ones of a frame
+    # the roots of a step response are the sub_div roots of the frame ones, a bone
+    # swings at the same frequency and settles as fast whatever the sub division
+    stiffness = np.clip(np.asarray(ratio, dtype=float), 0.0, 1.0)
+    damping = np.clip(np.asarray(inertia, dtype=float), 0.0, 1.0)
+
+    # x' = x + v * damping + (goal - x - v * damping) * stiffness
+    root_sum = (1 - stiffness) * (1 + damping)
+    root_product = (1 - stiffness) * damping
+
+    discriminant = np.sqrt(root_sum * root_sum - 4 * root_product + 0j)
+    step_roots = [((root_sum + sign * discriminant) / 2) ** (1.0 / sub_div) for sign in [1, -1]]
+
+    step_root_sum = (step_roots[0] + step_roots[1]).real
+    step_root_product = (step_roots[0] * step_roots[1]).real
+
+    step_stiffness = 1 - (step_root_sum - step_root_product)
+    step_damping = np.where(1 - step_stiffness > kEpsilon, step_root_product / np.maximum(1 - step_stiffness, kEpsilon), 0.0)
+
+    return step_stiffness, step_damping
+
+
+def select_columns(column_dict, mask):
+    # level columns or spring values of some of the level bones
+    return OrderedDict((name, columns[mask]) for name, columns in column_dict.items())
+
+
+def length_constraints(origins, positions, lengths):
+    # (N, 3) positions moved along the bone to be lengths away from origins
+    origins = np.asarray(origins, dtype=float)
+
+    return origins + normalize(np.asarray(positions, dtype=float) - origins) * np.reshape(lengths, (-1, 1))
+
+
+def inertia_offsets(new_child_positions, child_positions, previous_child_positions, ratio, inertia, sub_div, mass_sub_div=None):
+    # same as SpringData.apply_inertia for a group of bones
+    # ratio is already divided by the sub division, ratio and inertia are scalar or per bone
+    # mass_sub_div is the sub division the momentum of a frame is spread on, sub_div by default
+    new_child_positions = np.asarray(new_child_positions, dtype=float)
+    child_positions = np.asarray(child_positions, dtype=float)
+    ratio = np.reshape(ratio, (-1, 1))
+    inertia = np.reshape(inertia, (-1, 1))
+
+    offsets = np.zeros(new_child_positions.shape)
+
+    if np.any(inertia > 0.0):
+        directions = new_child_positions - child_positions
+        distances = np.linalg.norm(directions * (1 - ratio) * (1 - inertia), axis=-1)
+
+        offsets = np.where(inertia > 0.0, normalize(directions) * (distances / sub_div)[:, None], 0.0)
+
+    # apply mass
+    force_directions = child_positions - np.asarray(previous_child_positions, dtype=float)
+    force_distances = np.linalg.norm(force_directions, axis=-1) * inertia[:, 0]
+
+    return offsets + normalize(force_directions) * (force_distances / (mass_sub_div or sub_div))[:, None]
+
+
+class Spring:
+    # Spring settings of a calculation, also used from the Maya script as core.Spring
+    # ratio: 0 to 1, how soft the spring is, bigger value softer result
+    #        only working for "X-axis aiming to child" joint chains
+    # twistRatio: 0 to 1, how soft the twist (X-axis) is
+    # tension: how much of the bend force goes through the chain, only when a collision happens,
+    #          reduces popping and clipping through the colliders
+    # extend: 0 to 1, flexibility of the spring, produces stretch and squash
+    # inertia: 0 to 1, inertia of the spring, produces a heavier result
+
+    def __init__(self, ratio=0.5, twistRatio=0.0, tension=0.0, extend=0.0, inertia=0.0):
+
+        self.ratio = ratio
+        self.twist_ratio = twistRatio
+        self.tension = tension
+        self.extend = extend
+        self.inertia = inertia
+
+
+class SpringBone:
+    # A transform (the bone) aiming at its child and its pose at the start of the solve, nodes are given by name
+    # positions are world space (3,) arrays, rotate values are in degrees
+    # rotate_axis and joint_orient are 3x3 matrices
+    # the solver copies the bones to a BoneStore, only the store changes while solving
+
+    def __init__(self, name, child, grand_child, grand_parent, proxy, rotation, rotate_order, rotate_axis, joint_orient,
+                 scale, world_matrix, child_position, grand_child_position=None, depth=0, chain_index=0, variant=0, spring=None):
+        self.name = name
+        self.child = child
+        self.grand_child = grand_child
+        self.grand_parent = grand_parent
+        self.proxy = proxy
+
+        # depth in the chain, bones of a same depth are solved together
+        self.depth = depth
+        self.chain_index = chain_index
+
+        # parameter set of a sweep, copies of a bone solve the same transform with their own spring
+        # None uses the solver spring
+        self.variant = variant
+        self.spring = spring
+
+        # local rotate values, used as reference to avoid euler flips
+        self.rotation = np.array(rotation, dtype=float)
+
+        # rest orientation, used to get back local rotate values
+        self.rotate_order = int(rotate_order)
+        self.rotate_axis = np.array(rotate_axis, dtype=float).reshape(3, 3)
+        self.joint_orient = np.array(joint_orient, dtype=float).reshape(3, 3)
+        self.scale = np.array(scale, dtype=float)
+
+        self.world_matrix = np.array(world_matrix, dtype=float).reshape(4, 4)
+
+        self.child_position = np.array(child_position, dtype=float)
+        self.grand_child_position = None if grand_child_position is None else np.array(grand_child_position, dtype=float)
+
+    def get_key(self, node):
+        # solver key of the bone of node in the same variant
+        return node if self.variant == 0 else (node, self.variant)
+
+    def get_curve_keys(self, extend):
+        # solved attributes, written at the end of the calculation
+        curve_key_list = [springCache.curve_key(self.name, attribute, self.variant) for attribute in kRotateAttributes]
+
+        if extend != 0.0:
+            curve_key_list.append(springCache.curve_key(self.child, 'translateX', self.variant))
+
+        return curve_key_list
+
+
+class BoneStore:
+    # Solver state of all the bones in arrays, a row per bone in the solver order
+    # parent and child bones are rows too, so solving a step never looks a bone up by name
+    # None positions and translate X are stored as NaN
+
+    # fields changed by the solve, a solver state is a copy of them
+    kStateFields = ['rotation', 'world_matrix', 'up_vector', 'child_position', 'previous_child_position',
+                    'grand_child_position', 'child_translate_x', 'has_child_collide', 'plane_collide_index', 'settled_step_count',
+                    'cycle_match_count']
+
+    def __init__(self, bones):
+        bone_count = len(bones)
+        bone_row_dict = dict((bone.get_key(bone.name), row) for row, bone in enumerate(bones))
+
+        # rest orientation, used to get back local rotate values
+        self.rotate_order = np.array([bone.rotate_order for bone in bones], dtype=int)
+        self.rotate_axis = np.array([bone.rotate_axis for bone in bones], dtype=float).reshape(bone_count, 3, 3)
+        self.joint_orient = np.array([bone.joint_orient for bone in bones], dtype=float).reshape(bone_count, 3, 3)
+        self.scale = np.array([bone.scale for bone in bones], dtype=float).reshape(bone_count, 3)
+
+        # parent bone solved before the bone on a step, child bone whose pose gives the grand child position, -1 if none
+        self.grand_parent_rows = np.array([bone_row_dict.get(bone.get_key(bone.grand_parent), -1) for bone in bones], dtype=int)
+        self.child_rows = np.array([bone_row_dict[bone.get_key(bone.child)] if bone.grand_child else -1 for bone in bones], dtype=int)
+
+        # local rotate values, used as reference to avoid euler flips
+        self.rotation = np.array([bone.rotation for bone in bones], dtype=float).reshape(bone_count, 3)
+
+        # world matrix solved on the current step, read by the child bone
+        self.world_matrix = np.array([bone.world_matrix for bone in bones], dtype=float).reshape(bone_count, 4, 4)
+        self.up_vector = self.world_matrix[:, 1, :3].copy()
+
+        self.child_position = np.array([bone.child_position for bone in bones], dtype=float).reshape(bone_count, 3)
+        self.previous_child_position = self.child_position.copy()
+        self.grand_child_position = np.array([bone.grand_child_position if bone.grand_child_position is not None else [np.nan] * 3 for bone in bones], dtype=float).reshape(bone_count, 3)
+
+        self.bone_length = np.linalg.norm(self.child_position - self.world_matrix[:, 3, :3], axis=-1)
+
+        # chain of each bone, variants of a chain are chains of their own
+        chain_dict = {}
+        self.chain = np.array([chain_dict.setdefault((bone.chain_index, bone.variant), len(chain_dict)) for bone in bones], dtype=int)
+
+        # child translate X driven by extend, NaN to use the sampled value
+        self.child_translate_x = np.full(bone_count, np.nan)
+
+        self.has_child_collide = np.zeros(bone_count, dtype=bool)
+        self.plane_collide_index = np.full(bone_count, -1, dtype=int)
+
+        # steps in a row the child moved less than the sleep tolerance
+        self.settled_step_count = np.zeros(bone_count, dtype=int)
+
+        # steps in a row the solved values matched the ones of the previous loop cycle
+        self.cycle_match_count = np.zeros(bone_count, dtype=int)
+
+    def __len__(self):
+        return len(self.rotation)
+
+    def get_state(self):
+        return OrderedDict((field, getattr(self, field).copy()) for field in self.kStateFields)
+
+    def set_state(self, state, rows=None):
+        for field in self.kStateFields:
+            getattr(self, field)[:] = state[field] if rows is None else state[field][list(rows)]
+
+
+class SpringSolver:
+    # Solve chains of SpringBone over the steps of a SampleCache, results go to a CurveCache
+    # bones are given parent first, chains only share read only colliders and wind
+
+    def __init__(self, spring, bones, colliders=None, wind=None, sub_div=1.0, is_fast_move=False, profiler=None, mode=kAimMode, iterations=kDefaultIterations,
+                 sleep_tolerance=0.0):
+        self.spring = spring
+        self.colliders = colliders or springCollision.ColliderSet()
+        self.wind = wind or springWind.WindField()
+        self.sub_div = sub_div
+        self.is_fast_move = is_fast_move
+        self.profiler = profiler or springProfile.NullProfiler()
+
+        # aim or verlet solve, iterations are the constraint iterations of a verlet step
+        self.mode = mode
+        self.iterations = iterations
+
+        # sub division of each step of an adaptive solve, by time index, None if they all use sub_div
+        self.step_sub_divs = None
+
+        # settled chains are not solved, 0 solves them all on every step
+        self.sleep_tolerance = sleep_tolerance
+
+        self.bones = OrderedDict((bone.get_key(bone.name), bone) for bone in bones)
+
+        # bones of a same depth are independent and solved together
+        self.levels = []
+        for bone in self.bones.values():
+            while len(self.levels) <= bone.depth:
+                self.levels.append([])
+
+            self.levels[bone.depth].append(bone)
+
+        # spring parameters of each level bones, a sweep solves several springs at once
+        self.level_springs = [OrderedDict((attribute, np.array([getattr(self.get_spring(bone), attribute) for bone in level], dtype=float))
+                                          for attribute in ['ratio', 'twist_ratio', 'tension', 'extend', 'inertia'])
+                              for level in self.levels]
+
+        # state of the bones, a level is a group of store rows
+        self.store = BoneStore(list(self.bones.values()))
+
+        # curve values when a loop starts its first cycle, the first pass is resumed from them
+        self.first_cycle_values = None
+
+        bone_row_dict = dict((key, row) for row, key in enumerate(self.bones))
+        self.level_rows = [np.array([bone_row_dict[bone.get_key(bone.name)] for bone in level], dtype=int) for level in self.levels]
+
+    def get_spring(self, bone):
+        return bone.spring or self.spring
+
+    def chain_indices(self):
+        return sorted(set(bone.chain_index for bone in self.bones.values()))
+
+    def partition(self, partition_count):
+        # split chains into solvers of about the same number of bones, always the same way
+        chain_size_dict = OrderedDict((chain_index, 0) for chain_index in self.chain_indices())
+        for bone in self.bones.values():
+            chain_size_dict[bone.chain_index] += 1
+
+        partition_list = [[] for _ in range(max(min(partition_count, len(chain_size_dict)), 1))]
+        partition_size_list = [0] * len(partition_list)
+
+        for chain_index in sorted(chain_size_dict, key=lambda index: (-chain_size_dict[index], index)):
+            partition_index = partition_size_list.index(min(partition_size_list))
+            partition_list[partition_index].append(chain_index)
+            partition_size_list[partition_index] += chain_size_dict[chain_index]
+
+        # each partition profiles on its own, merged after the solve
+        solver_list = [SpringSolver(self.spring, [bone for bone in self.bones.values() if bone.chain_index in chain_index_list],
+                                    self.colliders, self.wind, self.sub_div, self.is_fast_move, self.profiler.__class__(), self.mode, self.iterations,
+                                    self.sleep_tolerance)
+                       for chain_index_list in partition_list if chain_index_list]
+
+        # adaptive steps are solved the same way by every partition
+        for solver in solver_list:
+            solver.step_sub_divs = self.step_sub_divs
+
+        return solver_list
+
+    def get_sampled_matrix_keys(self):
+        # world matrix of drivers and colliders, local matrix of the solved chains
+        # solved transforms world matrices are computed from their parents
+        matrix_key_list = []
+
+        for bone in self.bones.values():
+            if bone.get_key(bone.grand_parent) not in self.bones:
+                matrix_key_list.append((bone.grand_parent, 'worldMatrix'))
+
+            for transform in [bone.name, bone.child, bone.grand_child, bone.proxy]:
+                if transform:
+                    matrix_key_list.append((transform, 'matrix'))
+
+        matrix_key_list += self.colliders.matrix_keys()
+        matrix_key_list += self.wind.matrix_keys()
+
+        # Remove duplicates, keep order
+        return list(OrderedDict.fromkeys(matrix_key_list))
+
+    def get_sampled_value_keys(self):
+        return self.colliders.value_keys() + self.wind.value_keys()
+
+    def get_curve_keys(self):
+        curve_key_list = []
+        for bone in self.bones.values():
+            curve_key_list += bone.get_curve_keys(self.get_spring(bone).extend)
+
+        return curve_key_list
+
+    def get_state(self):
+        # copy of the state of all the bones, an array per BoneStore field with a row per bone
+        # None positions and translate X are stored as NaN
+        return self.store.get_state()
+
+    def set_state(self, state, rows=None):
+        # restore a state from get_state, rows are the state rows of the bones if it has more bones
+        self.store.set_state(state, rows)
+
+    def get_signature(self):
+        # settings and colliders a solve depends on, other than the sampled values
+        return repr((
+            [[spring.ratio, spring.twist_ratio, spring.tension, spring.extend, spring.inertia] for spring in [self.spring] + list(OrderedDict.fromkeys(bone.spring for bone in self.bones.values() if bone.spring))],
+            self.sub_div,
+            self.is_fast_move,
+            self.mode,
+            self.iterations,
+            self.sleep_tolerance,
+            self.wind.emitter_names,
+            self.wind.turbulent_names,
+            self.colliders.capsule_names,
+            self.colliders.capsule_end_names,
+            self.colliders.plane_names,
+            [vertex_positions.tolist() for vertex_positions in self.colliders.plane_vertex_positions_list],
+            self.colliders.floor,
+            self.get_curve_keys()))
+
+    def get_changed_times(self, cache, previous_cache, curve_values):
+        # (T,) True where the sampled values the solve reads differ from previous_cache
+        # or where the scene doesn't hold the solved rotations anymore (undo, edited keys)
+        changed_time_list = np.zeros(len(cache.times), dtype=bool)
+
+        # only translations are read from the solved transforms local matrices, they hold the solved rotations
+        # and the solved translate X of the extended children
+        solved_set = set()
+        for bone in self.bones.values():
+            solved_set.update([bone.name, bone.child, bone.grand_child])
+
+        curve_index = dict((key, index) for index, key in enumerate(self.get_curve_keys()))
+
+        for key_index, (node, attribute) in enumerate(cache.matrix_keys):
+            matrices = cache.matrices[:, key_index]
+            previous_matrices = previous_cache.matrices[:, key_index]
+
+            if node in solved_set and attribute == 'matrix':
+                axes = slice(1, 3) if (node, 'translateX') in curve_index else slice(0, 3)
+                changed_time_list |= np.any(matrices[:, 3, axes] != previous_matrices[:, 3, axes], axis=1)
+            else:
+                changed_time_list |= np.any((matrices != previous_matrices).reshape(len(cache.times), -1), axis=1)
+
+        changed_time_list |= np.any(cache.values != previous_cache.values, axis=1)
+
+        # solved values on whole frames, subframe keys may be wiped
+        frame_index_list = np.flatnonzero(np.abs(cache.times - np.round(cache.times)) < 1e-6)
+
+        for bone in self.bones.values():
+            if bone.variant:
+                continue
+
+            rotation_list = curve_values[frame_index_list][:, [curve_index[(bone.name, attribute)] for attribute in kRotateAttributes]]
+            solved_list = ~np.isnan(rotation_list[:, 0])
+
+            if not solved_list.any():
+                continue
+
+            time_index_list = frame_index_list[solved_list]
+            bone_count = len(time_index_list)
+
+            orientation_list = compose_local_matrices(
+                np.zeros((bone_count, 3)),
+                rotation_list[solved_list],
+                [bone.rotate_order] * bone_count,
+                [bone.scale] * bone_count,
+                [bone.rotate_axis] * bone_count,
+                [bone.joint_orient] * bone_count)[:, :3, :3]
+
+            sampled_orientation_list = cache.matrices[time_index_list, cache.matrix_index[(bone.name, 'matrix')], :3, :3]
+
+            changed_time_list[time_index_list] |= np.any(np.abs(orientation_list - sampled_orientation_list).reshape(bone_count, -1) > 1e-6, axis=1)
+
+            if (bone.child, 'translateX') in curve_index:
+                translate_x_list = curve_values[time_index_list, curve_index[(bone.child, 'translateX')]]
+                sampled_translate_x_list = cache.matrices[time_index_list, cache.matrix_index[(bone.child, 'matrix')], 3, 0]
+
+                changed_time_list[time_index_list] |= np.abs(translate_x_list - sampled_translate_x_list) > 1e-6
+
+        return changed_time_list
+
+    def get_columns(self, cache, curve_cache=None):
+        # columns of each level bones in the sample and curve caches, sample ones only without curve cache
+        # names are looked up once per solve, never while solving the steps
+        bones = list(self.bones.values())
+        matrix_index = cache.matrix_index
+
+        column_dict = OrderedDict([
+            # drivers of the chains, bones solved on the step are read from the store instead
+            ('driver', [matrix_index.get((bone.grand_parent, 'worldMatrix'), 0) for bone in bones]),
+            ('name', [matrix_index[(bone.name, 'matrix')] for bone in bones]),
+            ('child', [matrix_index[(bone.child, 'matrix')] for bone in bones]),
+            ('grand_child', [matrix_index[(bone.grand_child, 'matrix')] if bone.grand_child else 0 for bone in bones]),
+            ('proxy', [matrix_index[(bone.proxy, 'matrix')] for bone in bones])])
+
+        if curve_cache is not None:
+            key_index = curve_cache.key_index
+
+            column_dict['rotation'] = [[key_index[springCache.curve_key(bone.name, attribute, bone.variant)] for attribute in kRotateAttributes] for bone in bones]
+            column_dict['translate_x'] = [key_index.get(springCache.curve_key(bone.child, 'translateX', bone.variant), -1) for bone in bones]
+
+        column_dict = OrderedDict((name, np.array(columns, dtype=int)) for name, columns in column_dict.items())
+
+        if curve_cache is not None:
+            column_dict['rotation'] = column_dict['rotation'].reshape(-1, 3)
+
+        return [OrderedDict((name, columns[rows]) for name, columns in column_dict.items()) for rows in self.level_rows]
+
+    def frame_sub_divs(self, cache, max_sub_div):
+        # sub division of each frame after the first of a cache sampled on whole frames, 1 to max_sub_div
+        # from the travel of the animated child positions and the lag of the tips behind them,
+        # shorter steps near the colliders
+        store = self.store
+        matrices = cache.matrices
+        max_sub_div = max(int(max_sub_div), 1)
+
+        if not len(store):
+            return [1] * (len(cache.times) - 1)
+
+        # animation of the bones, drivers included, over all the frames at once
+        world_matrices = np.zeros((len(cache.times), len(store), 4, 4))
+        goal_positions = np.zeros((len(cache.times), len(store), 3))
+
+        for rows, columns in zip(self.level_rows, self.get_columns(cache)):
+            grand_parent_rows = store.grand_parent_rows[rows]
+            has_grand_parent_list = grand_parent_rows >= 0
+
+            parent_matrices = matrices[:, columns['driver']]
+            parent_matrices[:, has_grand_parent_list] = world_matrices[:, grand_parent_rows[has_grand_parent_list]]
+
+            world_matrices[:, rows] = np.matmul(matrices[:, columns['name']], parent_matrices)
+            goal_positions[:, rows] = np.matmul(matrices[:, columns['proxy']], parent_matrices)[..., 3, :3]
+
+        bone_lengths = np.maximum(store.bone_length, kEpsilon)
+        travels = np.linalg.norm(np.diff(goal_positions, axis=0), axis=-1) / bone_lengths
+
+        # the tips lag behind the animation and catch up by ratio of the distance on each frame,
+        # less with inertia carrying them on
+        catch_ups = np.zeros(len(store))
+        for rows, level_spring in zip(self.level_rows, self.level_springs):
+            catch_ups[rows] = np.clip(level_spring['ratio'], 0.0, 1.0) * (1 - np.clip(level_spring['inertia'], 0.0, 1.0))
+
+        tip_travels = np.zeros(travels.shape)
+        lags = np.zeros(len(store))
+
+        for frame_index, travel_list in enumerate(travels):
+            tip_travels[frame_index] = travel_list + lags
+            lags = (lags + travel_list) * (1 - catch_ups)
+
+        # tips about to reach a collider, as far as they lag
+        step_motions = np.full(travels.shape, kFreeStepMotion)
+
+        if len(self.colliders):
+            for frame_index in range(1, len(cache.times)):
+                capsule_snapshot, plane_snapshot = self.colliders.snapshots(cache, frame_index)
+                margins = bone_lengths * (1 + tip_travels[frame_index - 1])
+
+                near_list = capsule_snapshot.is_near(goal_positions[frame_index], goal_positions[frame_index - 1], margins)
+                near_list |= plane_snapshot.is_near(goal_positions[frame_index], goal_positions[frame_index - 1], margins)
+
+                step_motions[frame_index - 1, near_list] = kColliderStepMotion
+
+        sub_divs = np.ceil(np.max(tip_travels / step_motions, axis=1))
+
+        return [int(sub_div) for sub_div in np.clip(sub_divs, 1, max_sub_div)]
+
+    def start(self, cache, curve_cache):
+        # start step holds the initial pose
+        for rows, columns in zip(self.level_rows, self.get_columns(cache, curve_cache)):
+            curve_cache.values[0, columns['rotation']] = self.store.rotation[rows]
+
+            is_extended = columns['translate_x'] >= 0
+            curve_cache.values[0, columns['translate_x'][is_extended]] = cache.matrices[0, columns['child'][is_extended], 3, 0]
+
+    def solve(self, cache, curve_cache, time_index_list, counters=None, is_interrupted=None, step_callback=None, checkpoint_callback=None):
+        # solve the steps in the given order, steps already solved are solved again (loop)
+        # loop cycles start on the start frame step, each step is compared with the same step of the previous cycle,
+        # chains that match it keep the keys of that cycle for the next steps and are not solved anymore
+        # checkpoint_callback gets the position of each solved step in time_index_list
+        level_columns = self.get_columns(cache, curve_cache)
+
+        looping_list = None
+
+        for position, time_index in enumerate(time_index_list):
+
+            if is_interrupted and is_interrupted():
+                break
+
+            if time_index == 0 and looping_list is None:
+                self.first_cycle_values = curve_cache.values.copy()
+                looping_list = self.looping_bones()
+
+            # values of the previous cycle, replaced by the step
+            previous_values = None if looping_list is None else curve_cache.values[time_index].copy()
+
+            self.solve_step(cache, curve_cache, time_index, counters, level_columns, looping_list)
+
+            if looping_list is not None:
+                with self.profiler.phase('loop'):
+                    self.match_cycle(curve_cache, time_index, previous_values, level_columns, looping_list)
+
+                    done_list = looping_list & ~self.looping_bones()
+                    if done_list.any():
+                        self.keep_cycle_values(curve_cache, time_index, done_list, level_columns)
+
+                    looping_list = looping_list & ~done_list
+
+            if checkpoint_callback:
+                checkpoint_callback(position)
+
+            if step_callback:
+                step_callback()
+
+            if looping_list is not None and not looping_list.any():
+                break
+
+    def solve_step(self, cache, curve_cache, time_index, counters=None, level_columns=None, looping_list=None):
+        # Sampled colliders and wind for this step, shared by all the bones
+        # only the bones of looping_list are solved if given, the others keep the values of a previous loop cycle
+        level_columns = level_columns or self.get_columns(cache, curve_cache)
+
+        step_sub_div = self.sub_div if self.step_sub_divs is None else self.step_sub_divs[time_index]
+
+        # settled chains keep their values, a step with only settled chains reads no collider
+        awake_list = None
+        if self.sleep_tolerance > 0.0:
+            with self.profiler.phase('sleep'):
+                awake_list = self.awake_bones(cache, time_index, level_columns, step_sub_div)
+
+        solved_list = awake_list
+        if looping_list is not None:
+            solved_list = looping_list if awake_list is None else awake_list & looping_list
+
+        capsule_snapshot = plane_snapshot = wind_snapshot = None
+
+        if solved_list is None or solved_list.any():
+            with self.profiler.phase('colliders'):
+                capsule_snapshot, plane_snapshot = self.colliders.snapshots(cache, time_index)
+
+            self.profiler.add_scene_queries('colliders', capsule_snapshot.scene_query_count + plane_snapshot.scene_query_count)
+
+            with self.profiler.phase('wind'):
+                wind_snapshot = self.wind.snapshot(cache, time_index)
+
+            if wind_snapshot:
+                self.profiler.add_scene_queries('wind', wind_snapshot.scene_query_count)
+
+        for rows, columns, level_spring in zip(self.level_rows, level_columns, self.level_springs):
+            if solved_list is not None and not solved_list[rows].all():
+                level_solved_list = solved_list[rows]
+
+                if awake_list is not None:
+                    level_held_list = ~awake_list[rows] if looping_list is None else ~awake_list[rows] & looping_list[rows]
+                    self.hold_level(cache, curve_cache, time_index, rows[level_held_list], select_columns(columns, level_held_list))
+
+                if not level_solved_list.any():
+                    continue
+
+                rows = rows[level_solved_list]
+                columns = select_columns(columns, level_solved_list)
+                level_spring = select_columns(level_spring, level_solved_list)
+
+            self.solve_level(cache, curve_cache, time_index, rows, columns, level_spring, capsule_snapshot, plane_snapshot, wind_snapshot, step_sub_div)
+
+        if awake_list is not None:
+            store = self.store
+            settled_list = np.linalg.norm(store.child_position - store.previous_child_position, axis=-1) * step_sub_div <= self.sleep_tolerance * store.bone_length
+            store.settled_step_count = np.where(solved_list, np.where(settled_list, store.settled_step_count + 1, 0), store.settled_step_count)
+
+        if counters is not None:
+            bone_count = len(self.store) if looping_list is None else np.count_nonzero(looping_list)
+
+            counters.add_step(capsule_snapshot, plane_snapshot)
+            counters.add_bone_steps(bone_count, 0 if solved_list is None else bone_count - np.count_nonzero(solved_list))
+
+    def looping_bones(self):
+        # (B,) True for the bones of the chains still solved by a loop, a chain is done once all its bones
+        # matched the previous cycle kLoopMatchSteps steps in a row
+        store = self.store
+
+        if not len(store):
+            return np.zeros(0, dtype=bool)
+
+        moving_list = store.cycle_match_count < kLoopMatchSteps
+
+        # every bone of a looping chain is solved
+        return (np.bincount(store.chain, weights=moving_list, minlength=store.chain.max() + 1) > 0)[store.chain]
+
+    def match_cycle(self, curve_cache, time_index, previous_values, level_columns, looping_list):
+        # count the steps in a row the values of the looping bones matched previous_values, the ones of the previous cycle
+        # eulers of a same orientation can differ from a cycle to the next, orientations are compared
+        # a value never solved doesn't match
+        store = self.store
+        values = curve_cache.values[time_index]
+        bone_lengths = np.maximum(store.bone_length, kEpsilon)
+
+        differences = np.zeros(len(store))
+
+        for rows, columns in zip(self.level_rows, level_columns):
+            orientations = euler_to_matrix(values[columns['rotation']], store.rotate_order[rows])
+            previous_orientations = euler_to_matrix(previous_values[columns['rotation']], store.rotate_order[rows])
+            differences[rows] = np.abs(orientations - previous_orientations).max(axis=(1, 2))
+
+            is_extended = columns['translate_x'] >= 0
+            extended_rows = rows[is_extended]
+            translate_x_columns = columns['translate_x'][is_extended]
+
+            differences[extended_rows] = np.maximum(differences[extended_rows], np.abs(values[translate_x_columns] - previous_values[translate_x_columns]) / bone_lengths[extended_rows])
+
+        # NaN differences don't match
+        matched_list = differences <= kLoopTolerance
+        store.cycle_match_count = np.where(looping_list, np.where(matched_list, store.cycle_match_count + 1, 0), store.cycle_match_count)
+
+    def keep_cycle_values(self, curve_cache, time_index, done_list, level_columns):
+        # the bones of done_list keep the rotations of the previous cycle on the steps after time_index,
+        # as the eulers the closest to the ones of the step before, so their curves don't spin where the cycles meet
+        store = self.store
+
+        for rows, columns in zip(self.level_rows, level_columns):
+            level_done_list = done_list[rows]
+
+            if not level_done_list.any():
+                continue
+
+            rotation_columns = columns['rotation'][level_done_list]
+            rotate_orders = store.rotate_order[rows[level_done_list]]
+            previous_eulers = curve_cache.values[time_index, rotation_columns]
+
+            for next_time_index in range(time_index + 1, len(curve_cache.times)):
+                eulers = curve_cache.values[next_time_index, rotation_columns]
+                eulers = matrix_to_euler(euler_to_matrix(eulers, rotate_orders), rotate_orders, previous_eulers)
+
+                curve_cache.values[next_time_index, rotation_columns] = eulers
+                previous_eulers = eulers
+
+    def awake_bones(self, cache, time_index, level_columns, step_sub_div=None):
+        # (B,) True for the bones of the chains solved on the step, False for settled ones
+        # a chain settles when its animation didn't move since the previous step (the last one before a loop)
+        # and its tips, the spring residual, stayed under the tolerance for kSleepFrames frames
+        # a moving collider wakes every chain, the wind the chains it blows on or stopped blowing on,
+        # the first step solves them all from the initial pose
+        store = self.store
+        tolerance = self.sleep_tolerance
+        bone_lengths = np.maximum(store.bone_length, kEpsilon)
+
+        if not len(store) or time_index == 1:
+            return np.ones(len(store), dtype=bool)
+
+        matrices = cache.matrices[time_index]
+        previous_matrices = cache.matrices[time_index - 1]
+
+        collider_matrix_columns = [cache.matrix_index[key] for key in self.colliders.matrix_keys()]
+        collider_value_columns = [cache.value_index[key] for key in self.colliders.value_keys()]
+
+        collider_differences = np.abs(matrices[collider_matrix_columns] - previous_matrices[collider_matrix_columns])
+        collider_differences[:, 3] /= bone_lengths.min()
+
+        if np.any(collider_differences > tolerance) or np.any(np.abs(cache.values[time_index, collider_value_columns] - cache.values[time_index - 1, collider_value_columns]) > tolerance):
+            return np.ones(len(store), dtype=bool)
+
+        moving_list = store.settled_step_count < kSleepFrames * (step_sub_div or self.sub_div)
+
+        for rows, columns in zip(self.level_rows, level_columns):
+            # sampled matrices the bones read, translations in bone lengths
+            column_list = np.stack([columns['driver'], columns['name'], columns['child'], columns['grand_child'], columns['proxy']], axis=1)
+            differences = np.abs(matrices[column_list] - previous_matrices[column_list])
+            differences[:, :, 3] /= bone_lengths[rows, None, None]
+
+            # parent bones read the driver, the others have no grand child column
+            differences[store.grand_parent_rows[rows] >= 0, 0] = 0.0
+            differences[store.child_rows[rows] < 0, 3] = 0.0
+
+            moving_list[rows] |= differences.max(axis=(1, 2, 3)) > tolerance
+
+        # wind offsets at the tips and their change since the previous step, in bone lengths
+        # a chain held still against a steady wind can be in an unstable pose, it isn't left asleep
+        if len(self.wind):
+            wind_offsets = self.wind.snapshot(cache, time_index).offsets(store.child_position)
+            previous_wind_offsets = self.wind.snapshot(cache, time_index - 1).offsets(store.child_position)
+
+            moving_list |= np.linalg.norm(wind_offsets, axis=-1) / bone_lengths > tolerance
+            moving_list |= np.linalg.norm(wind_offsets - previous_wind_offsets, axis=-1) / bone_lengths > tolerance
+
+        # every bone of a moving chain is solved
+        return (np.bincount(store.chain, weights=moving_list, minlength=store.chain.max() + 1) > 0)[store.chain]
+
+    def hold_level(self, cache, curve_cache, time_index, rows, columns):
+        # sleeping bones keep the values of their last solved step
+        store = self.store
+
+        curve_cache.values[time_index, columns['rotation']] = store.rotation[rows]
+
+        is_extended = columns['translate_x'] >= 0
+        translate_x_list = store.child_translate_x[rows[is_extended]]
+        curve_cache.values[time_index, columns['translate_x'][is_extended]] = np.where(
+            np.isnan(translate_x_list), cache.matrices[time_index, columns['child'][is_extended], 3, 0], translate_x_list)
+
+    def aim_by_ratio(self, rows, level_spring, parent_pos_list, new_child_pos_list, child_pos_corrected_list, proxy_up_vector_list, parent_matrix_list, step_sub_div=None):
+        # Compute the aim rotation of a group of independent bones in one solver call
+        # replace the aim constraint evaluation, return local rotate values
+        # step_sub_div is the sub division of an adaptive step
+        store = self.store
+        step_sub_div = step_sub_div or self.sub_div
+
+        ratio = step_ratio(level_spring['ratio'], self.sub_div, step_sub_div)
+        twist_ratio = step_ratio(level_spring['twist_ratio'], self.sub_div, step_sub_div)
+        tension = tension_factor(level_spring['tension'], step_sub_div)
+
+        if self.mode == kVerletMode:
+            # child positions are already solved, aim straight at them
+            ratio = np.ones(len(rows))
+            twist_ratio = substep_ratio(level_spring['twist_ratio'], step_sub_div)
+            tension = np.zeros(len(rows))
+
+        grand_child_pos_list = store.grand_child_position[rows]
+        has_grand_child_list = ~np.isnan(grand_child_pos_list[:, 0])
+
+        use_tension_list = store.has_child_collide[rows] & has_grand_child_list & (tension != 0)
+        grand_child_pos_list = np.where(has_grand_child_list[:, None], grand_child_pos_list, 0.0)
+
+        return solve_aim(
+            origins=parent_pos_list,
+            new_child_positions=new_child_pos_list,
+            child_positions_corrected=child_pos_corrected_list,
+            grand_child_positions=grand_child_pos_list,
+            use_tension=use_tension_list,
+            previous_up_vectors=store.up_vector[rows],
+            current_up_vectors=proxy_up_vector_list,
+            parent_matrices=parent_matrix_list,
+            joint_orients=store.joint_orient[rows],
+            rotate_axes=store.rotate_axis[rows],
+            rotate_orders=store.rotate_order[rows],
+            previous_eulers=store.rotation[rows],
+            ratio=ratio,
+            twist_ratio=twist_ratio,
+            tension=tension)
+
+    def detect_capsule_collisions(self, child_pos_list, new_child_pos_list, capsule_snapshot):
+        # Collision of a group of bones with all the capsules in array calls
+        # return has_collision, new_child_pos and child_pos_corrected arrays
+        child_pos_list = np.array(child_pos_list, dtype=float)
+        new_child_pos_list = np.array(new_child_pos_list, dtype=float)
+        child_pos_corrected_list = child_pos_list.copy()
+        has_collision_list = np.zeros(len(child_pos_list), dtype=bool)
+
+        if not capsule_snapshot:
+            return has_collision_list, new_child_pos_list, child_pos_corrected_list
+
+        # only bones close enough to a capsule, from the broad phase grid
+        bone_index, capsule_index = capsule_snapshot.candidate_pairs(new_child_pos_list, child_pos_list)
+        candidate_list = np.zeros(len(child_pos_list), dtype=bool)
+        candidate_list[bone_index] = True
+
+        if not candidate_list.any():
+            return has_collision_list, new_child_pos_list, child_pos_corrected_list
+
+        # pairs of the candidate bones only
+        pairs = (np.cumsum(candidate_list)[bone_index] - 1, capsule_index)
+
+        child_pos = child_pos_list[candidate_list]
+        new_child_pos = new_child_pos_list[candidate_list]
+        child_pos_corrected = child_pos_corrected_list[candidate_list]
+
+        # check collision from previous pos to cur pos
+        hit_pre, col_pre, _ = capsule_snapshot.check_collision(new_child_pos, child_pos, True, pairs)
+
+        # check collision from cur pos to previous pos
+        hit_cur, col_cur, _ = capsule_snapshot.check_collision(new_child_pos, child_pos, False, pairs)
+
+        both_hit = (hit_pre & hit_cur)[:, None]
+
+        # move cur child pose to closest out point if both pre and cur pos are already inside of col body
+        mid_point = (child_pos + new_child_pos) / 2
+        closest_col = np.where((springMath.distance_array(col_pre, mid_point) < springMath.distance_array(col_cur, mid_point))[:, None], col_pre, col_cur)
+
+        new_child_pos = np.where((hit_pre & ~hit_cur)[:, None], col_pre, np.where(both_hit, closest_col, new_child_pos))
+        child_pos_corrected = np.where((hit_cur & ~hit_pre)[:, None], col_cur, child_pos_corrected)
+
+        if self.is_fast_move:
+            child_pos_corrected = np.where(both_hit, new_child_pos, child_pos_corrected)
+
+        new_child_pos_list[candidate_list] = new_child_pos
+        child_pos_corrected_list[candidate_list] = child_pos_corrected
+        has_collision_list[candidate_list] = hit_pre | hit_cur
+
+        return has_collision_list, new_child_pos_list, child_pos_corrected_list
+
+    def detect_plane_collisions(self, grand_parent_plane_index_list, parent_pos_list, new_child_pos_list, plane_snapshot):
+        # Collision of a group of bones with all the planes and the floor in array calls
+        # return hit plane index (-1 if none) and new_child_pos arrays
+        new_child_pos_list = np.array(new_child_pos_list, dtype=float)
+        plane_hit_index_list = np.full(len(new_child_pos_list), -1)
+
+        if not plane_snapshot:
+            return plane_hit_index_list, new_child_pos_list
+
+        plane_hit_index_list, _ = plane_snapshot.check_collision(parent_pos_list, new_child_pos_list)
+
+        # keep the chain on the plane its parent hit
+        plane_hit_index_list = np.where(plane_hit_index_list >= 0, plane_hit_index_list, grand_parent_plane_index_list)
+
+        has_hit_plane_list = plane_hit_index_list >= 0
+        new_child_pos_list[has_hit_plane_list] = plane_snapshot.project(new_child_pos_list[has_hit_plane_list], plane_hit_index_list[has_hit_plane_list])
+
+        return plane_hit_index_list, new_child_pos_list
+
+    def solve_positions(self, rows, level_spring, parent_pos_list, goal_pos_list, child_length_list, grand_parent_plane_index_list, capsule_snapshot, plane_snapshot,
+                        step_sub_div=None):
+        # Verlet integration of the child positions of a group of bones toward their animated (goal) positions
+        # then iterations of bone length and collision projections, parent bones are already solved
+        # return has_collision, plane hit index (-1 if none) and new child position arrays
+        store = self.store
+        step_sub_div = step_sub_div or self.sub_div
+
+        child_pos_list = store.child_position[rows]
+        velocity_list = child_pos_list - store.previous_child_position[rows]
+
+        # ratio and inertia are per frame, the motion doesn't depend on the sub division
+        stiffness, damping = verlet_coefficients(level_spring['ratio'], level_spring['inertia'], step_sub_div)
+
+        new_child_pos_list = child_pos_list + velocity_list * damping[:, None]
+        new_child_pos_list = new_child_pos_list + (np.asarray(goal_pos_list, dtype=float) - new_child_pos_list) * stiffness[:, None]
+
+        has_collision_list = np.zeros(len(rows), dtype=bool)
+        plane_hit_index_list = np.full(len(rows), -1)
+
+        # colliders are projected last, a bone never ends a step inside of one
+        # bones no collider moved are at their length already, next iterations skip them
+        active_index = np.arange(len(rows))
+
+        for _ in range(max(int(self.iterations), 1)):
+            if not len(active_index):
+                break
+
+            active_pos_list = length_constraints(parent_pos_list[active_index], new_child_pos_list[active_index], child_length_list[active_index])
+
+            has_hit_list, active_pos_list, _ = self.detect_capsule_collisions(child_pos_list[active_index], active_pos_list, capsule_snapshot)
+            plane_hit_list, active_pos_list = self.detect_plane_collisions(grand_parent_plane_index_list[active_index], parent_pos_list[active_index], active_pos_list, plane_snapshot)
+
+            plane_hit_index_list[active_index] = plane_hit_list
+            has_collision_list[active_index] |= has_hit_list
+
+            # bones out of the colliders, or they don't move anymore
+            moved_list = np.linalg.norm(active_pos_list - new_child_pos_list[active_index], axis=-1) > kConstraintTolerance * child_length_list[active_index]
+            new_child_pos_list[active_index] = active_pos_list
+            active_index = active_index[moved_list & (has_hit_list | (plane_hit_list >= 0))]
+
+        return has_collision_list, plane_hit_index_list, new_child_pos_list
+
+    def solve_level(self, cache, curve_cache, time_index, rows, columns, level_spring, capsule_snapshot, plane_snapshot, wind_snapshot, step_sub_div=None):
+        # Solve one step for a group of independent bones (same depth in their chains)
+        # bones are store rows, every scene value comes from their sample cache columns
+        # level_spring holds the bones parameters, step_sub_div the sub division of an adaptive step
+        store = self.store
+        step_sub_div = step_sub_div or self.sub_div
+        matrices = cache.matrices[time_index]
+
+        grand_parent_rows = store.grand_parent_rows[rows]
+        has_grand_parent_list = grand_parent_rows >= 0
+        grand_parent_rows = grand_parent_rows[has_grand_parent_list]
+
+        with self.profiler.phase('pose'):
+            # parent bone already solved on this step, or sampled driver animation
+            parent_matrix_list = matrices[columns['driver']]
+            parent_matrix_list[has_grand_parent_list] = store.world_matrix[grand_parent_rows]
+
+            # bone position doesn't depend on its own rotation, the parent bone extend moves it
+            parent_translate_x_list = np.full(len(rows), np.nan)
+            parent_translate_x_list[has_grand_parent_list] = store.child_translate_x[grand_parent_rows]
+
+            translation_list = extended_translations(matrices[columns['name'], 3, :3], parent_translate_x_list)
+            parent_pos_list = transform_points(translation_list, parent_matrix_list)
+
+            # child proxies follow the bone parent
+            proxy_matrix_list = np.matmul(matrices[columns['proxy']], parent_matrix_list)
+
+            new_child_pos_list = proxy_matrix_list[:, 3, :3]
+
+        is_verlet = self.mode == kVerletMode
+
+        # Apply inertia, verlet integration keeps the momentum itself
+        if not is_verlet:
+            with self.profiler.phase('inertia'):
+                new_child_pos_list = new_child_pos_list + inertia_offsets(
+                    new_child_pos_list,
+                    store.child_position[rows],
+                    store.previous_child_position[rows],
+                    step_ratio(level_spring['ratio'], self.sub_div, step_sub_div),
+                    level_spring['inertia'],
+                    step_sub_div,
+                    self.sub_div)
+
+        # apply wind, turbulence depends on the bone positions
+        if wind_snapshot:
+            with self.profiler.phase('wind'):
+                new_child_pos_list = new_child_pos_list + wind_snapshot.offsets(new_child_pos_list)
+
+        grand_parent_plane_index_list = np.full(len(rows), -1)
+        grand_parent_plane_index_list[has_grand_parent_list] = store.plane_collide_index[grand_parent_rows]
+
+        if is_verlet:
+            with self.profiler.phase('verlet'):
+                # animated length, extended bones stretch to the integrated position as much as extend
+                extend = level_spring['extend']
+                child_length_list = np.linalg.norm(proxy_matrix_list[:, 3, :3] - parent_pos_list, axis=-1)
+
+                if np.any(extend != 0.0):
+                    stretched_length_list = np.linalg.norm(new_child_pos_list - parent_pos_list, axis=-1)
+                    child_length_list = np.where(extend != 0.0, extended_lengths(store.bone_length[rows], stretched_length_list, extend), child_length_list)
+
+                has_collision_list, plane_hit_index_list, new_child_pos_list = self.solve_positions(
+                    rows, level_spring, parent_pos_list, new_child_pos_list, child_length_list, grand_parent_plane_index_list, capsule_snapshot, plane_snapshot,
+                    step_sub_div)
+
+                # previous position of the next step velocity
+                child_pos_corrected_list = store.child_position[rows]
+        else:
+            # detect collision, all the bones against all the capsules
+            with self.profiler.phase('capsule collision'):
+                has_collision_list, new_child_pos_list, child_pos_corrected_list = self.detect_capsule_collisions(store.child_position[rows], new_child_pos_list, capsule_snapshot)
+
+            # detect plane collision, all the bones against all the planes
+            with self.profiler.phase('plane collision'):
+                plane_hit_index_list, new_child_pos_list = self.detect_plane_collisions(grand_parent_plane_index_list, parent_pos_list, new_child_pos_list, plane_snapshot)
+
+        # apply aim computation to do actual rotation, on the whole level at once
+        with self.profiler.phase('aim'):
+            rotation_list = self.aim_by_ratio(rows, level_spring, parent_pos_list, new_child_pos_list, child_pos_corrected_list, proxy_matrix_list[:, 1, :3], parent_matrix_list,
+                                              step_sub_div)
+
+            local_matrix_list = compose_local_matrices(
+                translation_list,
+                rotation_list,
+                store.rotate_order[rows],
+                store.scale[rows],
+                store.rotate_axis[rows],
+                store.joint_orient[rows])
+
+            world_matrix_list = np.matmul(local_matrix_list, parent_matrix_list)
+
+            # store the values of the step, keys are written once at the end
+            store.rotation[rows] = rotation_list
+            store.world_matrix[rows] = world_matrix_list
+            curve_cache.values[time_index, columns['rotation']] = rotation_list
+
+        # Extend bone if needed (update child translation)
+        with self.profiler.phase('extend'):
+            extend = level_spring['extend']
+            is_extended = extend != 0.0
+
+            if np.any(is_extended):
+                if is_verlet:
+                    # length the positions were constrained to
+                    x3 = child_length_list[is_extended]
+                else:
+                    # get length between bone pos and child pos
+                    x2 = np.linalg.norm(child_pos_corrected_list[is_extended] - world_matrix_list[is_extended, 3, :3], axis=-1)
+                    x3 = extended_lengths(store.bone_length[rows[is_extended]], x2, extend[is_extended])
+
+                store.child_translate_x[rows[is_extended]] = x3
+                curve_cache.values[time_index, columns['translate_x'][is_extended]] = x3
+
+        with self.profiler.phase('update'):
+            # Update current transforms with the new values
+            child_translation_list = extended_translations(matrices[columns['child'], 3, :3], store.child_translate_x[rows])
+            child_pos_list = transform_points(child_translation_list, world_matrix_list)
+
+            # child bone is not solved yet on this step, keep its previous rotation
+            child_rows = store.child_rows[rows]
+            has_child_bone_list = child_rows >= 0
+            child_rows = child_rows[has_child_bone_list]
+
+            grand_child_pos_list = np.full((len(rows), 3), np.nan)
+
+            if len(child_rows):
+                child_matrix_list = np.matmul(compose_local_matrices(
+                    child_translation_list[has_child_bone_list],
+                    store.rotation[child_rows],
+                    store.rotate_order[child_rows],
+                    store.scale[child_rows],
+                    store.rotate_axis[child_rows],
+                    store.joint_orient[child_rows]), world_matrix_list[has_child_bone_list])
+
+                grand_child_translation_list = extended_translations(matrices[columns['grand_child'][has_child_bone_list], 3, :3], store.child_translate_x[child_rows])
+                grand_child_pos_list[has_child_bone_list] = transform_points(grand_child_translation_list, child_matrix_list)
+
+            store.child_position[rows] = child_pos_list
+            store.grand_child_position[rows] = grand_child_pos_list
+            store.previous_child_position[rows] = child_pos_corrected_list
+            store.up_vector[rows] = world_matrix_list[:, 1, :3]
+            store.has_child_collide[rows] = has_collision_list
+            store.plane_collide_index[rows] = plane_hit_index_list
+
+            # Update the grand parent has_child_collide value
+            store.has_child_collide[grand_parent_rows] = has_collision_list[has_grand_parent_list]
+
+
+def _solve_partition(job):
+    # worker side of solve_parallel, return the solved curves and checkpoint states of the partition
+    # a partition resumed from a state and its curve values only solves the remaining steps
+    solver, cache, time_index_list, state, curve_values, checkpoint_position_set = job
+
+    curve_cache = springCache.CurveCache(cache.times, solver.get_curve_keys())
+    counters = springCollision.CollisionCounters()
+    state_dict = {}
+
+    if state is None:
+        solver.start(cache, curve_cache)
+    else:
+        solver.set_state(state)
+        curve_cache.values[:] = curve_values
+
+    def checkpoint(position):
+        if position in checkpoint_position_set:
+            state_dict[position] = solver.get_state()
+
+    solver.solve(cache, curve_cache, time_index_list, counters, checkpoint_callback=checkpoint)
+
+    return curve_cache.keys, curve_cache.values, solver.first_cycle_values, counters, solver.profiler, list(solver.bones), state_dict
+
+
+def create_pool(worker_count):
+    # In a Maya GUI session workers must start mayapy, not a new Maya
+    executable = os.path.basename(sys.executable).lower()
+
+    if executable.startswith('maya') and not executable.startswith('mayapy'):
+        multiprocessing.set_executable(os.path.join(os.path.dirname(sys.executable), 'mayapy' + ('.exe' if os.name == 'nt' else '')))
+
+    return multiprocessing.Pool(worker_count)
+
+
+def solve_parallel(solver, cache, curve_cache, time_index_list, worker_count, counters=None, is_interrupted=None, partition_callback=None,
+                   state=None, checkpoint_positions=(), checkpoint_callback=None):
+    # Solve chain partitions in a pool of processes, then merge their curves
+    # each chain is solved exactly as in the serial solve, so results are identical
+    # state is a solver state to resume from with the values of curve_cache, checkpoint_callback gets the merged state
+    # of each checkpoint position
+    partition_list = solver.partition(worker_count)
+    time_index_list = list(time_index_list)
+    checkpoint_position_set = set(checkpoint_positions)
+
+    # rows of the bones in the solver state
+    bone_row_dict = dict((name, row) for row, name in enumerate(solver.bones))
+
+    job_list = [(partition,
+                 cache.subset(partition.get_sampled_matrix_keys(), partition.get_sampled_value_keys()),
+                 time_index_list,
+                 None if state is None else OrderedDict((field, values[[bone_row_dict[name] for name in partition.bones]]) for field, values in state.items()),
+                 None if state is None else curve_cache.values[:, [curve_cache.key_index[key] for key in partition.get_curve_keys()]],
+                 checkpoint_position_set)
+                for partition in partition_list]
+
+    # checkpoint position: [merged state, number of partitions merged]
+    merged_state_dict = {}
+
+    # curve values of the partitions when their loop started its first cycle
+    first_cycle_cache = None
+
+    pool = create_pool(min(worker_count, len(job_list)))
+
+    try:
+        for done_count, (curve_keys, curve_values, first_cycle_values, partition_counters, partition_profiler, bone_names, state_dict) in enumerate(pool.imap_unordered(_solve_partition, job_list)):
+            curve_cache.set_curves(curve_keys, curve_values)
+
+            if first_cycle_values is not None:
+                first_cycle_cache = first_cycle_cache or springCache.CurveCache(curve_cache.times, curve_cache.keys)
+                first_cycle_cache.set_curves(curve_keys, first_cycle_values)
+
+            row_list = [bone_row_dict[name] for name in bone_names]
+            for position, partition_state in state_dict.items():
+                merged_state = merged_state_dict.setdefault(position, [solver.get_state(), 0])
+
+                for field, values in partition_state.items():
+                    merged_state[0][field][row_list] = values
+
+                merged_state[1] += 1
+
+            if counters is not None:
+                counters.merge(partition_counters)
+
+            solver.profiler.merge(partition_profiler, is_worker=True)
+
+            if partition_callback:
+                partition_callback(done_count + 1, len(job_list))
+
+            if is_interrupted and is_interrupted():
+                pool.terminate()
+                break
+    finally:
+        pool.close()
+        pool.join()
+
+    if first_cycle_cache is not None:
+        solver.first_cycle_values = first_cycle_cache.values
+
+    # solver states are complete once every partition solved the step
+    if checkpoint_callback:
+        for position in sorted(merged_state_dict):
+            merged_state, merged_count = merged_state_dict[position]
+
+            if merged_count == len(job_list):
+                checkpoint_callback(position, merged_state)
@@ -0,0 +1,141 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Wind field of the spring calculation
+# Emitters are sampled once per step into a WindSnapshot, offsets of all the bones
+# are then evaluated in array calls, whatever the number of bones
+#
+# Each emitter blows along its X axis with a force oscillating between MinForce and
+# MaxForce. Turbulence adds a seeded, smooth, spatially varying offset on top of it
+#
+#####################################################################################
+
+import math
+
+import numpy as np
+
+# emitter attributes, turbulence ones are optional
+kWindAttributes = ['MaxForce', 'MinForce', 'Frequency']
+kTurbulenceAttributes = ['Turbulence', 'TurbulenceScale', 'TurbulenceSeed']
+
+# sine waves summed by the turbulence, each one twice the spatial frequency of the previous one
+kTurbulenceOctaves = 4
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=float)
+    length = np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+    return np.where(length > 1e-8, vectors / np.maximum(length, 1e-8), 0.0)
+
+
+def turbulence_waves(seed):
+    # wave directions, offset axes, phases and speeds of a seed, always the same
+    random = np.random.RandomState(int(seed) % (2 ** 32))
+
+    wave_directions = normalize(random.normal(size=(kTurbulenceOctaves, 3)))
+    offset_axes = normalize(random.normal(size=(kTurbulenceOctaves, 3)))
+    phases = random.uniform(0.0, 2 * np.pi, kTurbulenceOctaves)
+    speeds = random.uniform(0.5, 1.5, kTurbulenceOctaves)
+
+    return wave_directions, offset_axes, phases, speeds
+
+
+class WindSnapshot:
+    # Emitters of one step, W emitters in arrays
+
+    def __init__(self, time, directions, positions, max_forces, min_forces, frequencies,
+                 turbulences=None, turbulence_scales=None, turbulence_seeds=None, scene_query_count=0):
+        self.time = time
+
+        self.directions = np.asarray(directions, dtype=float).reshape(-1, 3)
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        self.max_forces = np.asarray(max_forces, dtype=float)
+        self.min_forces = np.asarray(min_forces, dtype=float)
+        self.frequencies = np.asarray(frequencies, dtype=float)
+
+        emitter_count = len(self.directions)
+        self.turbulences = np.zeros(emitter_count) if turbulences is None else np.asarray(turbulences, dtype=float)
+        self.turbulence_scales = np.zeros(emitter_count) if turbulence_scales is None else np.asarray(turbulence_scales, dtype=float)
+        self.turbulence_seeds = np.zeros(emitter_count) if turbulence_seeds is None else np.asarray(turbulence_seeds, dtype=float)
+
+        self.scene_query_count = scene_query_count
+
+        # the oscillating force doesn't depend on the bones, summed once
+        self.offset = np.zeros(3)
+        for direction, max_force, min_force, frequency in zip(self.directions, self.max_forces, self.min_forces, self.frequencies):
+            mid_force = (max_force + min_force) / 2
+            self.offset = self.offset + direction * (math.sin(time * frequency) * (max_force - min_force) + mid_force)
+
+        # waves of the turbulent emitters, the levels of a step share them
+        self.turbulence_waves = [(emitter_index,) + turbulence_waves(self.turbulence_seeds[emitter_index])
+                                 for emitter_index in np.flatnonzero(self.turbulences != 0.0)]
+
+    def __len__(self):
+        return len(self.directions)
+
+    def offsets(self, positions):
+        # (N, 3) offsets of the bones at world positions
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        offsets = np.tile(self.offset, (len(positions), 1))
+
+        for emitter_index, wave_directions, offset_axes, phases, speeds in self.turbulence_waves:
+            # field moves with the emitter, finer octaves are weaker
+            octave_scales = self.turbulence_scales[emitter_index] * 2.0 ** np.arange(kTurbulenceOctaves)
+            octave_weights = 0.5 ** np.arange(kTurbulenceOctaves)
+
+            angles = np.dot(positions - self.positions[emitter_index], wave_directions.T) * octave_scales
+            angles += self.time * self.frequencies[emitter_index] * speeds + phases
+
+            waves = np.sin(angles) * (octave_weights / octave_weights.sum())
+            offsets += np.dot(waves, offset_axes) * self.turbulences[emitter_index]
+
+        return offsets
+
+
+class WindField:
+    # Names of the scene wind emitters, turbulent emitters have the turbulence attributes
+
+    def __init__(self, emitter_names=(), turbulent_names=()):
+        self.emitter_names = list(emitter_names)
+        self.turbulent_names = [name for name in turbulent_names if name in self.emitter_names]
+
+    def __len__(self):
+        return len(self.emitter_names)
+
+    def matrix_keys(self):
+        return [(emitter_name, 'worldMatrix') for emitter_name in self.emitter_names]
+
+    def value_keys(self):
+        value_key_list = [(emitter_name, attribute) for emitter_name in self.emitter_names for attribute in kWindAttributes]
+        value_key_list += [(emitter_name, attribute) for emitter_name in self.turbulent_names for attribute in kTurbulenceAttributes]
+
+        return value_key_list
+
+    def snapshot(self, cache, time_index):
+        # emitters of one step, None without emitter
+        if not self.emitter_names:
+            return None
+
+        matrices = np.array([cache.matrix(emitter_name, 'worldMatrix', time_index) for emitter_name in self.emitter_names])
+        values = np.array([[cache.value(emitter_name, attribute, time_index) for attribute in kWindAttributes] for emitter_name in self.emitter_names])
+
+        turbulence_values = np.zeros((len(self.emitter_names), len(kTurbulenceAttributes)))
+        for emitter_name in self.turbulent_names:
+            turbulence_values[self.emitter_names.index(emitter_name)] = [cache.value(emitter_name, attribute, time_index) for attribute in kTurbulenceAttributes]
+
+        return WindSnapshot(
+            cache.times[time_index],
+            normalize(matrices[:, 0, :3]),
+            matrices[:, 3, :3],
+            values[:, 0],
+            values[:, 1],
+            values[:, 2],
+            turbulence_values[:, 0],
+            turbulence_values[:, 1],
+            turbulence_values[:, 2],
+            scene_query_count=len(self.matrix_keys()) + len(self.value_keys()))
@@ -0,0 +1,5 @@
+# modules of the springmagic folder import each other by name, as in Maya
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
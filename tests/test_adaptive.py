@@ -0,0 +1,128 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Adaptive sub division, each frame solved in 1 to sub div steps from the bone motion and the colliders nearby
+# python -m pytest tests
+#
+#####################################################################################
+
+import numpy as np
+
+import springBenchmark
+import springCollision
+import springScene
+import springSolver
+
+kMaxSubDiv = 8
+kFrameCount = 12
+kMoveFrame = 6
+
+
+def test_adaptive_step_times():
+    frame_sub_div_list = [1, 3, 1, 8, 2]
+    time_list, time_index_list, step_sub_div_list = springScene.adaptive_step_times(10, 15, frame_sub_div_list)
+
+    # the start frame, then the steps of each frame ending on it
+    assert len(time_list) == 1 + sum(frame_sub_div_list)
+    assert time_list[0] == 10.0
+    assert np.all(np.diff(time_list) > 0.0)
+    assert [time for time in time_list if time == round(time)] == [10.0, 11.0, 12.0, 13.0, 14.0, 15.0]
+    assert time_index_list == list(range(1, len(time_list)))
+    assert step_sub_div_list == [1, 1, 3, 3, 3, 1] + [8] * 8 + [2, 2]
+
+    # a loop solves the same steps on each cycle
+    _, loop_time_index_list, _ = springScene.adaptive_step_times(10, 15, frame_sub_div_list, is_loop=True)
+    assert loop_time_index_list == time_index_list + list(range(len(time_list))) * springSolver.kMaxLoopCycles
+
+
+def makeScene(capsule_position=None):
+    # chain of 3 bones 2 long under a driver holding its pose but on kMoveFrame, a capsule across the chain if given
+    scene = springScene.MemoryScene()
+    key_times = np.arange(kFrameCount + 1, dtype=float)
+
+    scene.add_transform('driver')
+    scene.set_keys('driver', 'translateY', key_times, np.where(key_times < kMoveFrame, 0.0, 4.0))
+
+    parent = 'driver'
+    for index in range(4):
+        scene.add_transform('joint{0}'.format(index), parent, translate=(2.0 if index else 0.0, 0.0, 0.0), joint_orient=(0.0, 0.0, 0.0))
+        parent = 'joint{0}'.format(index)
+
+    capsule_names = []
+    if capsule_position is not None:
+        capsule_names = ['capsule']
+        scene.add_transform('capsule', scale=(1.0, 1.0, 0.5))
+        scene.add_transform('capsule_a', translate=np.add(capsule_position, (0.0, 0.0, -5.0)))
+        scene.add_transform('capsule_b', translate=np.add(capsule_position, (0.0, 0.0, 5.0)))
+
+    colliders = springCollision.ColliderSet(capsule_names, [['capsule_a', 'capsule_b']] * len(capsule_names), [], [])
+
+    return scene, ['joint{0}'.format(index) for index in range(4)], colliders
+
+
+def frameSubDivs(scene, node_name_list, colliders, spring):
+    bone_list = springScene.create_bones(scene, node_name_list, 0)
+    solver = springSolver.SpringSolver(spring, bone_list, colliders)
+
+    frame_list, _ = springScene.step_times(0, kFrameCount)
+    frame_sub_div_list = solver.frame_sub_divs(scene.sample(frame_list, solver.get_sampled_matrix_keys(), solver.get_sampled_value_keys()), kMaxSubDiv)
+    scene.delete_proxies()
+
+    return frame_sub_div_list
+
+
+def test_idle_frames():
+    # frames before any motion take one step, none takes more than the sub div
+    scene, node_name_list, colliders = makeScene()
+    frame_sub_div_list = frameSubDivs(scene, node_name_list, colliders, springSolver.Spring(ratio=0.5))
+
+    assert len(frame_sub_div_list) == kFrameCount
+    assert frame_sub_div_list[:kMoveFrame - 1] == [1] * (kMoveFrame - 1)
+    assert frame_sub_div_list[kMoveFrame - 1] > 1
+    assert max(frame_sub_div_list) <= kMaxSubDiv
+
+    # held rig of the benchmarks, the held frames the tips caught up on take one step
+    scene, node_name_list, colliders, wind = springBenchmark.makeRig(4, (3, 6), 40, hold_ratio=0.5)
+    spring = springSolver.Spring(ratio=0.6)
+    bone_list = springScene.create_bones(scene, node_name_list, 0)
+    solver = springSolver.SpringSolver(spring, bone_list, colliders, wind, kMaxSubDiv)
+
+    time_list, time_index_list, cache = springScene.sample_adaptive(scene, solver, 0, 40, kMaxSubDiv)
+    scene.delete_proxies()
+
+    assert max(solver.step_sub_divs) <= kMaxSubDiv
+    assert solver.step_sub_divs[-1] == 1
+    assert len(time_index_list) == len(time_list) - 1 <= 40 * kMaxSubDiv
+
+
+def test_adaptive_step_count():
+    # the calculation solves the steps picked, no more
+    scene, node_name_list, colliders, wind = springBenchmark.makeRig(4, (3, 6), 40, capsule_count=10, hold_ratio=0.5)
+    counters = springCollision.CollisionCounters()
+
+    solver, curve_cache = springScene.solve_chains(scene, node_name_list, springSolver.Spring(ratio=0.6), 0, 40, kMaxSubDiv, colliders=colliders,
+                                                   counters=counters, is_write=False, is_adaptive=True)
+
+    assert counters.step_count == len(solver.step_sub_divs) - 1 < 40 * kMaxSubDiv
+    assert not np.isnan(curve_cache.values).any()
+
+
+def test_collider_sub_div():
+    # the fast frame of a chain next to a capsule takes the most steps, the same frame away from it fewer
+    spring = springSolver.Spring(ratio=0.5)
+
+    scene, node_name_list, colliders = makeScene()
+    free_sub_div_list = frameSubDivs(scene, node_name_list, colliders, spring)
+
+    scene, node_name_list, colliders = makeScene(capsule_position=(4.0, 2.0, 0.0))
+    collider_sub_div_list = frameSubDivs(scene, node_name_list, colliders, spring)
+
+    assert free_sub_div_list[kMoveFrame - 1] < kMaxSubDiv
+    assert collider_sub_div_list[kMoveFrame - 1] == kMaxSubDiv
+
+    # far from the capsule before the move
+    assert collider_sub_div_list[:kMoveFrame - 1] == [1] * (kMoveFrame - 1)
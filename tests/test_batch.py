@@ -0,0 +1,114 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Batch runner on shots exported as MemoryScene json, no Maya needed
+# python -m pytest tests
+#
+#####################################################################################
+
+import json
+import os
+import subprocess
+import sys
+
+from collections import OrderedDict
+
+import springBatch
+import springBenchmark
+
+kFrameCount = 20
+
+
+def makeShot(directory, name, **settings):
+    # small rig saved as shot data, return the shot of the config
+    scene, node_name_list, colliders, wind = springBenchmark.makeRig(2, 4, kFrameCount, capsule_count=2, is_cyclic=True)
+
+    data_path = os.path.join(str(directory), name + '.json')
+    springBatch.saveShotData(data_path, scene, colliders, wind)
+
+    return OrderedDict([('name', name), ('data', data_path), ('chains', node_name_list), ('startFrame', 0), ('endFrame', kFrameCount)] +
+                       list(settings.items()))
+
+
+def test_report_with_sleep_and_loop(tmpdir):
+    # counts of the sleep and loop steps are written to the json report
+    config = OrderedDict([('shots', [makeShot(tmpdir, 'sleep', sleepTolerance=1e-3), makeShot(tmpdir, 'loop', isLoop=True)])])
+    report_path = str(tmpdir.join('report.json'))
+
+    report_list = springBatch.runBatch(config, report_path=report_path)
+
+    assert [report['status'] for report in report_list] == ['ok', 'ok']
+
+    with open(report_path) as json_file:
+        assert json.load(json_file) == report_list
+
+
+def test_shot_settings_layers():
+    # shot values over config defaults over kShotDefaults, spring values merged key by key
+    defaults = {'spring': {'ratio': 0.3, 'tension': 0.2}, 'subDiv': 2.0, 'isLoop': True}
+    shot = {'name': 'shot010', 'spring': {'ratio': 0.7}, 'subDiv': 4.0}
+
+    settings = springBatch.shotSettings(shot, defaults)
+
+    assert settings['spring'] == dict(springBatch.kShotDefaults['spring'], ratio=0.7, tension=0.2)
+    assert settings['subDiv'] == 4.0
+    assert settings['isLoop'] is True
+    assert settings['solverMode'] == springBatch.kShotDefaults['solverMode']
+    assert settings['name'] == 'shot010'
+
+    assert springBatch.shotSettings({}) == springBatch.kShotDefaults
+
+
+def test_failed_shot(tmpdir):
+    # a shot that can't be loaded is reported, the next shots are still solved
+    missing_shot = OrderedDict([('name', 'missing'), ('data', str(tmpdir.join('missing.json'))), ('chains', []), ('startFrame', 0), ('endFrame', 10)])
+    config = OrderedDict([('shots', [missing_shot, makeShot(tmpdir, 'shot010')])])
+
+    report_list = springBatch.runBatch(config)
+
+    assert [report['status'] for report in report_list] == ['failed', 'ok']
+    assert report_list[0]['error'].startswith('Traceback')
+    assert 'missing.json' in report_list[0]['error']
+    assert report_list[1]['steps'] == kFrameCount
+
+    assert 'missing.json' in springBatch.summary(report_list)
+
+
+def test_report_round_trip(tmpdir):
+    # the report written with --report reads back as the reports returned
+    config = OrderedDict([('report', str(tmpdir.join('report.json'))), ('defaults', {'profile': True}),
+                          ('shots', [makeShot(tmpdir, 'shot010'), makeShot(tmpdir, 'shot020', subDiv=2.0)])])
+
+    report_list = springBatch.runBatch(config)
+
+    with open(config['report']) as json_file:
+        read_report_list = json.load(json_file, object_pairs_hook=OrderedDict)
+
+    assert read_report_list == report_list
+    assert [report['name'] for report in read_report_list] == ['shot010', 'shot020']
+    assert [list(report.keys())[:5] for report in read_report_list] == [['name', 'status', 'time', 'bones', 'steps']] * 2
+    assert springBatch.summary(read_report_list) == springBatch.summary(report_list)
+
+
+def test_command_line(tmpdir):
+    # relative shot paths are relative to the config, the exit code tells if a shot failed
+    shot = makeShot(tmpdir, 'shot010')
+    shot['data'] = os.path.basename(shot['data'])
+
+    config_path = str(tmpdir.join('shots.json'))
+    report_path = str(tmpdir.join('report.json'))
+
+    with open(config_path, 'w') as json_file:
+        json.dump(OrderedDict([('shots', [shot])]), json_file)
+
+    batch_path = os.path.abspath(springBatch.__file__).replace('.pyc', '.py')
+    assert subprocess.call([sys.executable, batch_path, config_path, '--report', report_path]) == 0
+
+    with open(report_path) as json_file:
+        report_list = json.load(json_file)
+
+    assert [(report['name'], report['status'], report['steps']) for report in report_list] == [('shot010', 'ok', kFrameCount)]
@@ -0,0 +1,162 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Calculations resumed from the checkpoints of the previous one, through the Scene interface as in Maya:
+# the scene is sampled as keyed, the solved curves are written back as keys and read by the next calculation
+# python -m pytest tests
+#
+#####################################################################################
+
+import numpy as np
+
+import springBenchmark
+import springCheckpoint
+import springCollision
+import springScene
+import springSolver
+
+kFrameCount = 40
+kEditFrame = 25
+
+
+def solve(rig, checkpoints=None, sub_div=1.0, worker_count=1):
+    scene, node_name_list, colliders, wind = rig
+    counters = springCollision.CollisionCounters()
+
+    _, curve_cache = springScene.solve_chains(scene, node_name_list, springSolver.Spring(ratio=0.4, tension=0.3, extend=0.2, inertia=0.5), 0, kFrameCount,
+                                              sub_div, colliders=colliders, wind=wind, worker_count=worker_count, counters=counters,
+                                              checkpoints=checkpoints)
+
+    return curve_cache, counters
+
+
+def edit_driver(rig):
+    # new driver keys from kEditFrame on, the frames before it are unchanged
+    scene = rig[0]
+    key_times, key_values = scene.curves[('driver0', 'translateY')]
+    scene.set_keys('driver0', 'translateY', key_times, np.where(key_times >= kEditFrame, key_values + 5.0, key_values))
+
+
+def keys(rig, curve_cache):
+    return dict((key, rig[0].curves[key]) for key in curve_cache.keys)
+
+
+def test_resume_after_edit():
+    rig = springBenchmark.makeRig(3, 6, kFrameCount, capsule_count=4)
+    checkpoints = springCheckpoint.SolveCheckpoints()
+
+    curve_cache, counters = solve(rig, checkpoints)
+    assert counters.step_count == kFrameCount
+
+    first_key_dict = keys(rig, curve_cache)
+
+    # nothing changed, the written keys are read back as solved and no step is solved again
+    _, counters = solve(rig, checkpoints)
+    assert counters.step_count == 0
+
+    edit_driver(rig)
+    curve_cache, counters = solve(rig, checkpoints)
+
+    # solved again from the last frame before the edit
+    assert counters.step_count == kFrameCount - kEditFrame + 1
+
+    # same keys as a calculation from the start on the edited rig
+    fresh_rig = springBenchmark.makeRig(3, 6, kFrameCount, capsule_count=4)
+    edit_driver(fresh_rig)
+    fresh_curve_cache, _ = solve(fresh_rig)
+
+    assert np.array_equal(curve_cache.values, fresh_curve_cache.values)
+
+    # keys before the resumed frames are the ones of the first calculation
+    for key, (key_times, key_values) in keys(rig, curve_cache).items():
+        first_key_times, first_key_values = first_key_dict[key]
+        kept = first_key_times < kEditFrame - 1
+
+        assert np.array_equal(key_times[:np.count_nonzero(kept)], first_key_times[kept])
+        assert np.array_equal(key_values[:np.count_nonzero(kept)], first_key_values[kept])
+
+
+def test_resume_mid_range():
+    # one driver key moved in the middle of the range, solved from the frame before it on subframes and in parallel,
+    # the resumed curves are the ones of a calculation from the start
+    edit_frame = kFrameCount // 2 + 3
+
+    for sub_div, worker_count in [(1.0, 1), (2.0, 1), (2.0, 2)]:
+        rig = springBenchmark.makeRig(3, 6, kFrameCount, capsule_count=4)
+        checkpoints = springCheckpoint.SolveCheckpoints()
+
+        _, counters = solve(rig, checkpoints, sub_div, worker_count)
+        full_step_count = counters.step_count
+
+        scene = rig[0]
+        key_times, key_values = scene.curves[('driver1', 'rotateZ')]
+        scene.set_keys('driver1', 'rotateZ', key_times, np.where(key_times == edit_frame, key_values + 20.0, key_values))
+
+        curve_cache, counters = solve(rig, checkpoints, sub_div, worker_count)
+
+        # the steps of the frames after the key before the edited one
+        assert counters.step_count == full_step_count - int(sub_div) * (edit_frame - 1)
+
+        fresh_rig = springBenchmark.makeRig(3, 6, kFrameCount, capsule_count=4)
+        fresh_scene = fresh_rig[0]
+        fresh_scene.set_keys('driver1', 'rotateZ', *scene.curves[('driver1', 'rotateZ')])
+        fresh_curve_cache, _ = solve(fresh_rig, None, sub_div, worker_count)
+
+        assert np.array_equal(curve_cache.values, fresh_curve_cache.values)
+
+
+def test_edited_solved_keys_start_over():
+    # keys of the solved bones edited by hand are no longer the solved curves, the changed frames are solved again
+    rig = springBenchmark.makeRig(2, 5, kFrameCount)
+    checkpoints = springCheckpoint.SolveCheckpoints()
+
+    curve_cache, _ = solve(rig, checkpoints)
+
+    scene = rig[0]
+    key_times, key_values = scene.curves[('chain0_joint2', 'rotateZ')]
+    scene.set_keys('chain0_joint2', 'rotateZ', key_times, np.where(key_times >= kEditFrame, key_values + 10.0, key_values))
+
+    _, counters = solve(rig, checkpoints)
+    assert 0 < counters.step_count <= kFrameCount - kEditFrame + 1
+
+
+def solve_loop(rig, checkpoints=None, step_count=None):
+    # loop calculation on cyclic drivers, interrupted after step_count steps if given
+    scene, node_name_list, colliders, wind = rig
+    counters = springCollision.CollisionCounters()
+
+    bone_list = springScene.create_bones(scene, node_name_list, 0)
+    solver = springSolver.SpringSolver(springSolver.Spring(ratio=0.2, tension=0.3, extend=0.2, inertia=0.5), bone_list, colliders, wind)
+    times, time_index_list = springScene.step_times(0, kFrameCount, is_loop=True)
+
+    def is_interrupted():
+        return step_count is not None and counters.step_count >= step_count
+
+    curve_cache = springScene.solve_scene(scene, solver, times, time_index_list, 0, kFrameCount, counters=counters, is_interrupted=is_interrupted,
+                                          checkpoints=checkpoints)
+    scene.delete_proxies()
+
+    return curve_cache, counters
+
+
+def test_resume_loop_first_pass():
+    # a loop interrupted in its first pass resumes from its last checkpoint, edited frames included,
+    # and solves its cycles as a calculation from the start
+    rig = springBenchmark.makeRig(3, 6, kFrameCount, capsule_count=4, is_cyclic=True)
+    checkpoints = springCheckpoint.SolveCheckpoints()
+
+    solve_loop(rig, checkpoints, step_count=kEditFrame + 5)
+    edit_driver(rig)
+
+    curve_cache, counters = solve_loop(rig, checkpoints)
+
+    fresh_rig = springBenchmark.makeRig(3, 6, kFrameCount, capsule_count=4, is_cyclic=True)
+    edit_driver(fresh_rig)
+    fresh_curve_cache, fresh_counters = solve_loop(fresh_rig)
+
+    assert counters.step_count == fresh_counters.step_count - (kEditFrame - 1)
+    assert np.array_equal(curve_cache.values, fresh_curve_cache.values)
@@ -0,0 +1,67 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Chains found from the full paths of the selected transforms, as read by ls -long in Maya
+# python -m pytest tests
+#
+#####################################################################################
+
+import springScene
+
+
+def makeScene(parent_list):
+    # MemoryScene of (node, parent) pairs, parents first
+    scene = springScene.MemoryScene()
+
+    for node, parent in parent_list:
+        scene.add_transform(node, parent, translate=(1.0, 0.0, 0.0))
+
+    return scene
+
+
+def test_nested_chains():
+    # selected transforms under a selected one are in its chain, parents first, even under unselected transforms
+    scene = makeScene([('rig', None), ('hair0', 'rig'), ('hair1', 'hair0'), ('ribbon', 'hair1'), ('bead0', 'ribbon'), ('bead1', 'bead0'),
+                       ('hair2', 'hair1'), ('tail0', 'rig'), ('tail1', 'tail0')])
+
+    assert springScene.find_chains(scene, ['bead1', 'hair2', 'hair0', 'tail1', 'bead0', 'hair1', 'tail0']) == [
+        ['hair0', 'hair1', 'hair2', 'bead0', 'bead1'], ['tail0', 'tail1']]
+
+    # an unselected transform between selected ones doesn't split their chain, under unselected ones only it's a chain of its own
+    assert springScene.find_chains(scene, ['hair0', 'hair1', 'bead0', 'bead1']) == [['hair0', 'hair1', 'bead0', 'bead1']]
+    assert springScene.find_chains(scene, ['bead0', 'bead1', 'tail0', 'tail1']) == [['bead0', 'bead1'], ['tail0', 'tail1']]
+
+
+def test_duplicate_names():
+    # a selected transform isn't the ancestor of a transform under another one of the same name
+    hierarchy_index = springScene.HierarchyIndex(['|rig|hair', '|rig|hair|hair_end', '|hair|tail', '|hair|tail|tail_end'])
+
+    assert not hierarchy_index.duplicate_names
+    assert hierarchy_index.top('|hair|tail|tail_end') == 'tail'
+    assert hierarchy_index.chains(is_root_driver=True) == [['hair', 'hair_end'], ['tail', 'tail_end']]
+
+    # selected transforms of the same name are reported
+    hierarchy_index = springScene.HierarchyIndex(['|rigA|joint1', '|rigA|joint1|joint2', '|rigB|joint1', '|rigB|joint1|joint2'])
+
+    assert hierarchy_index.duplicate_names == set(['joint1', 'joint2'])
+    assert hierarchy_index.parent('joint2') == 'joint1'
+
+
+def test_unselected_root_parent():
+    # a top transform under an unselected parent is solved, one without parent drives its chain
+    scene = makeScene([('driver', None), ('joint0', 'driver'), ('joint1', 'joint0'), ('joint2', 'joint1')])
+
+    assert springScene.find_chains(scene, ['joint0', 'joint1', 'joint2']) == [['joint0', 'joint1', 'joint2']]
+    assert springScene.find_chains(scene, ['driver', 'joint0', 'joint1', 'joint2']) == [['joint0', 'joint1', 'joint2']]
+    assert springScene.find_chains(scene, ['driver']) == []
+
+    # without is_root_driver, as for the controllers of a bake, the top transform stays in its chain
+    hierarchy_index = springScene.HierarchyIndex(scene.paths(['driver', 'joint0', 'joint1']))
+
+    assert hierarchy_index.chains() == [['driver', 'joint0', 'joint1']]
+    assert hierarchy_index.parent('driver') is None
+    assert hierarchy_index.parent('joint0') == 'driver'
@@ -0,0 +1,303 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Array kernels of the solver against the scalar functions they replace, on random inputs
+# scalar functions run on a small stand-in of pymel dt.Vector, no Maya needed
+# python -m pytest tests
+#
+#####################################################################################
+
+import math
+
+import numpy as np
+
+import springCollision
+import springMath
+import springSolver
+
+kCaseCount = 2000
+kTolerance = 1e-9
+
+
+class Vector(object):
+    # the part of pymel dt.Vector the scalar functions use
+
+    def __init__(self, *values):
+        self.values = np.array(values[0] if len(values) == 1 else values, dtype=float).reshape(3)
+
+    def __add__(self, other):
+        return Vector(self.values + other.values)
+
+    def __sub__(self, other):
+        return Vector(self.values - other.values)
+
+    def __mul__(self, scalar):
+        return Vector(self.values * scalar)
+
+    def __truediv__(self, scalar):
+        return Vector(self.values / scalar)
+
+    __div__ = __truediv__
+
+    def dot(self, other):
+        return float(np.dot(self.values, other.values))
+
+    def cross(self, other):
+        return Vector(np.cross(self.values, other.values))
+
+    def length(self):
+        return float(np.linalg.norm(self.values))
+
+    def normal(self):
+        length = self.length()
+        return Vector(self.values / length) if length > 0.0 else Vector(0.0, 0.0, 0.0)
+
+
+class Capsule(object):
+    # capsule node of checkCollision capsule lists
+
+    def __init__(self, index):
+        self.index = index
+
+    def name(self):
+        return 'capsule{0}'.format(self.index)
+
+
+def randomCapsules(random, capsule_count):
+    p = random.uniform(-10.0, 10.0, (capsule_count, 3))
+    q = p + random.normal(size=(capsule_count, 3)) * random.uniform(0.0, 6.0, (capsule_count, 1))
+    r = random.uniform(0.5, 3.0, capsule_count)
+
+    return p, q, r
+
+
+def randomSegments(random, segment_count, centers=None):
+    # short moves around the capsules or around centers, some of them inside
+    sa = random.uniform(-12.0, 12.0, (segment_count, 3)) if centers is None else centers + random.normal(size=(segment_count, 3)) * 2.5
+    sb = sa + random.normal(size=(segment_count, 3)) * random.uniform(0.0, 4.0, (segment_count, 1))
+
+    return sa, sb
+
+
+def assertSameHits(hit_list, point_list, hits, points):
+    hit_list = np.array(hit_list, dtype=bool)
+    assert np.array_equal(hit_list, hits)
+    assert np.allclose(np.array(point_list)[hit_list], points[hit_list], atol=kTolerance)
+
+
+def test_segment_capsule_kernels():
+    random = np.random.RandomState(0)
+    p, q, r = randomCapsules(random, kCaseCount)
+    sa, sb = randomSegments(random, kCaseCount, (p + q) / 2.0)
+
+    for scalar_function, array_function, arguments in [
+            (springMath.segment_sphere_isect, springMath.segment_sphere_isect_array, [sa, sb, p, r]),
+            (springMath.segment_cylinder_isect, springMath.segment_cylinder_isect_array, [sa, sb, p, q, r]),
+            (springMath.segment_capsule_isect, springMath.segment_capsule_isect_array, [sa, sb, p, q, r])]:
+        result_list = [scalar_function(*[Vector(value) if np.ndim(value) else value for value in case]) for case in zip(*arguments)]
+
+        hits, points = array_function(*arguments)[:2]
+        assertSameHits([result[0] for result in result_list],
+                       [result[1].values if result[0] else np.zeros(3) for result in result_list], hits, points)
+
+
+def test_pt_in_capsule():
+    random = np.random.RandomState(1)
+    pt = random.uniform(-12.0, 12.0, (kCaseCount, 3))
+    p, q, r = randomCapsules(random, kCaseCount)
+
+    inside_list = [springMath.pt_in_capsule(Vector(point), Vector(start), Vector(end), radius) for point, start, end, radius in zip(pt, p, q, r)]
+
+    assert np.array_equal(inside_list, springMath.pt_in_capsule_array(pt, p, q, r))
+
+
+def test_check_collision():
+    # closest hit of every bone against all the capsules
+    random = np.random.RandomState(2)
+    cur_pos, pre_pos = randomSegments(random, kCaseCount // 10)
+    p, q, r = randomCapsules(random, 20)
+
+    capsule_list = [[Capsule(index), Vector(p[index]), Vector(q[index]), r[index]] for index in range(len(r))]
+
+    for is_revert in [True, False]:
+        result_list = [springMath.checkCollision(Vector(cur), Vector(pre), capsule_list, is_revert) for cur, pre in zip(cur_pos, pre_pos)]
+
+        hits, points, capsule_index = springMath.check_collision_array(cur_pos, pre_pos, p, q, r, is_revert)
+
+        assertSameHits([result[0] is not None for result in result_list],
+                       [result[0].values if result[0] is not None else np.zeros(3) for result in result_list], hits, points)
+        assert all(result[1].index == index for result, index in zip(result_list, capsule_index) if result[1] is not None)
+
+
+def detectCollision(child_position, new_child_pos, capsule_list, is_fast_move):
+    # SpringData.detect_collision without its broad phase
+    col_pre, col_body_pre, hit_cylinder_pre = springMath.checkCollision(new_child_pos, child_position, capsule_list, True)
+    col_cur, col_body_cur, hit_cylinder_cur = springMath.checkCollision(new_child_pos, child_position, capsule_list, False)
+
+    child_pos_corrected = child_position
+
+    if col_pre and (col_cur is None):
+        new_child_pos = col_pre
+    elif col_cur and (col_pre is None):
+        child_pos_corrected = col_cur
+    elif col_pre and col_cur:
+        mid_point = (child_position + new_child_pos) / 2
+
+        if springMath.distance(col_pre, mid_point) < springMath.distance(col_cur, mid_point):
+            new_child_pos = col_pre
+        else:
+            new_child_pos = col_cur
+
+        if is_fast_move:
+            child_pos_corrected = new_child_pos
+
+    return bool(col_pre or col_cur), new_child_pos, child_pos_corrected
+
+
+def test_collision_push():
+    random = np.random.RandomState(3)
+    new_child_pos_list, child_pos_list = randomSegments(random, kCaseCount // 10)
+    p, q, r = randomCapsules(random, 20)
+
+    capsule_list = [[Capsule(index), Vector(p[index]), Vector(q[index]), r[index]] for index in range(len(r))]
+    capsule_snapshot = springCollision.CapsuleSnapshot([capsule.name() for capsule, _, _, _ in capsule_list], p, q, r)
+
+    for is_fast_move in [False, True]:
+        solver = springSolver.SpringSolver(springSolver.Spring(), [], is_fast_move=is_fast_move)
+        has_collision_list, pushed_pos_list, corrected_pos_list = solver.detect_capsule_collisions(child_pos_list, new_child_pos_list, capsule_snapshot)
+
+        for index, (child_pos, new_child_pos) in enumerate(zip(child_pos_list, new_child_pos_list)):
+            has_collision, pushed_pos, corrected_pos = detectCollision(Vector(child_pos), Vector(new_child_pos), capsule_list, is_fast_move)
+
+            assert has_collision == has_collision_list[index]
+            assert np.allclose(pushed_pos.values, pushed_pos_list[index], atol=kTolerance)
+            assert np.allclose(corrected_pos.values, corrected_pos_list[index], atol=kTolerance)
+
+
+def computeUpVector(previous_up_vector, current_up_vector, twist_ratio):
+    # SpringData.compute_up_vector, twist_ratio already divided by the sub division
+    return (previous_up_vector.normal() * (1 - twist_ratio)) + (current_up_vector.normal() * twist_ratio)
+
+
+def test_twist_blend():
+    random = np.random.RandomState(4)
+    previous_up_vectors = random.normal(size=(kCaseCount, 3))
+    current_up_vectors = random.normal(size=(kCaseCount, 3))
+    twist_ratio = random.uniform(0.0, 1.0, kCaseCount)
+
+    up_vector_list = [computeUpVector(Vector(previous), Vector(current), ratio).values
+                      for previous, current, ratio in zip(previous_up_vectors, current_up_vectors, twist_ratio)]
+
+    assert np.allclose(up_vector_list, springSolver.blend_up_vectors(previous_up_vectors, current_up_vectors, twist_ratio), atol=kTolerance)
+
+
+def aimMatrix(origin, new_child_pos, child_pos_corrected, grand_child_position, has_child_collide, up_vector, ratio, tension):
+    # world orientation of SpringData.aim_by_ratio: the aim constraint aims X at the weighted average of its targets,
+    # Y toward the world up vector
+    target_list = [(new_child_pos, ratio), (child_pos_corrected, 1 - ratio)]
+
+    if has_child_collide and grand_child_position and tension != 0:
+        target_list.append((grand_child_position, (1 - ratio) * tension))
+
+    target = Vector(0.0, 0.0, 0.0)
+    for position, weight in target_list:
+        target = target + position * weight
+    target = target / sum(weight for position, weight in target_list)
+
+    x_axis = (target - origin).normal()
+    z_axis = x_axis.cross(up_vector).normal()
+    y_axis = z_axis.cross(x_axis)
+
+    return np.array([x_axis.values, y_axis.values, z_axis.values])
+
+
+def test_aim():
+    # solve_aim local rotate values give back the aim constraint orientation
+    random = np.random.RandomState(5)
+    origins = random.normal(size=(kCaseCount, 3))
+    new_child_positions = origins + random.normal(size=(kCaseCount, 3))
+    child_positions_corrected = origins + random.normal(size=(kCaseCount, 3))
+    grand_child_positions = origins + random.normal(size=(kCaseCount, 3))
+    use_tension = random.uniform(size=kCaseCount) < 0.5
+    previous_up_vectors = random.normal(size=(kCaseCount, 3))
+    current_up_vectors = random.normal(size=(kCaseCount, 3))
+    ratio = random.uniform(0.0, 1.0, kCaseCount)
+    twist_ratio = random.uniform(0.0, 1.0, kCaseCount)
+    tension = random.uniform(0.0, 1.0, kCaseCount)
+
+    rotate_orders = random.randint(0, len(springSolver.kRotateOrders), kCaseCount)
+    rotate_axes = springSolver.euler_to_matrix(random.uniform(-30.0, 30.0, (kCaseCount, 3)))
+    joint_orients = springSolver.euler_to_matrix(random.uniform(-90.0, 90.0, (kCaseCount, 3)))
+    parent_matrices = np.tile(np.eye(4), (kCaseCount, 1, 1))
+    parent_matrices[:, :3, :3] = springSolver.euler_to_matrix(random.uniform(-180.0, 180.0, (kCaseCount, 3)))
+
+    eulers = springSolver.solve_aim(origins, new_child_positions, child_positions_corrected, grand_child_positions, use_tension,
+                                    previous_up_vectors, current_up_vectors, parent_matrices, joint_orients, rotate_axes, rotate_orders,
+                                    random.uniform(-180.0, 180.0, (kCaseCount, 3)), ratio, twist_ratio, tension)
+
+    # world = rotateAxis * rotate * jointOrient * parent
+    world_rotations = np.matmul(np.matmul(np.matmul(rotate_axes, springSolver.euler_to_matrix(eulers, rotate_orders)), joint_orients), parent_matrices[:, :3, :3])
+
+    for index in range(kCaseCount):
+        up_vector = computeUpVector(Vector(previous_up_vectors[index]), Vector(current_up_vectors[index]), twist_ratio[index])
+        aim_matrix = aimMatrix(Vector(origins[index]), Vector(new_child_positions[index]), Vector(child_positions_corrected[index]),
+                               Vector(grand_child_positions[index]), use_tension[index], up_vector, ratio[index], tension[index])
+
+        assert np.allclose(aim_matrix, world_rotations[index], atol=1e-7)
+
+
+def test_extend():
+    # SpringData.extend_bone child translate X
+    random = np.random.RandomState(6)
+    bone_lengths = random.uniform(0.1, 10.0, kCaseCount)
+    lengths = random.uniform(0.1, 10.0, kCaseCount)
+    extend = random.uniform(0.0, 1.0, kCaseCount)
+
+    translate_x_list = [(bone_length * (1 - value)) + (length * value) for bone_length, length, value in zip(bone_lengths, lengths, extend)]
+
+    assert np.allclose(translate_x_list, springSolver.extended_lengths(bone_lengths, lengths, extend), atol=kTolerance)
+
+
+def applyInertia(current_child_position, child_position, previous_child_position, ratio, inertia, sub_div):
+    # SpringData.apply_inertia, ratio already divided by the sub division
+    inertia_offset = Vector(0.0, 0.0, 0.0)
+
+    if inertia > 0.0:
+        bone_ref_loc_offset_dir = current_child_position - child_position
+        bone_ref_loc_offset_distance = ((bone_ref_loc_offset_dir) * (1 - ratio) * (1 - inertia)).length()
+
+        inertia_offset = bone_ref_loc_offset_dir.normal() * (bone_ref_loc_offset_distance / sub_div)
+
+    # apply mass
+    force_direction = child_position - previous_child_position
+    force_distance = force_direction.length() * inertia
+
+    return inertia_offset + force_direction.normal() * (force_distance / sub_div)
+
+
+def test_inertia():
+    random = np.random.RandomState(7)
+    new_child_positions = random.normal(size=(kCaseCount, 3))
+    child_positions = random.normal(size=(kCaseCount, 3))
+    previous_child_positions = child_positions + random.normal(size=(kCaseCount, 3)) * (random.uniform(size=(kCaseCount, 1)) < 0.9)
+    ratio = random.uniform(0.0, 1.0, kCaseCount)
+    inertia = np.where(random.uniform(size=kCaseCount) < 0.2, 0.0, random.uniform(0.0, 1.0, kCaseCount))
+
+    for sub_div in [1.0, 3.0]:
+        offset_list = [applyInertia(Vector(new), Vector(current), Vector(previous), value / sub_div, weight, sub_div).values
+                       for new, current, previous, value, weight in zip(new_child_positions, child_positions, previous_child_positions, ratio, inertia)]
+
+        offsets = springSolver.inertia_offsets(new_child_positions, child_positions, previous_child_positions, ratio / sub_div, inertia, sub_div)
+
+        assert np.allclose(offset_list, offsets, atol=kTolerance)
+
+
+def test_sigmoid_tension():
+    # tension of SpringData.aim_by_ratio
+    for tension in [0.0, 0.3, 1.0]:
+        for sub_div in [1.0, 2.0, 8.0]:
+            assert abs(springSolver.tension_factor(tension, sub_div) - tension / (1.0 / (1 / (1 + math.exp(-(1 - sub_div))) + 0.5))) < kTolerance
@@ -0,0 +1,56 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Chains solved by a pool of workers against the same calculation in one process
+# python -m pytest tests
+#
+#####################################################################################
+
+import numpy as np
+
+import springBenchmark
+import springCollision
+import springScene
+import springSolver
+
+kFrameCount = 24
+
+# rig and calculation settings
+kSettings = [
+    (dict(), dict()),
+    (dict(is_wind=True), dict()),
+    (dict(), dict(is_loop=True)),
+    (dict(), dict(sleep_tolerance=springSolver.kSleepTolerance)),
+    (dict(), dict(sub_div=3.0, is_adaptive=True)),
+    (dict(), dict(sub_div=2.0, solver_mode=springSolver.kVerletMode)),
+]
+
+
+def solve(worker_count, rig_settings, settings):
+    # fresh rig for each calculation, its curves aren't written
+    scene, node_name_list, colliders, wind = springBenchmark.makeRig(4, (3, 6), kFrameCount, capsule_count=6, is_floor=True, hold_ratio=0.5,
+                                                                     **rig_settings)
+    counters = springCollision.CollisionCounters()
+
+    _, curve_cache = springScene.solve_chains(scene, node_name_list, springSolver.Spring(ratio=0.4, tension=0.3, extend=0.2, inertia=0.5),
+                                              0, kFrameCount, colliders=colliders, wind=wind, worker_count=worker_count, counters=counters,
+                                              is_write=False, **settings)
+
+    return curve_cache, counters
+
+
+def test_parallel_same_curves():
+    for rig_settings, settings in kSettings:
+        curve_cache, counters = solve(1, rig_settings, settings)
+        parallel_curve_cache, parallel_counters = solve(2, rig_settings, settings)
+
+        assert curve_cache.keys == parallel_curve_cache.keys
+        assert np.array_equal(curve_cache.values, parallel_curve_cache.values), (rig_settings, settings)
+
+        # loop cycles and sleeping chains end on the same steps
+        assert ((parallel_counters.step_count, parallel_counters.bone_step_count, parallel_counters.skipped_bone_step_count) ==
+                (counters.step_count, counters.bone_step_count, counters.skipped_bone_step_count))
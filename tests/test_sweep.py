@@ -0,0 +1,66 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Parameter sweep against a calculation with each spring of the sweep on its own
+# python -m pytest tests
+#
+#####################################################################################
+
+import numpy as np
+
+import springBenchmark
+import springScene
+import springSolver
+
+kFrameCount = 24
+
+kSprings = [
+    springSolver.Spring(ratio=0.2, twistRatio=0.3, tension=0.5, inertia=0.5),
+    springSolver.Spring(ratio=0.5, twistRatio=0.3, tension=0.5, inertia=0.5),
+    springSolver.Spring(ratio=0.8, twistRatio=0.3, tension=0.5, inertia=0.5),
+    springSolver.Spring(ratio=0.5, twistRatio=0.0, tension=0.0, extend=0.4, inertia=0.0),
+]
+
+
+def makeRig():
+    return springBenchmark.makeRig(3, (3, 6), kFrameCount, capsule_count=6, is_floor=True)
+
+
+def test_sweep_variants():
+    for sub_div in [1.0, 2.0]:
+        scene, node_name_list, colliders, wind = makeRig()
+        _, variant_curve_cache_list = springScene.sweep_chains(scene, node_name_list, kSprings, 0, kFrameCount, sub_div, colliders=colliders)
+
+        # nothing is keyed by the sweep
+        assert all(key[0].startswith('driver') for key in scene.curves)
+
+        for spring, variant_curve_cache in zip(kSprings, variant_curve_cache_list):
+            scene, node_name_list, colliders, wind = makeRig()
+            _, curve_cache = springScene.solve_chains(scene, node_name_list, spring, 0, kFrameCount, sub_div, colliders=colliders, is_write=False)
+
+            assert variant_curve_cache.keys == curve_cache.keys
+            assert springBenchmark.sameCurves(variant_curve_cache, curve_cache)
+
+
+def test_sweep_variant_keys():
+    # the variant picked is keyed as a calculation with its spring keys its curves
+    scene, node_name_list, colliders, wind = makeRig()
+    _, variant_curve_cache_list = springScene.sweep_chains(scene, node_name_list, kSprings, 0, kFrameCount, colliders=colliders)
+
+    output_time_list = springScene.output_times(0, kFrameCount)
+    scene.write_curves(variant_curve_cache_list[-1], 0, kFrameCount, output_time_list)
+
+    solved_scene, node_name_list, colliders, wind = makeRig()
+    springScene.solve_chains(solved_scene, node_name_list, kSprings[-1], 0, kFrameCount, colliders=colliders)
+
+    assert sorted(scene.curves) == sorted(solved_scene.curves)
+
+    for key, (key_times, key_values) in scene.curves.items():
+        solved_key_times, solved_key_values = solved_scene.curves[key]
+
+        assert np.array_equal(key_times, solved_key_times)
+        assert np.array_equal(key_values, solved_key_values)
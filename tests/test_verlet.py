@@ -0,0 +1,64 @@
+# - * - coding: utf - 8 - * -
+# PEP8 formatting
+
+#####################################################################################
+#
+# Spring Magic for Maya
+#
+# Verlet solver mode, positions integrated then constrained to the bone lengths
+# python -m pytest tests
+#
+#####################################################################################
+
+import numpy as np
+
+import springBenchmark
+import springScene
+import springSolver
+
+kFrameCount = 30
+
+
+class LengthSolver(springSolver.SpringSolver):
+    # keeps the distance of the constrained positions to their parents, bones a collider moved aside
+
+    def __init__(self, *args, **kwargs):
+        springSolver.SpringSolver.__init__(self, *args, **kwargs)
+        self.length_errors = []
+
+    def solve_positions(self, rows, level_spring, parent_pos_list, goal_pos_list, child_length_list, grand_parent_plane_index_list, capsule_snapshot,
+                        plane_snapshot, step_sub_div=None):
+        result = springSolver.SpringSolver.solve_positions(self, rows, level_spring, parent_pos_list, goal_pos_list, child_length_list,
+                                                           grand_parent_plane_index_list, capsule_snapshot, plane_snapshot, step_sub_div)
+        has_collision_list, plane_hit_index_list, new_child_pos_list = result
+
+        free_list = ~has_collision_list & (plane_hit_index_list < 0)
+        lengths = np.linalg.norm(new_child_pos_list - parent_pos_list, axis=-1)
+        self.length_errors += list(np.abs(lengths - child_length_list)[free_list] / child_length_list[free_list])
+
+        return result
+
+
+def solve(spring, capsule_count=0, is_floor=False):
+    scene, node_name_list, colliders, wind = springBenchmark.makeRig(3, (3, 8), kFrameCount, capsule_count=capsule_count, is_floor=is_floor)
+
+    bone_list = springScene.create_bones(scene, node_name_list, 0)
+    solver = LengthSolver(spring, bone_list, colliders, wind, sub_div=1.0, mode=springSolver.kVerletMode, iterations=1)
+    times, time_index_list = springScene.step_times(0, kFrameCount)
+
+    springScene.solve_scene(scene, solver, times, time_index_list, 0, kFrameCount)
+    scene.delete_proxies()
+
+    return solver
+
+
+def test_bone_lengths():
+    # one iteration on one step per frame keeps the bone lengths, with the momentum of inertia and the colliders around
+    for spring, capsule_count, is_floor in [
+            (springSolver.Spring(ratio=0.5, tension=0.3), 0, False),
+            (springSolver.Spring(ratio=0.2, tension=0.0, inertia=0.9), 0, False),
+            (springSolver.Spring(ratio=0.4, tension=0.3, inertia=0.5), 20, True)]:
+        solver = solve(spring, capsule_count, is_floor)
+
+        assert len(solver.length_errors) >= kFrameCount * len(solver.bones) // 2
+        assert max(solver.length_errors) < 1e-9
@@ -32,6 +32,15 @@ kUpdateLink = r'https://animbai.com/category/download/'
 kVersionCheckLink = r'http://animbai.com/skintoolsver/'
 kOldPersonalLink = r'http://www.scriptspot.com/3ds-max/scripts/spring-magic'
 
+# frames between two keys when subframes are wiped
+kOutputSteps = [('Every Frame', 1.0), ('Every 2 Frames', 2.0), ('Every 3 Frames', 3.0), ('Every 4 Frames', 4.0)]
+
+# solver mode and constraint iterations, verlet stays stable around colliders without sub division
+kSolverSettings = [('Aim', 'aim', 4), ('Verlet, 2 Iterations', 'verlet', 2), ('Verlet, 4 Iterations', 'verlet', 4), ('Verlet, 8 Iterations', 'verlet', 8)]
+
+# UI parameters of a sweep: Spring attribute, UI value is 1 - attribute value
+kSweepParameters = [('Spring', 'ratio', True), ('Twist', 'twist_ratio', True), ('Tension', 'tension', False), ('Inertia', 'inertia', False), ('Extend', 'extend', False)]
+
 
 def widgetPath(windowName, widgetNames):
     """
@@ -137,6 +146,32 @@ class SpringMagicWidget():
         self.from_radioButton = pm.radioButton(self.uiObjects['springFrom_radioButton'], edit=True)
         # self.upAxis_comboBox = pm.optionMenu(self.uiObjects['springUpAxis_comboBox'], edit=True)
         self.apply_button = pm.button(self.uiObjects['springApply_Button'], edit=True, command=self.applyCmd)
+
+        # right click on apply for profiling, the last profile can be shown and exported
+        self.apply_popupMenu = pm.popupMenu(parent=self.uiObjects['springApply_Button'])
+        self.profile_menuItem = pm.menuItem(label='Profile Calculation', checkBox=False, parent=self.apply_popupMenu)
+        self.show_profile_menuItem = pm.menuItem(label='Show Last Profile', enable=False, command=self.showProfileCmd, parent=self.apply_popupMenu)
+        self.export_profile_menuItem = pm.menuItem(label='Export Last Profile...', enable=False, command=self.exportProfileCmd, parent=self.apply_popupMenu)
+        pm.menuItem(divider=True, parent=self.apply_popupMenu)
+        pm.menuItem(label='Key Every', subMenu=True, parent=self.apply_popupMenu)
+        pm.radioMenuItemCollection()
+        self.output_step_menuItems = [pm.menuItem(label=label, radioButton=(output_step == 1.0)) for label, output_step in kOutputSteps]
+        pm.setParent('..', menu=True)
+        pm.menuItem(label='Solver', subMenu=True, parent=self.apply_popupMenu)
+        pm.radioMenuItemCollection()
+        self.solver_menuItems = [pm.menuItem(label=label, radioButton=(solver_mode == 'aim')) for label, solver_mode, iterations in kSolverSettings]
+        pm.setParent('..', menu=True)
+        self.adaptive_menuItem = pm.menuItem(label='Adaptive Sub Division', checkBox=False, parent=self.apply_popupMenu)
+        self.sleep_menuItem = pm.menuItem(label='Sleep Settled Chains', checkBox=False, annotation='Chains whose animation, colliders and tips stay still are not solved, chains in the wind are always solved', parent=self.apply_popupMenu)
+        pm.menuItem(divider=True, parent=self.apply_popupMenu)
+        pm.menuItem(label='Export Shot Data...', command=self.exportShotDataCmd, parent=self.apply_popupMenu)
+        pm.menuItem(label='Parameter Sweep...', command=self.sweepCmd, parent=self.apply_popupMenu)
+        pm.menuItem(divider=True, parent=self.apply_popupMenu)
+        pm.menuItem(label='Preview', command=self.previewCmd, parent=self.apply_popupMenu)
+        self.commit_preview_menuItem = pm.menuItem(label='Commit Preview', enable=False, command=self.commitPreviewCmd, parent=self.apply_popupMenu)
+        self.stop_preview_menuItem = pm.menuItem(label='Stop Preview', enable=False, command=self.stopPreviewCmd, parent=self.apply_popupMenu)
+        self.sweep_curve_cache_list = []
+        self.profiler = None
         self.add_body_button = pm.button(self.uiObjects['springAddBody_Button'], edit=True, command=self.addBodyCmd)
         self.clear_body_button = pm.button(self.uiObjects['springClearBody_Button'], edit=True, command=self.clearBodyCmd)
         self.add_plane_button = pm.button(self.uiObjects['springAddPlane_Button'], edit=True, command=self.createColPlaneCmd)
@@ -152,7 +187,7 @@ class SpringMagicWidget():
         self.collision_checkBox = pm.checkBox(self.uiObjects['springCapsule_checkBox'], edit=True)
         self.fast_move_checkBox = pm.checkBox(self.uiObjects['springFastMove_checkBox'], edit=True)
         self.floor_checkBox = pm.checkBox(self.uiObjects['springFloor_checkBox'], edit=True)
-        self.floor_lineEdit = pm.textField(self.uiObjects['springFloor_lineEdit'], edit=True, changeCommand=self.twistChangeCmd)
+        self.floor_lineEdit = pm.textField(self.uiObjects['springFloor_lineEdit'], edit=True, changeCommand=self.floorChangeCmd)
 
         self.bind_pose_button = pm.button(self.uiObjects['springBindPose_button'], edit=True, command=self.setCmd)
         self.straight_button = pm.button(self.uiObjects['springStraight_button'], edit=True, command=self.straightCmd)
@@ -231,50 +266,81 @@ class SpringMagicWidget():
 
             self.apply_button.setEnable(True)
 
-    def applyCmd(self, *args):
-        picked_transforms = pm.ls(sl=1, type='transform')
+    def getFrameRange(self):
+        if self.active_radioButton.getSelect():
+            return int(pm.playbackOptions(q=1, minTime=1)), int(pm.playbackOptions(q=1, maxTime=1))
 
-        if picked_transforms:
-            self.apply_button.setEnable(False)
+        return int(self.from_lineEdit.getText()), int(self.end_lineEdit.getText())
 
-            pm.text(self.main_processLabel, edit=True, label='Calculating Bone Spring... (Esc to cancel)')
+    def getSettings(self):
+        # Spring and SpringMagic of the UI values
+        springRatio = 1 - float(self.spring_lineEdit.getText())
+        twistRatio = 1 - float(self.Xspring_lineEdit.getText())
+        isLoop = bool(self.loop_checkBox.getValue())
+        isPoseMatch = bool(self.pose_match_checkBox.getValue())
+        isFastMove = self.fast_move_checkBox.getValue()
+        isCollision = self.collision_checkBox.getValue()
+        isFloor = bool(self.floor_checkBox.getValue())
+        floorHeight = float(self.floor_lineEdit.getText())
+
+        # adaptive sub division is the most steps of a frame
+        isAdaptive = pm.menuItem(self.adaptive_menuItem, query=True, checkBox=True)
+
+        subDiv = 1.0
+        if isCollision or isFloor or isAdaptive:
+            subDiv = float(self.sub_division_lineEdit.getText())
+
+        startFrame, endFrame = self.getFrameRange()
+
+        tension = float(self.tension_lineEdit.getText())
+        inertia = float(self.inertia_lineEdit.getText())
+        extend = float(self.extend_lineEdit.getText())
+
+        wipeSubFrame = self.clear_subframe_checkBox.getValue()
+
+        isProfile = pm.menuItem(self.profile_menuItem, query=True, checkBox=True)
+
+        outputStep = [output_step for (label, output_step), menu_item in zip(kOutputSteps, self.output_step_menuItems) if pm.menuItem(menu_item, query=True, radioButton=True)][0]
+
+        sleepTolerance = core.springSolver.kSleepTolerance if pm.menuItem(self.sleep_menuItem, query=True, checkBox=True) else 0.0
+
+        solverMode, iterations = [(solver_mode, iterations) for (label, solver_mode, iterations), menu_item in zip(kSolverSettings, self.solver_menuItems) if pm.menuItem(menu_item, query=True, radioButton=True)][0]
 
-            springRatio = 1 - float(self.spring_lineEdit.getText())
-            twistRatio = 1 - float(self.Xspring_lineEdit.getText())
-            isLoop = bool(self.loop_checkBox.getValue())
-            isPoseMatch = bool(self.pose_match_checkBox.getValue())
-            isFastMove = self.fast_move_checkBox.getValue()
-            isCollision = self.collision_checkBox.getValue()
+        spring = core.Spring(springRatio, twistRatio, tension, extend, inertia)
+        springMagic = core.SpringMagic(startFrame, endFrame, subDiv, isLoop, isPoseMatch, isCollision, isFastMove, wipeSubFrame, isFloor, floorHeight,
+                                       isProfile=isProfile, outputStep=outputStep, solverMode=solverMode, iterations=iterations, isAdaptive=isAdaptive,
+                                       sleepTolerance=sleepTolerance)
 
-            subDiv = 1.0
-            if isCollision:
-                subDiv = float(self.sub_division_lineEdit.getText())
+        return spring, springMagic
 
-            # get frame range
-            if self.active_radioButton.getSelect():
-                startFrame = int(pm.playbackOptions(q=1, minTime=1))
-                endFrame = int(pm.playbackOptions(q=1, maxTime=1))
-            else:
-                startFrame = int(self.from_lineEdit.getText())
-                endFrame = int(self.end_lineEdit.getText())
+    def applyCmd(self, *args):
+        picked_transforms = pm.ls(sl=1, type='transform')
 
-            tension = float(self.tension_lineEdit.getText())
-            inertia = float(self.inertia_lineEdit.getText())
-            extend = float(self.extend_lineEdit.getText())
+        if picked_transforms:
+            self.apply_button.setEnable(False)
 
-            wipeSubFrame = self.clear_subframe_checkBox.getValue()
+            pm.text(self.main_processLabel, edit=True, label='Calculating Bone Spring... (Esc to cancel)')
 
-            spring = core.Spring(springRatio, twistRatio, tension, extend, inertia)
-            springMagic = core.SpringMagic(startFrame, endFrame, subDiv, isLoop, isPoseMatch, isCollision, isFastMove, wipeSubFrame)
+            spring, springMagic = self.getSettings()
 
             startTime = datetime.datetime.now()
 
             try:
                 core.startCompute(spring, springMagic, self.progression_callback)
+                self.enablePreviewMenu(False)
 
                 deltaTime = (datetime.datetime.now() - startTime)
 
-                pm.text(self.main_processLabel, edit=True, label="Spring Calculation Time: {0}s".format(deltaTime.seconds))
+                pm.text(self.main_processLabel, edit=True, label="Spring Calculation Time: {0:.2f}s".format(deltaTime.total_seconds()))
+
+                if springMagic.profiler and springMagic.profiler.enabled:
+                    self.profiler = springMagic.profiler
+
+                    # breakdown on the label tool tip, the calculation logs it in the script editor
+                    pm.text(self.main_processLabel, edit=True, annotation=str(self.profiler))
+
+                    pm.menuItem(self.show_profile_menuItem, edit=True, enable=True)
+                    pm.menuItem(self.export_profile_menuItem, edit=True, enable=True)
 
             except ValueError as exception:
                 pm.text(self.main_processLabel, edit=True, label='Process aborted')
@@ -287,6 +353,145 @@ class SpringMagicWidget():
 
             self.apply_button.setEnable(True)
 
+    def showProfileCmd(self, *args):
+        window_name = 'springMagicProfile_window'
+
+        if pm.window(window_name, exists=True):
+            pm.deleteUI(window_name)
+
+        pm.window(window_name, title='Spring Magic Profile', widthHeight=(560, 320))
+        pm.paneLayout()
+        pm.scrollField(text=str(self.profiler), editable=False, wordWrap=False, font='fixedWidthFont')
+        pm.showWindow(window_name)
+
+    def exportProfileCmd(self, *args):
+        file_path_list = pm.fileDialog2(fileFilter='JSON (*.json)', dialogStyle=2, fileMode=0, caption='Export Profile')
+
+        if file_path_list:
+            self.profiler.save(file_path_list[0])
+
+    def previewCmd(self, *args):
+        # keyless solve, the bones follow the result while scrubbing
+        picked_transforms = pm.ls(sl=1, type='transform')
+
+        if not picked_transforms:
+            pm.warning('Select the transforms to solve')
+            return
+
+        spring, springMagic = self.getSettings()
+
+        startTime = datetime.datetime.now()
+
+        try:
+            core.startPreview(spring, springMagic)
+
+            deltaTime = (datetime.datetime.now() - startTime)
+            pm.text(self.main_processLabel, edit=True, label="Spring Preview Time: {0:.2f}s".format(deltaTime.total_seconds()))
+
+            self.enablePreviewMenu(True)
+
+        except ValueError as exception:
+            pm.text(self.main_processLabel, edit=True, label='Process aborted')
+            pm.warning(exception)
+
+        pm.select(picked_transforms)
+
+    def commitPreviewCmd(self, *args):
+        core.commitPreview()
+        self.enablePreviewMenu(False)
+
+    def stopPreviewCmd(self, *args):
+        core.stopPreview()
+        self.enablePreviewMenu(False)
+
+    def enablePreviewMenu(self, enable):
+        pm.menuItem(self.commit_preview_menuItem, edit=True, enable=enable)
+        pm.menuItem(self.stop_preview_menuItem, edit=True, enable=enable)
+
+    def sweepCmd(self, *args):
+        # solve several values of a parameter at once, pick a variant to key it
+        window_name = 'springMagicSweep_window'
+
+        if pm.window(window_name, exists=True):
+            pm.deleteUI(window_name)
+
+        pm.window(window_name, title='Spring Magic Sweep', widthHeight=(320, 320))
+        pm.columnLayout(adjustableColumn=True, rowSpacing=4)
+
+        self.sweep_parameter_optionMenu = pm.optionMenu(label='Parameter')
+        for label, attribute, is_inverted in kSweepParameters:
+            pm.menuItem(label=label)
+
+        self.sweep_range_floatFieldGrp = pm.floatFieldGrp(label='From / To', numberOfFields=2, value1=0.2, value2=0.8, columnWidth3=(80, 100, 100))
+        self.sweep_count_intFieldGrp = pm.intFieldGrp(label='Variants', value1=8, columnWidth2=(80, 100))
+
+        pm.button(label='Solve Variants', command=self.sweepSolveCmd)
+        pm.text(label='Pick a variant to key it', align='left')
+        self.sweep_textScrollList = pm.textScrollList(height=160, selectCommand=self.sweepPickCmd)
+
+        pm.showWindow(window_name)
+
+    def sweepSolveCmd(self, *args):
+        picked_transforms = pm.ls(sl=1, type='transform')
+
+        if not picked_transforms:
+            pm.warning('Select the transforms to solve')
+            return
+
+        spring, springMagic = self.getSettings()
+
+        label, attribute, is_inverted = kSweepParameters[pm.optionMenu(self.sweep_parameter_optionMenu, query=True, select=True) - 1]
+        value_from, value_to = pm.floatFieldGrp(self.sweep_range_floatFieldGrp, query=True, value=True)[:2]
+        variant_count = max(pm.intFieldGrp(self.sweep_count_intFieldGrp, query=True, value1=True), 1)
+
+        value_list = [value_from + (value_to - value_from) * index / max(variant_count - 1.0, 1.0) for index in range(variant_count)]
+
+        springs = []
+        for value in value_list:
+            variant_spring = core.Spring(spring.ratio, spring.twist_ratio, spring.tension, spring.extend, spring.inertia)
+            setattr(variant_spring, attribute, 1 - value if is_inverted else value)
+            springs.append(variant_spring)
+
+        startTime = datetime.datetime.now()
+
+        try:
+            self.sweep_curve_cache_list = core.startSweep(springs, springMagic)
+            self.enablePreviewMenu(False)
+            self.sweep_spring_magic = springMagic
+
+            pm.textScrollList(self.sweep_textScrollList, edit=True, removeAll=True, append=['{0} {1:.3f}'.format(label, value) for value in value_list])
+
+            deltaTime = (datetime.datetime.now() - startTime)
+            pm.text(self.main_processLabel, edit=True, label="Spring Sweep Time: {0:.2f}s".format(deltaTime.total_seconds()))
+
+        except ValueError as exception:
+            pm.text(self.main_processLabel, edit=True, label='Process aborted')
+            pm.warning(exception)
+
+        pm.select(picked_transforms)
+
+    def sweepPickCmd(self, *args):
+        index_list = pm.textScrollList(self.sweep_textScrollList, query=True, selectIndexedItem=True)
+
+        if index_list and self.sweep_curve_cache_list:
+            core.applySweepVariant(self.sweep_curve_cache_list[index_list[0] - 1], self.sweep_spring_magic)
+
+    def exportShotDataCmd(self, *args):
+        # selection, colliders and wind for springBatch on the farm
+        picked_transforms = pm.ls(sl=1, type='transform')
+
+        if not picked_transforms:
+            pm.warning('Select the transforms to solve')
+            return
+
+        file_path_list = pm.fileDialog2(fileFilter='JSON (*.json)', dialogStyle=2, fileMode=0, caption='Export Shot Data')
+
+        if file_path_list:
+            startFrame, endFrame = self.getFrameRange()
+            springMagic = core.SpringMagic(startFrame, endFrame, isCollision=True)
+
+            core.exportShotData(file_path_list[0], picked_transforms, springMagic)
+
     def copyCmd(self, *args):
         core.copyBonePose()
 
@@ -297,6 +502,9 @@ class SpringMagicWidget():
     def twistChangeCmd(self, *args):
         self.limitTextEditValue(self.Xspring_lineEdit, defaultValue=0.7)
 
+    def floorChangeCmd(self, *args):
+        self.limitTextEditValue(self.floor_lineEdit, minValue=-100000, maxValue=100000, defaultValue=0.0)
+
     def extendChangeCmd(self, *args):
         self.limitTextEditValue(self.extend_lineEdit, defaultValue=0.0)
 